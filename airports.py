@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+机场参考数据：IATA代码 -> 国家/地区、经纬度
+内置常用机场表，首次使用时加载为紧凑索引（代码 -> 下标，O(1) 查找），
+机场两两之间的大圆距离用 numpy 一次性向量化计算后缓存，
+国内/国际判断和里程自动补全几乎不产生额外开销
+"""
+
+import math
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+EARTH_RADIUS = {'mi': 3958.8, 'km': 6371.0}
+
+# IATA 国家/地区 纬度 经度
+_AIRPORT_DATA = """
+PEK CN 40.0801 116.5846
+PKX CN 39.5098 116.4105
+TSN CN 39.1244 117.3462
+SJW CN 38.2807 114.6973
+TYN CN 37.7469 112.6283
+HET CN 40.8514 111.8240
+SHE CN 41.6398 123.4834
+DLC CN 38.9657 121.5386
+CGQ CN 43.9962 125.6850
+HRB CN 45.6234 126.2503
+SHA CN 31.1979 121.3363
+PVG CN 31.1434 121.8052
+NKG CN 31.7420 118.8620
+WUX CN 31.4944 120.4292
+CZX CN 31.9197 119.7789
+HGH CN 30.2295 120.4344
+NGB CN 29.8267 121.4619
+WNZ CN 27.9122 120.8522
+HFE CN 31.9899 116.9769
+FOC CN 25.9351 119.6633
+XMN CN 24.5440 118.1277
+KHN CN 28.8650 115.9000
+TNA CN 36.8572 117.2160
+TAO CN 36.2661 120.3744
+YNT CN 37.6572 120.9872
+CGO CN 34.5197 113.8409
+WUH CN 30.7838 114.2081
+CSX CN 28.1892 113.2196
+DYG CN 29.1028 110.4431
+CAN CN 23.3924 113.2988
+SZX CN 22.6393 113.8107
+ZUH CN 22.0064 113.3760
+NNG CN 22.6083 108.1722
+KWL CN 25.2181 110.0392
+HAK CN 19.9349 110.4590
+SYX CN 18.3029 109.4122
+CTU CN 30.5785 103.9471
+TFU CN 30.3197 104.4450
+CKG CN 29.7192 106.6417
+KWE CN 26.5385 106.8007
+KMG CN 25.1019 102.9292
+LJG CN 26.6800 100.2461
+JHG CN 21.9739 100.7602
+LXA CN 29.2978 90.9119
+XIY CN 34.4471 108.7516
+LHW CN 36.5152 103.6203
+XNN CN 36.5275 102.0430
+INC CN 38.3228 106.3931
+URC CN 43.9071 87.4742
+HKG HK 22.3080 113.9185
+MFM MO 22.1496 113.5919
+TPE TW 25.0777 121.2328
+TSA TW 25.0694 121.5525
+KHH TW 22.5771 120.3500
+NRT JP 35.7720 140.3929
+HND JP 35.5494 139.7798
+KIX JP 34.4273 135.2440
+ITM JP 34.7855 135.4382
+NGO JP 34.8584 136.8054
+CTS JP 42.7752 141.6923
+FUK JP 33.5859 130.4511
+OKA JP 26.1958 127.6459
+ICN KR 37.4602 126.4407
+GMP KR 37.5583 126.7906
+PUS KR 35.1795 128.9382
+CJU KR 33.5113 126.4930
+ULN MN 47.8431 106.7667
+SIN SG 1.3644 103.9915
+BKK TH 13.6900 100.7501
+DMK TH 13.9126 100.6068
+HKT TH 8.1132 98.3169
+CNX TH 18.7668 98.9626
+KUL MY 2.7456 101.7099
+CGK ID -6.1256 106.6559
+DPS ID -8.7482 115.1670
+MNL PH 14.5086 121.0194
+SGN VN 10.8188 106.6520
+HAN VN 21.2212 105.8072
+DAD VN 16.0439 108.1992
+PNH KH 11.5466 104.8441
+RGN MM 16.9073 96.1332
+DEL IN 28.5562 77.1000
+BOM IN 19.0896 72.8656
+BLR IN 13.1986 77.7066
+CMB LK 7.1808 79.8841
+MLE MV 4.1918 73.5291
+KTM NP 27.6966 85.3591
+ALA KZ 43.3521 77.0405
+TAS UZ 41.2579 69.2812
+DXB AE 25.2532 55.3657
+AUH AE 24.4330 54.6511
+DOH QA 25.2731 51.6081
+RUH SA 24.9576 46.6988
+JED SA 21.6796 39.1565
+TLV IL 32.0114 34.8867
+IST TR 41.2753 28.7519
+CAI EG 30.1219 31.4056
+LHR GB 51.4700 -0.4543
+LGW GB 51.1537 -0.1821
+MAN GB 53.3537 -2.2750
+DUB IE 53.4264 -6.2499
+CDG FR 49.0097 2.5479
+ORY FR 48.7262 2.3652
+AMS NL 52.3105 4.7683
+BRU BE 50.9014 4.4844
+FRA DE 50.0379 8.5622
+MUC DE 48.3537 11.7750
+BER DE 52.3667 13.5033
+ZRH CH 47.4582 8.5555
+GVA CH 46.2381 6.1090
+VIE AT 48.1103 16.5697
+PRG CZ 50.1008 14.2600
+WAW PL 52.1657 20.9671
+BUD HU 47.4394 19.2556
+CPH DK 55.6180 12.6508
+ARN SE 59.6498 17.9238
+OSL NO 60.1976 11.1004
+HEL FI 60.3172 24.9633
+MAD ES 40.4983 -3.5676
+BCN ES 41.2974 2.0833
+LIS PT 38.7742 -9.1342
+FCO IT 41.8003 12.2389
+MXP IT 45.6306 8.7281
+ATH GR 37.9364 23.9445
+SVO RU 55.9726 37.4146
+DME RU 55.4088 37.9063
+LED RU 59.8003 30.2625
+VVO RU 43.3990 132.1480
+JFK US 40.6413 -73.7781
+EWR US 40.6895 -74.1745
+LGA US 40.7769 -73.8740
+BOS US 42.3656 -71.0096
+IAD US 38.9531 -77.4565
+ATL US 33.6407 -84.4277
+MIA US 25.7959 -80.2870
+ORD US 41.9742 -87.9073
+DFW US 32.8998 -97.0403
+IAH US 29.9902 -95.3368
+DEN US 39.8561 -104.6737
+LAS US 36.0840 -115.1537
+LAX US 33.9416 -118.4085
+SFO US 37.6213 -122.3790
+SEA US 47.4502 -122.3088
+ANC US 61.1743 -149.9962
+HNL US 21.3187 -157.9225
+YVR CA 49.1967 -123.1815
+YYZ CA 43.6777 -79.6248
+YUL CA 45.4706 -73.7408
+MEX MX 19.4361 -99.0719
+CUN MX 21.0365 -86.8771
+BOG CO 4.7016 -74.1469
+LIM PE -12.0219 -77.1143
+GRU BR -23.4356 -46.4731
+GIG BR -22.8100 -43.2506
+EZE AR -34.8222 -58.5358
+SCL CL -33.3930 -70.7858
+SYD AU -33.9399 151.1753
+MEL AU -37.6690 144.8410
+BNE AU -27.3842 153.1175
+PER AU -31.9385 115.9672
+AKL NZ -37.0082 174.7850
+CHC NZ -43.4894 172.5320
+JNB ZA -26.1392 28.2460
+CPT ZA -33.9715 18.6021
+NBO KE -1.3192 36.9278
+ADD ET 8.9779 38.7993
+LOS NG 6.5774 3.3212
+CMN MA 33.3675 -7.5900
+"""
+
+
+class Airport(NamedTuple):
+    iata: str
+    country: str
+    lat: float
+    lon: float
+
+
+class AirportIndex:
+    """
+    机场索引：代码 -> 下标的字典 + 按下标排列的国家、经纬度列
+    距离矩阵在第一次查询距离时整体计算（numpy 不可用时按机场对计算并缓存）
+    """
+
+    def __init__(self, airports: Iterable[Airport]):
+        self.codes: List[str] = []
+        self.countries: List[str] = []
+        self.lats: List[float] = []
+        self.lons: List[float] = []
+        self._positions: Dict[str, int] = {}
+        for airport in airports:
+            self._positions[airport.iata] = len(self.codes)
+            self.codes.append(airport.iata)
+            self.countries.append(airport.country)
+            self.lats.append(airport.lat)
+            self.lons.append(airport.lon)
+        self._matrix = None
+        self._pair_cache: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_text(cls, text: str) -> 'AirportIndex':
+        """从 'IATA 国家 纬度 经度' 格式的文本行构建"""
+        airports = []
+        for line in text.split('\n'):
+            if not line.strip():
+                continue
+            iata, country, lat, lon = line.split()
+            airports.append(Airport(iata, country, float(lat), float(lon)))
+        return cls(airports)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._positions
+
+    def get(self, code: str) -> Optional[Airport]:
+        i = self._positions.get(code)
+        if i is None:
+            return None
+        return Airport(code, self.countries[i], self.lats[i], self.lons[i])
+
+    def country(self, code: str) -> Optional[str]:
+        i = self._positions.get(code)
+        return self.countries[i] if i is not None else None
+
+    def _distance_matrix(self):
+        """所有机场两两之间的大圆距离（英里），numpy 向量化计算一次"""
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    try:
+                        import numpy as np
+                    except ImportError:
+                        return None
+                    lat = np.radians(np.asarray(self.lats))
+                    lon = np.radians(np.asarray(self.lons))
+                    dlat = lat[:, None] - lat[None, :]
+                    dlon = lon[:, None] - lon[None, :]
+                    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+                    self._matrix = 2 * EARTH_RADIUS['mi'] * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        return self._matrix
+
+    def _haversine(self, i: int, j: int) -> float:
+        lat1, lon1 = math.radians(self.lats[i]), math.radians(self.lons[i])
+        lat2, lon2 = math.radians(self.lats[j]), math.radians(self.lons[j])
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS['mi'] * math.asin(math.sqrt(min(1.0, a)))
+
+    def distance(self, departure: str, arrival: str, unit: str = 'mi') -> Optional[float]:
+        """
+        两个机场之间的大圆距离
+        :param unit: 'mi'（英里）或 'km'（公里）
+        :return: 距离，任一机场未知时返回None
+        """
+        i = self._positions.get(departure)
+        j = self._positions.get(arrival)
+        if i is None or j is None:
+            return None
+        matrix = self._distance_matrix()
+        if matrix is not None:
+            miles = float(matrix[i, j])
+        else:
+            key = (i, j) if i <= j else (j, i)
+            miles = self._pair_cache.get(key)
+            if miles is None:
+                miles = self._pair_cache[key] = self._haversine(i, j)
+        return miles if unit == 'mi' else miles * EARTH_RADIUS[unit] / EARTH_RADIUS['mi']
+
+
+_index: Optional[AirportIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_airport_index() -> AirportIndex:
+    """内置机场索引（进程内只构建一次）"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AirportIndex.from_text(_AIRPORT_DATA)
+    return _index
+
+
+def airport_country(code: str) -> Optional[str]:
+    """机场所属国家/地区代码，未知机场返回None"""
+    return get_airport_index().country(code)
+
+
+def is_international(departure: str, arrival: str, domestic_countries: Iterable[str] = ('CN',)) -> bool:
+    """
+    判断航线是否为国际（含地区）航线：任一端不在国内国家集合中即为国际
+    内置表中没有的机场沿用旧规则（以 'Z' 开头视为国内）
+    """
+    index = get_airport_index()
+    for code in (departure, arrival):
+        country = index.country(code)
+        if country is None:
+            if not code.startswith('Z'):
+                return True
+        elif country not in domestic_countries:
+            return True
+    return False
+
+
+def flight_distance(departure: str, arrival: str, unit: str = 'mi') -> Optional[int]:
+    """航线大圆距离（取整），任一机场未知时返回None"""
+    distance = get_airport_index().distance(departure, arrival, unit)
+    return round(distance) if distance is not None else None
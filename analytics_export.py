@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析数据导出
+把飞行记录和价格观测写成列式的 Parquet（或 Arrow IPC）文件，供 pandas / DuckDB 直接扫描：
+时间为 timestamp[us]、里程为 int32、航司/舱位/机场为字典编码列，价格观测的 raw_data 默认不导出。
+
+导出是增量的：输出目录中的 export_state.json 记录已导出的飞行记录（按整行内容的哈希计数，
+记录键相同的多行各自计数）、每条路线（route_key -> timestamp）上次导出的版本，以及导出时
+数据文件的签名；数据文件没有变化时不再扫描，否则只把新增或变化的行写成一个新的分片文件:
+    <输出目录>/flight_records/part-00001.parquet
+    <输出目录>/price_observations/part-00001.parquet
+price_alerts.json 中每条路线只保留最新一次观测，定期导出即可在分析侧积累完整的价格历史。
+覆盖更新（upsert）过的记录会再导出一行，分析时按 record_key 取 record_date 最新的一行。
+
+依赖 pyarrow（可选依赖，pip install pyarrow）
+
+用法:
+    python analytics_export.py
+    python analytics_export.py --layout sharded --output analytics --format arrow
+    duckdb -c "SELECT airline, sum(miles) FROM 'analytics/flight_records/*.parquet' GROUP BY 1"
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+from json_store import read_json, read_json_cached, write_json
+from record_store import create_record_store, departure_epoch, file_signature, record_key
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = 'analytics'
+STATE_FILE = 'export_state.json'
+STATE_VERSION = 2
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise RuntimeError("分析导出需要 pyarrow：pip install pyarrow")
+
+
+def row_hash(record: Dict) -> str:
+    """飞行记录整行内容的哈希（记录键相同、内容不同的行互不影响）"""
+    text = json.dumps(record, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:20]
+
+
+def _signature(signature) -> List:
+    """文件签名转为可与 JSON 状态比较的形式"""
+    return json.loads(json.dumps(signature))
+
+
+def _load_state(state_path: str, fmt: str) -> Dict:
+    """读取导出状态；版本 1 的状态（记录键 -> record_date）在导出时按当前数据迁移"""
+    state = read_json(state_path, None) or {}
+    if state.get('format') != fmt or state.get('version') not in (1, STATE_VERSION):
+        return {'version': STATE_VERSION, 'format': fmt, 'records': {}, 'prices': {}, 'parts': {},
+                'sources': {}}
+    return state
+
+
+def _new_records(store, state: Dict) -> List[Dict]:
+    """找出尚未导出的飞行记录，并把状态更新为当前数据中各行的计数"""
+    exported = state['records']
+    legacy = state.get('version') == 1
+    counts = Counter()
+    new_records = []
+    for record in store.load():
+        digest = row_hash(record)
+        counts[digest] += 1
+        if legacy:
+            # 旧状态只记录每个键最后导出的 record_date，与之一致的行视为已导出
+            if exported.get(record_key(record)) == record.get('record_date'):
+                continue
+        elif counts[digest] <= exported.get(digest, 0):
+            continue
+        new_records.append(record)
+    state['records'] = dict(counts)
+    return new_records
+
+
+def _timestamps(values: List) -> List[Optional[int]]:
+    """ISO时间字符串 -> 微秒数，无法解析时为空值"""
+    return [departure_epoch(v) if v else None for v in values]
+
+
+def records_table(records: List[Dict]):
+    """飞行记录 -> Arrow 表（按起飞时间排序，便于按时间过滤时跳过行组）"""
+    pa = _require_pyarrow()
+    records = sorted(records, key=lambda r: departure_epoch(r.get('departure_time')) or 0)
+    category = pa.dictionary(pa.int32(), pa.string())
+    timestamp = pa.timestamp('us')
+
+    def column(field: str) -> List:
+        return [r.get(field) for r in records]
+
+    return pa.table({
+        'record_key': pa.array([record_key(r) for r in records], pa.string()),
+        'flight_number': pa.array(column('flight_number'), pa.string()),
+        'departure_airport': pa.array(column('departure_airport'), category),
+        'arrival_airport': pa.array(column('arrival_airport'), category),
+        'departure_time': pa.array(_timestamps(column('departure_time')), timestamp),
+        'arrival_time': pa.array(_timestamps(column('arrival_time')), timestamp),
+        'airline': pa.array(column('airline'), category),
+        'cabin_class': pa.array(column('cabin_class'), category),
+        'miles': pa.array([int(v) if v is not None else None for v in column('miles')], pa.int32()),
+        'record_date': pa.array(_timestamps(column('record_date')), timestamp),
+    })
+
+
+def prices_table(alerts: List[Dict], include_raw: bool = False):
+    """价格观测 -> Arrow 表"""
+    pa = _require_pyarrow()
+    category = pa.dictionary(pa.int32(), pa.string())
+
+    def column(field: str) -> List:
+        return [a.get(field) for a in alerts]
+
+    def price(value) -> Optional[float]:
+        return float(value) if value is not None else None
+
+    travel_dates = [(e // 86_400_000_000) if e is not None else None for e in _timestamps(column('travel_date'))]
+    columns = {
+        'route_key': pa.array(column('route_key'), pa.string()),
+        'departure': pa.array(column('departure'), category),
+        'arrival': pa.array(column('arrival'), category),
+        'travel_date': pa.array(travel_dates, pa.date32()),
+        'current_price': pa.array([price(v) for v in column('current_price')], pa.float64()),
+        'previous_price': pa.array([price(v) for v in column('previous_price')], pa.float64()),
+        'price_drop': pa.array([bool(v) for v in column('price_drop')], pa.bool_()),
+        'signals': pa.array([v or [] for v in column('signals')], pa.list_(pa.string())),
+        'timestamp': pa.array(_timestamps(column('timestamp')), pa.timestamp('us')),
+    }
+    if include_raw:
+        columns['raw_data'] = pa.array(
+            [json.dumps(v, ensure_ascii=False) if v is not None else None for v in column('raw_data')],
+            pa.string()
+        )
+    return pa.table(columns)
+
+
+def write_part(table, directory: str, part: int, fmt: str) -> str:
+    """写入一个分片文件（先写临时文件再原子替换；序号相同的残留分片会被覆盖）"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{part:05d}{FORMATS[fmt]}")
+    tmp_path = f"{path}.tmp"
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp_path, compression='zstd')
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return path
+
+
+def run_export(store,
+               alerts_file: str,
+               output_dir: str = OUTPUT_DIR,
+               fmt: str = 'parquet',
+               include_raw: bool = False) -> Dict[str, int]:
+    """
+    增量导出飞行记录和价格观测
+    :param store: 飞行记录存储（record_store.create_record_store 的返回值）
+    :param alerts_file: 价格监控记录文件
+    :param output_dir: 输出目录
+    :param fmt: 'parquet' 或 'arrow'
+    :param include_raw: 是否导出价格接口的原始返回（JSON字符串列）
+    :return: 本次导出的 {'records': 行数, 'prices': 行数}
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}")
+    _require_pyarrow()
+    state_path = os.path.join(output_dir, STATE_FILE)
+    state = _load_state(state_path, fmt)
+    loaded = json.dumps(state, sort_keys=True)
+    sources = state.setdefault('sources', {})
+    records_source = _signature(store.version()[1])
+    prices_source = _signature(file_signature(alerts_file))
+
+    # 数据文件签名与上次导出时相同则没有新行，不必扫描
+    new_records = []
+    if state.get('version') != STATE_VERSION or sources.get('records') != records_source:
+        new_records = _new_records(store, state)
+        sources['records'] = records_source
+
+    new_prices = []
+    if sources.get('prices') != prices_source:
+        exported_prices = state['prices']
+        for alert in read_json_cached(alerts_file, []):
+            route_key = alert.get('route_key')
+            if route_key and (route_key not in exported_prices
+                              or exported_prices[route_key] != alert.get('timestamp')):
+                new_prices.append(alert)
+                exported_prices[route_key] = alert.get('timestamp')
+        sources['prices'] = prices_source
+    state['version'] = STATE_VERSION
+
+    for name, rows, build in (('flight_records', new_records, records_table),
+                              ('price_observations', new_prices,
+                               lambda rows: prices_table(rows, include_raw))):
+        if not rows:
+            continue
+        part = state['parts'].get(name, 0) + 1
+        path = write_part(build(rows), os.path.join(output_dir, name), part, fmt)
+        state['parts'][name] = part
+        logger.info(f"导出 {len(rows)} 行: {path}")
+
+    # 分片写完后才更新状态；中途退出时下次以相同的序号重写分片，不会产生重复行
+    if json.dumps(state, sort_keys=True) != loaded:
+        os.makedirs(output_dir, exist_ok=True)
+        write_json(state_path, state)
+    return {'records': len(new_records), 'prices': len(new_prices)}
+
+
+def main():
+    from flight_assistant import FLIGHT_RECORDS_DIR, FLIGHT_RECORDS_FILE, PRICE_ALERTS_FILE
+
+    parser = argparse.ArgumentParser(description='导出飞行记录和价格观测为 Parquet/Arrow')
+    parser.add_argument('--data-dir', default='', help='数据目录（默认当前目录，多用户部署时为用户目录）')
+    parser.add_argument('--layout', default=os.getenv('FLIGHT_RECORDS_LAYOUT', 'flat'), help='飞行记录存储布局')
+    parser.add_argument('--output', default=OUTPUT_DIR, help='输出目录')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet', help='输出格式')
+    parser.add_argument('--raw', action='store_true', help='同时导出价格接口的原始返回')
+    args = parser.parse_args()
+
+    store = create_record_store(args.layout,
+                                os.path.join(args.data_dir, FLIGHT_RECORDS_FILE),
+                                os.path.join(args.data_dir, FLIGHT_RECORDS_DIR))
+    try:
+        counts = run_export(store, os.path.join(args.data_dir, PRICE_ALERTS_FILE),
+                            args.output, args.format, args.raw)
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    print(f"✓ 新导出飞行记录 {counts['records']} 行，价格观测 {counts['prices']} 行 -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+飞行记录、统计、成就与行程卡的规模基准测试
+用固定种子生成 1k ~ 1M 条合成 FlightRecord，在临时目录中测量各操作的
+吞吐量、延迟分位数和峰值内存，结果写入JSON文件，可跨提交对比
+
+用法:
+    python benchmarks/bench_suite.py --sizes 1000,10000,100000 --output bench_results.json
+    python benchmarks/bench_suite.py --sizes 1000000 --layout sharded
+    python benchmarks/bench_suite.py --compare old_results.json --output new_results.json
+    python benchmarks/bench_suite.py --cold    另外测量冷缓存（JSON解析缓存和统计缓存均清空）的结果
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import json_store  # noqa: E402
+from flight_assistant import FlightAssistant, FlightRecord  # noqa: E402
+
+AIRPORTS = ['PEK', 'PKX', 'SHA', 'PVG', 'CAN', 'SZX', 'CTU', 'KMG', 'XIY', 'HGH',
+            'HKG', 'TPE', 'NRT', 'HND', 'ICN', 'SIN', 'BKK', 'LHR', 'CDG', 'FRA',
+            'JFK', 'LAX', 'SFO', 'SYD', 'DXB']
+AIRLINES = {'CA': 'Air China', 'MU': 'China Eastern', 'CZ': 'China Southern',
+            'HU': 'Hainan Airlines', 'CX': 'Cathay Pacific', 'SQ': 'Singapore Airlines',
+            'BA': 'British Airways', 'UA': 'United Airlines'}
+CABINS = ['Economy', 'Economy', 'Economy', 'Premium Economy', 'Business', 'First']
+
+
+def generate_records(count: int, seed: int = 42, start_year: int = 2015, years: int = 10) -> List[Dict]:
+    """
+    生成合成飞行记录（相同种子得到相同数据）
+    :param count: 记录数
+    :param seed: 随机种子
+    :param start_year: 最早起飞年份
+    :param years: 覆盖的年数
+    """
+    rng = random.Random(seed)
+    start = datetime(start_year, 1, 1)
+    span_minutes = years * 365 * 24 * 60
+    codes = list(AIRLINES)
+    records = []
+    for _ in range(count):
+        departure, arrival = rng.sample(AIRPORTS, 2)
+        code = rng.choice(codes)
+        dep_time = start + timedelta(minutes=rng.randrange(span_minutes))
+        duration = timedelta(minutes=rng.randint(60, 15 * 60))
+        record = FlightRecord(
+            flight_number=f"{code}{rng.randint(100, 9999)}",
+            departure_airport=departure,
+            arrival_airport=arrival,
+            departure_time=dep_time.isoformat(),
+            arrival_time=(dep_time + duration).isoformat(),
+            airline=AIRLINES[code],
+            cabin_class=rng.choice(CABINS),
+            miles=rng.randint(300, 9000),
+            record_date=(dep_time + duration + timedelta(hours=rng.randint(1, 72))).isoformat()
+        )
+        records.append(asdict(record))
+    return records
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def measure(func: Callable, iterations: int, reset: Optional[Callable] = None) -> Dict:
+    """
+    运行操作若干次，统计延迟与吞吐量；另外单独运行一次测量峰值内存
+    :param reset: 每次运行前调用，用于清空缓存（模拟冷启动）
+    """
+    latencies = []
+    for _ in range(iterations):
+        if reset:
+            reset()
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+
+    if reset:
+        reset()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    total = sum(latencies)
+    return {
+        'iterations': iterations,
+        'throughput_ops': iterations / total if total else None,
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'peak_memory_bytes': peak,
+    }
+
+
+def bench_size(size: int, args) -> Dict:
+    """在临时目录中为一个数据规模运行全部操作"""
+    records = generate_records(size, seed=args.seed)
+    sample = random.Random(args.seed + 1)
+    current_year = datetime.now().year
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='flight_bench_') as workdir:
+        os.chdir(workdir)
+        try:
+            assistant = FlightAssistant(records_layout=args.layout)
+            start = time.perf_counter()
+            assistant.records_store.append(records)
+            load_seconds = time.perf_counter() - start
+            json_store._parse_cache.clear()
+
+            def add_record():
+                record = sample.choice(records)
+                assistant.add_flight_record(**{k: v for k, v in record.items() if k != 'record_date'},
+                                            on_duplicate='allow')
+
+            def make_card():
+                assistant.generate_itinerary_card(sample.choice(records))
+
+            def clear_caches():
+                # 统计结果按数据版本缓存，只清空解析缓存时统计仍命中缓存
+                json_store._parse_cache.clear()
+                with assistant._stats_cache_lock:
+                    assistant._stats_cache.clear()
+
+            probe = FlightRecord(**{k: v for k, v in records[0].items()})
+            operations = {
+                'add_flight_record': (add_record, args.write_iterations),
+                'get_flight_records': (lambda: assistant.get_flight_records(), args.iterations),
+                'get_flight_records_filtered': (
+                    lambda: assistant.get_flight_records(airline='Air China', cabin_class='Business'),
+                    args.iterations),
+                'get_flight_records_limit': (lambda: assistant.get_flight_records(limit=10), args.iterations),
+                'get_flight_statistics_all': (lambda: assistant.get_flight_statistics(), args.iterations),
+                'get_flight_statistics_year': (
+                    lambda: assistant.get_flight_statistics(year=2020), args.iterations),
+                'get_flight_statistics_month': (
+                    lambda: assistant.get_flight_statistics(year=2020, month=6), args.iterations),
+                'check_and_unlock_achievements': (
+                    lambda: assistant.check_and_unlock_achievements(probe), args.iterations),
+                'generate_itinerary_card': (make_card, args.card_iterations),
+            }
+
+            # 热缓存结果在 operations 中，--cold 时冷缓存结果另存于 operations_cold
+            sections = {'operations': None}
+            if args.cold:
+                sections['operations_cold'] = clear_caches
+            results = {'bulk_load_seconds': load_seconds}
+            for section, reset in sections.items():
+                results[section] = {}
+                for name, (func, iterations) in operations.items():
+                    if args.only and name not in args.only:
+                        continue
+                    op = results[section][name] = measure(func, iterations, reset)
+                    label = f"{name} (cold)" if reset else name
+                    print(f"  {label:39s} p50 {op['p50_ms']:9.3f} ms  p95 {op['p95_ms']:9.3f} ms", flush=True)
+            results['current_year_flights'] = assistant.get_flight_statistics(year=current_year).get('total_flights')
+            return results
+        finally:
+            os.chdir(cwd)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(previous: Dict, current: Dict):
+    """打印与历史结果的 p50 对比"""
+    print(f"\n对比 {previous['meta']['git_revision']} -> {current['meta']['git_revision']} (p50)")
+    for size, result in current['results'].items():
+        old = previous['results'].get(size)
+        if not old:
+            continue
+        for section, suffix in (('operations', ''), ('operations_cold', ' (cold)')):
+            for name, op in result.get(section, {}).items():
+                old_op = old.get(section, {}).get(name)
+                if not old_op:
+                    continue
+                change = (op['p50_ms'] - old_op['p50_ms']) / old_op['p50_ms'] * 100 if old_op['p50_ms'] else 0
+                print(f"  {size:>8s} {name + suffix:39s} {old_op['p50_ms']:9.3f} -> {op['p50_ms']:9.3f} ms "
+                      f"({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='飞行智能体规模基准测试')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='记录规模，逗号分隔')
+    parser.add_argument('--layout', default='flat', choices=['flat', 'sharded', 'binary'], help='记录存储布局')
+    parser.add_argument('--seed', type=int, default=42, help='数据生成种子')
+    parser.add_argument('--iterations', type=int, default=20, help='读操作重复次数')
+    parser.add_argument('--write-iterations', type=int, default=5, help='写操作重复次数')
+    parser.add_argument('--card-iterations', type=int, default=5, help='行程卡生成重复次数')
+    parser.add_argument('--cold', action='store_true', help='另外测量每次运行前清空解析缓存和统计缓存的冷启动结果')
+    parser.add_argument('--only', nargs='*', help='只运行指定操作')
+    parser.add_argument('--output', default='bench_results.json', help='结果文件')
+    parser.add_argument('--compare', help='与历史结果文件对比')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'git_revision': git_revision(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'layout': args.layout,
+            'seed': args.seed,
+            'cold': args.cold,
+        },
+        'results': {}
+    }
+    for size in [int(s) for s in args.sizes.split(',')]:
+        print(f"\n== {size:,} 条记录 ({args.layout}) ==", flush=True)
+        report['results'][str(size)] = bench_size(size, args)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ 结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
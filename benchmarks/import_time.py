@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+冷启动导入耗时基准
+使用 python -X importtime 在全新解释器中导入模块，统计累计耗时，
+并检查重量级依赖（PIL、qrcode、requests 等）没有在导入阶段被加载
+
+用法:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 10 --max-ms 30
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认测量的模块
+DEFAULT_MODULES = ['flight_assistant', 'main']
+
+# 导入阶段不应加载的重量级依赖
+HEAVY_MODULES = ['PIL', 'qrcode', 'requests', 'dotenv', 'numpy']
+
+
+def measure_import(module: str) -> Tuple[float, List[Tuple[str, int]]]:
+    """
+    在子进程中导入模块并解析 -X importtime 输出
+    :param module: 模块名
+    :return: (模块累计耗时毫秒, [(被导入模块名, 累计微秒)])
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    entries = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, raw_name = line.split(':', 1)[1].split('|')
+        name = raw_name.strip()
+        entries.append((name, int(cumulative_us)))
+        # 顶层条目（缩进最少）之前的内容属于解释器启动（site 等），不计入
+        if raw_name[1:2] != ' ':
+            if name == module:
+                total_us = int(cumulative_us)
+                break
+            entries = []
+    return total_us / 1000, entries
+
+
+def run_benchmark(modules: List[str], repeat: int) -> Dict[str, Dict]:
+    """多次测量取最小值，返回每个模块的结果"""
+    report = {}
+    for module in modules:
+        best_ms, best_entries = None, []
+        for _ in range(repeat):
+            ms, entries = measure_import(module)
+            if best_ms is None or ms < best_ms:
+                best_ms, best_entries = ms, entries
+        loaded = {name.split('.')[0] for name, _ in best_entries}
+        report[module] = {
+            'import_ms': round(best_ms, 2),
+            'heavy_imports': sorted(m for m in HEAVY_MODULES if m in loaded),
+            'slowest': sorted(best_entries, key=lambda e: e[1], reverse=True)[:10],
+        }
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='冷启动导入耗时基准')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help='要测量的模块')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数（取最小值）')
+    parser.add_argument('--max-ms', type=float, default=None, help='导入耗时上限，超过则返回非零退出码')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.modules, args.repeat)
+    failed = False
+    for module, info in report.items():
+        print(f"\n{module}: {info['import_ms']:.2f} ms")
+        for name, cumulative_us in info['slowest'][:5]:
+            print(f"  {cumulative_us / 1000:8.2f} ms  {name}")
+        if info['heavy_imports']:
+            print(f"  ✗ 导入阶段加载了重量级依赖: {', '.join(info['heavy_imports'])}")
+            failed = True
+        if args.max_ms is not None and info['import_ms'] > args.max_ms:
+            print(f"  ✗ 超过上限 {args.max_ms} ms")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
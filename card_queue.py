@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行程卡后台渲染队列
+新增飞行记录时只把渲染任务写入日志文件并提交给线程池，立即返回；
+工作线程提前生成行程卡，get_card(记录键) 返回已生成的图片或等待对应的 Future。
+
+任务日志为只追加的 JSON Lines 文件，每行一个事件:
+    {"op": "enqueue", "key": ..., "record": {...}}
+    {"op": "done", "key": ..., "path": ...}
+    {"op": "failed", "key": ...}
+进程中途退出时，已入队但没有 done/failed 的任务在下次启动时重新提交；
+启动时日志被压缩为每个键的最新状态
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError
+from typing import Callable, Dict, Optional, Tuple
+
+from json_store import atomic_write_text
+from metrics import REGISTRY
+from record_store import record_key
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3        # 单个任务的渲染尝试次数
+RETRY_BACKOFF = 0.5     # 重试间隔（秒，按次数递增）
+
+
+class CardQueue:
+    """行程卡渲染队列"""
+
+    def __init__(self,
+                 render: Callable[[Dict], Optional[str]],
+                 journal_path: str,
+                 max_workers: int = 2):
+        """
+        :param render: 渲染函数，接收飞行记录字典，返回图片路径，失败返回None
+        :param journal_path: 任务日志文件
+        :param max_workers: 渲染线程数
+        """
+        self.render = render
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        self._ready: Dict[str, str] = {}
+        # 记录键 -> (任务序号, Future)；同一键被重新提交后，旧任务的结果不再生效
+        self._pending: Dict[str, Tuple[int, Future]] = {}
+        self._sequence = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='card-render')
+        self._recover()
+
+    def _recover(self):
+        """读取任务日志：恢复已生成的行程卡，重新提交未完成的任务，并压缩日志"""
+        pending: Dict[str, Dict] = {}
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 写了一半的最后一行
+                    key = event.get('key')
+                    if event.get('op') == 'enqueue':
+                        pending[key] = event['record']
+                        self._ready.pop(key, None)
+                    elif event.get('op') == 'done':
+                        pending.pop(key, None)
+                        self._ready[key] = event['path']
+                    elif event.get('op') == 'failed':
+                        pending.pop(key, None)
+        except FileNotFoundError:
+            pass
+
+        self._ready = {k: p for k, p in self._ready.items() if os.path.exists(p)}
+        lines = [json.dumps({'op': 'done', 'key': k, 'path': p}, ensure_ascii=False) for k, p in self._ready.items()]
+        lines += [json.dumps({'op': 'enqueue', 'key': k, 'record': r}, ensure_ascii=False) for k, r in pending.items()]
+        if lines or os.path.exists(self.journal_path):
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+            atomic_write_text(self.journal_path, ''.join(line + '\n' for line in lines))
+
+        if pending:
+            logger.info(f"重新提交未完成的行程卡任务: {len(pending)}个")
+        for record in pending.values():
+            self._enqueue(record)
+
+    def _log(self, event: Dict, fsync: bool = False):
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def _enqueue(self, record: Dict) -> Future:
+        key = record_key(record)
+        with self._lock:
+            job = next(self._sequence)
+            # 同一键的旧任务：尚未开始的直接取消，正在渲染的由新任务等待其结束后再渲染（输出路径相同）
+            previous = self._pending.get(key)
+            running = previous[1] if previous is not None and not previous[1].cancel() else None
+            try:
+                future = self._executor.submit(self._run, key, job, dict(record), running)
+            except RuntimeError:
+                # 队列已关闭（如所属用户刚被淘汰）：任务已写入日志，下次打开时重试
+                logger.warning(f"行程卡队列已关闭，任务留待下次启动: {key}")
+                future = Future()
+                future.set_result(None)
+                return future
+            self._pending[key] = (job, future)
+            self._ready.pop(key, None)
+        return future
+
+    def _run(self, key: str, job: int, record: Dict, previous: Optional[Future] = None) -> Optional[str]:
+        """渲染任务（在工作线程中运行），失败时按次数退避重试"""
+        if previous is not None:
+            try:
+                previous.result()
+            except Exception:
+                pass  # 旧任务的结果不再使用
+            with self._lock:
+                current = self._pending.get(key)
+            if current is None or current[0] != job:
+                return None  # 等待期间又被重新提交，直接让位给更新的任务
+        path = None
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(RETRY_BACKOFF * attempt)
+            try:
+                with REGISTRY.time('card_render_seconds'):
+                    path = self.render(record)
+            except Exception as e:
+                logger.error(f"行程卡渲染异常: {key}: {e}")
+            if path:
+                break
+        REGISTRY.inc('card_render_total', result='ok' if path else 'failed')
+        if not path:
+            logger.error(f"行程卡渲染失败（已尝试{MAX_ATTEMPTS}次）: {key}")
+
+        with self._lock:
+            current = self._pending.get(key)
+            if current is None or current[0] != job:
+                return path  # 已被重新提交，以新任务为准
+            del self._pending[key]
+            if path:
+                self._ready[key] = path
+        self._log({'op': 'done', 'key': key, 'path': path} if path else {'op': 'failed', 'key': key})
+        return path
+
+    def submit(self, record: Dict, replace: bool = False) -> Future:
+        """
+        提交渲染任务（先写日志再入队，立即返回；队列已关闭时只写日志）
+        :param record: 飞行记录字典
+        :param replace: 已有行程卡时是否重新渲染（如记录被覆盖更新）
+        :return: 结果为图片路径的 Future
+        """
+        key = record_key(record)
+        if not replace:
+            with self._lock:
+                if key in self._pending:
+                    return self._pending[key][1]
+                if key in self._ready:
+                    future = Future()
+                    future.set_result(self._ready[key])
+                    return future
+        self._log({'op': 'enqueue', 'key': key, 'record': record}, fsync=True)
+        return self._enqueue(record)
+
+    def get_card(self, key: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        取得行程卡路径：已生成时立即返回，正在渲染时等待
+        :param key: 记录键（FlightRecord.get_key）
+        :param timeout: 最长等待秒数（None 为一直等待）
+        :return: 图片路径，未入队、渲染失败、等待超时或任务已取消（队列关闭）返回None
+        """
+        with self._lock:
+            path = self._ready.get(key)
+            pending = self._pending.get(key)
+        if path is not None:
+            return path
+        while pending is not None:
+            try:
+                return pending[1].result(timeout=timeout)
+            except TimeoutError:
+                return None
+            except CancelledError:
+                # 被同一键的新任务取代时等待新任务，队列关闭时返回None
+                with self._lock:
+                    newer = self._pending.get(key)
+                if newer is None or newer[0] == pending[0]:
+                    return None
+                pending = newer
+        return None
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def close(self, wait: bool = True):
+        """停止工作线程；wait=False 时丢弃尚未开始的任务（下次启动时按日志重试）"""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
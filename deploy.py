@@ -1,28 +1,253 @@
+"""
+Dify 应用部署脚本
+
+两种模式:
+- 清单模式: 存在部署清单（默认 deploy_manifest.json，或 DIFY_DEPLOY_MANIFEST 指定）时，
+  按清单把 DSL 文件部署到对应应用。每个 DSL 的内容哈希记录在 .deploy_state.json，
+  内容未变的应用直接跳过，变化的应用通过共享连接池并发部署（失败自动重试、指数退避）
+- 单应用模式: 没有清单时沿用原来的行为，部署 DIFY_APP_ID
+
+清单格式（参考 deploy_manifest.example.json，app_id 支持 ${环境变量} 引用，便于放在 CI secrets 中；
+CI 通过 DIFY_DEPLOY_MANIFEST 直接使用该示例清单）:
+{
+  "apps": [
+    {"dsl": "DSL/飞行价格监控.yml", "app_id": "${DIFY_PRICE_MONITOR_APP_ID}"}
+  ]
+}
+
+用法:
+    python deploy.py [--force] [--dry-run] [--workers 8]
+    python deploy.py --stub-server 8780   # 本地桩服务，配合 DIFY_API_BASE=http://127.0.0.1:8780/v1 测试
+"""
+
+import argparse
+import hashlib
+import json
 import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from json_store import read_json, write_json
+
+DEFAULT_API_BASE = "https://api.dify.ai/v1"
+MANIFEST_FILE = "deploy_manifest.json"
+STATE_FILE = ".deploy_state.json"
+ENV_REFERENCE = re.compile(r"\$\{(\w+)\}")
+
+
+def create_session(pool_size=8, retries=3, backoff=0.5):
+    """带连接池和重试的会话：连接错误及 429/5xx 响应按指数退避重试"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def deploy_app(session, api_base, api_key, app_id, dsl_content=None, timeout=30):
+    """调用部署接口（根据实际接口调整），dsl_content 为空时只触发部署"""
+    url = f"{api_base.rstrip('/')}/apps/{app_id}/deploy"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    body = {"yaml_content": dsl_content} if dsl_content is not None else None
+    response = session.post(url, headers=headers, json=body, timeout=timeout)
+    response.raise_for_status()
+    return response.json() if response.content else {}
+
+
+def resolve_env(value):
+    """展开 ${ENV} 引用，引用的环境变量未设置时返回 None"""
+    missing = [name for name in ENV_REFERENCE.findall(value) if not os.getenv(name)]
+    if missing:
+        return None
+    return ENV_REFERENCE.sub(lambda m: os.environ[m.group(1)], value)
+
+
+def load_manifest(path):
+    """读取清单，返回 [(dsl路径, app_id)]；DSL 路径相对于清单所在目录"""
+    manifest = read_json(path, {}) or {}
+    base = os.path.dirname(os.path.abspath(path))
+    apps = []
+    for item in manifest.get("apps", []):
+        app_id = resolve_env(str(item["app_id"]))
+        if not app_id:
+            print(f"跳过 {item['dsl']}：app_id 引用的环境变量未设置")
+            continue
+        apps.append((os.path.join(base, item["dsl"]), app_id))
+    return apps
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def deploy_manifest(manifest_path, api_key, api_base, state_path=STATE_FILE,
+                    workers=8, force=False, dry_run=False):
+    """
+    按清单增量部署：只部署内容哈希与上次成功部署不同的应用
+    :return: (成功数, 失败数, 跳过数)
+    """
+    state = read_json(state_path, {}) or {}
+    pending = []
+    skipped = missing = 0
+    for dsl_path, app_id in load_manifest(manifest_path):
+        try:
+            digest = file_sha256(dsl_path)
+        except OSError as e:
+            # DSL 文件缺失或不可读时记为失败，不影响其他应用
+            missing += 1
+            print(f"  ✗ {app_id} <- {os.path.relpath(dsl_path)}: 无法读取 DSL 文件 ({e.strerror})")
+            continue
+        if not force and state.get(app_id, {}).get("sha256") == digest:
+            skipped += 1
+            continue
+        pending.append((dsl_path, app_id, digest))
+
+    print(f"共 {len(pending) + skipped + missing} 个应用，{len(pending)} 个需要部署，{skipped} 个未变化")
+    if dry_run or not pending:
+        for dsl_path, app_id, _ in pending:
+            print(f"  待部署 {app_id} <- {os.path.relpath(dsl_path)}")
+        return 0, missing, skipped
+
+    session = create_session(pool_size=workers)
+
+    def deploy_one(item):
+        dsl_path, app_id, digest = item
+        start = time.perf_counter()
+        try:
+            with open(dsl_path, "r", encoding="utf-8") as f:
+                content = f.read()
+            deploy_app(session, api_base, api_key, app_id, content)
+            return item, None, time.perf_counter() - start
+        except Exception as e:
+            return item, e, time.perf_counter() - start
+
+    succeeded, failed = 0, missing
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (dsl_path, app_id, digest), error, elapsed in pool.map(deploy_one, pending):
+            name = os.path.relpath(dsl_path)
+            if error is None:
+                succeeded += 1
+                state[app_id] = {"dsl": name, "sha256": digest, "deployed_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                print(f"  ✓ {app_id} <- {name} ({elapsed:.2f}s)")
+            else:
+                failed += 1
+                print(f"  ✗ {app_id} <- {name}: {error}")
+
+    # 只记录成功的部署，失败的应用下次运行时会重试
+    write_json(state_path, state)
+    return succeeded, failed, skipped
+
+
+def make_stub_server(port, fail_rate=0.0, fail_first=0, verbose=True):
+    """
+    本地部署接口桩：返回成功，可按比例（或前 fail_first 次）返回 503 以测试重试
+    收到的请求按顺序记录在 server.requests 中：(app_id, 状态码, 请求体)
+    :param port: 监听端口（0 为自动分配，实际端口见 server.server_address）
+    """
+    import random
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            match = re.fullmatch(r"/v1/apps/([^/]+)/deploy", self.path)
+            with lock:
+                attempt = len(server.requests)
+                if not match:
+                    status, payload = 404, {"error": "not found"}
+                elif attempt < fail_first or random.random() < fail_rate:
+                    status, payload = 503, {"error": "unavailable"}
+                else:
+                    status, payload = 200, {"result": "success", "app_id": match.group(1), "bytes": len(body)}
+                server.requests.append((match.group(1) if match else None, status, body))
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            if verbose:
+                print(f"[stub] {self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.requests = []
+    return server
+
+
+def run_stub_server(port, fail_rate=0.0):
+    """启动本地部署接口桩（阻塞运行）"""
+    server = make_stub_server(port, fail_rate)
+    print(f"部署桩服务已启动: http://127.0.0.1:{server.server_address[1]}/v1")
+    server.serve_forever()
+
 
 def main():
+    parser = argparse.ArgumentParser(description="部署 Dify 应用")
+    parser.add_argument("--manifest", default=os.getenv("DIFY_DEPLOY_MANIFEST", MANIFEST_FILE), help="部署清单")
+    parser.add_argument("--state", default=STATE_FILE, help="部署状态文件")
+    parser.add_argument("--workers", type=int, default=8, help="并发部署数")
+    parser.add_argument("--force", action="store_true", help="忽略状态文件，全部重新部署")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要部署的应用")
+    parser.add_argument("--stub-server", type=int, metavar="PORT", help="启动本地部署接口桩")
+    parser.add_argument("--stub-fail-rate", type=float, default=0.0, help="桩服务返回 503 的比例")
+    args = parser.parse_args()
+
+    if args.stub_server:
+        run_stub_server(args.stub_server, args.stub_fail_rate)
+        return
+
     # 从环境变量获取密钥和应用 ID
     dify_api_key = os.getenv("DIFY_API_KEY")
+    api_base = os.getenv("DIFY_API_BASE", DEFAULT_API_BASE)
+
+    if os.path.exists(args.manifest):
+        if not dify_api_key:
+            print("Error: DIFY_API_KEY 未设置")
+            sys.exit(1)
+        succeeded, failed, skipped = deploy_manifest(
+            args.manifest, dify_api_key, api_base, args.state,
+            workers=args.workers, force=args.force, dry_run=args.dry_run
+        )
+        print(f"部署完成：成功 {succeeded}，失败 {failed}，跳过 {skipped}")
+        if failed:
+            sys.exit(1)
+        return
+
     dify_app_id = os.getenv("DIFY_APP_ID")
-    
     if not dify_api_key or not dify_app_id:
         print("Error: DIFY_API_KEY 或 DIFY_APP_ID 未设置")
-        return
-    
-    # Dify 部署接口（根据实际接口调整）
-    url = f"https://api.dify.ai/v1/apps/{dify_app_id}/deploy"
-    headers = {
-        "Authorization": f"Bearer {dify_api_key}",
-        "Content-Type": "application/json"
-    }
-    
+        sys.exit(1)
+
     try:
-        response = requests.post(url, headers=headers)
-        response.raise_for_status()
-        print("部署成功！", response.json())
+        result = deploy_app(create_session(pool_size=1), api_base, dify_api_key, dify_app_id)
+        print("部署成功！", result)
     except Exception as e:
         print("部署失败：", str(e))
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
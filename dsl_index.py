@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dify 工作流 DSL 索引
+并行解析 DSL/ 下的全部 YAML 文件（优先使用 libyaml 的 CSafeLoader），
+提取节点类型、代码节点导入的 Python 模块、变量名和模型，结果缓存在 .dsl_index.json，
+按 (mtime, size) 判断是否需要重新读取，内容哈希未变时沿用旧结果
+
+用法:
+    python dsl_index.py build
+    python dsl_index.py query --node-type code --import main
+    python dsl_index.py query --variable departure --model gpt-4o
+    python dsl_index.py stats
+"""
+
+import argparse
+import ast
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from json_store import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DSL_DIR = os.path.join(PROJECT_ROOT, 'DSL')
+INDEX_FILE = os.path.join(PROJECT_ROOT, '.dsl_index.json')
+INDEX_VERSION = 1
+
+IMPORT_PATTERN = re.compile(r'^\s*(?:from\s+([\w.]+)\s+import\s+([\w., ]+)|import\s+([\w., ]+))', re.MULTILINE)
+
+
+def _yaml_loader():
+    import yaml
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def _code_imports(code: str) -> List[str]:
+    """代码中导入的模块和名称（'main'、'main.monitor_flight_price'），语法错误时退化为正则"""
+    imports = set()
+    try:
+        for node in ast.walk(ast.parse(code)):
+            if isinstance(node, ast.ImportFrom) and node.module:
+                imports.add(node.module)
+                imports.update(f"{node.module}.{alias.name}" for alias in node.names)
+            elif isinstance(node, ast.Import):
+                imports.update(alias.name for alias in node.names)
+    except SyntaxError:
+        for module, names, plain in IMPORT_PATTERN.findall(code):
+            if module:
+                imports.add(module)
+                imports.update(f"{module}.{n.strip().split(' ')[0]}" for n in names.split(',') if n.strip())
+            else:
+                imports.update(n.strip().split(' ')[0] for n in plain.split(',') if n.strip())
+    return sorted(imports)
+
+
+def _variable_names(variables) -> List[str]:
+    """兼容 Dify 导出格式 [{'variable': 'x'}] 与简写格式 [{'x': {...}}]"""
+    names = []
+    for item in variables or []:
+        if not isinstance(item, dict):
+            continue
+        if 'variable' in item:
+            names.append(str(item['variable']))
+        elif 'name' in item:
+            names.append(str(item['name']))
+        elif len(item) == 1:
+            names.append(str(next(iter(item))))
+    return names
+
+
+def parse_dsl(path: str) -> Dict:
+    """解析单个DSL文件，提取可查询的字段（在子进程中运行）"""
+    import yaml
+    with open(path, 'rb') as f:
+        content = f.read()
+    entry = {'sha256': hashlib.sha256(content).hexdigest()}
+    try:
+        doc = yaml.load(content, Loader=_yaml_loader()) or {}
+    except yaml.YAMLError as e:
+        entry['error'] = str(e).split('\n')[0]
+        return entry
+    if not isinstance(doc, dict):
+        entry['error'] = f"顶层应为映射，实际为 {type(doc).__name__}"
+        return entry
+
+    app = doc.get('app') or {}
+    workflow = doc.get('workflow') or {}
+    graph = workflow.get('graph') or workflow
+    node_types: Dict[str, int] = {}
+    imports, variables, models = set(), set(), set()
+
+    for node in graph.get('nodes') or []:
+        data = node.get('data') or {}
+        node_type = data.get('type') or node.get('type') or 'unknown'
+        node_types[node_type] = node_types.get(node_type, 0) + 1
+        if isinstance(data.get('code'), str) and data.get('code_language', 'python3').startswith('python'):
+            imports.update(_code_imports(data['code']))
+        variables.update(_variable_names(data.get('variables')))
+        model = data.get('model')
+        if isinstance(model, dict) and model.get('name'):
+            models.add(model['name'])
+
+    for key in ('conversation_variables', 'environment_variables'):
+        variables.update(_variable_names(workflow.get(key)))
+    model = (doc.get('model_config') or {}).get('model')
+    if isinstance(model, dict) and model.get('name'):
+        models.add(model['name'])
+
+    entry.update({
+        'name': app.get('name'),
+        'mode': app.get('mode'),
+        'node_types': node_types,
+        'imports': sorted(imports),
+        'variables': sorted(variables),
+        'models': sorted(models),
+    })
+    return entry
+
+
+def discover(root: str = DSL_DIR) -> List[str]:
+    """DSL目录下全部 .yml/.yaml 文件（相对路径，递归）"""
+    paths = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(('.yml', '.yaml')):
+                paths.append(os.path.relpath(os.path.join(directory, name), root))
+    return sorted(paths)
+
+
+def build_index(root: str = DSL_DIR, index_file: str = INDEX_FILE, max_workers: Optional[int] = None) -> Dict:
+    """
+    增量构建索引：(mtime, size) 未变的文件直接沿用，变化的文件在进程池中重新解析
+    :return: 索引 {'version', 'root', 'files': {相对路径: 条目}}
+    """
+    cached = read_json(index_file, None) or {}
+    old_files = cached.get('files', {}) if cached.get('version') == INDEX_VERSION else {}
+    files, pending = {}, []
+    for rel in discover(root):
+        st = os.stat(os.path.join(root, rel))
+        old = old_files.get(rel)
+        if old and old.get('mtime_ns') == st.st_mtime_ns and old.get('size') == st.st_size:
+            files[rel] = old
+        else:
+            pending.append((rel, st))
+
+    if pending:
+        paths = [os.path.join(root, rel) for rel, _ in pending]
+        if len(pending) == 1:
+            parsed = [parse_dsl(paths[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                parsed = list(pool.map(parse_dsl, paths))
+        for (rel, st), entry in zip(pending, parsed):
+            old = old_files.get(rel)
+            # 只是 mtime 变化（如 git checkout）而内容未变时，沿用旧条目
+            if old and old.get('sha256') == entry['sha256'] and 'error' not in old:
+                entry = dict(old)
+            entry.update({'mtime_ns': st.st_mtime_ns, 'size': st.st_size})
+            files[rel] = entry
+            if 'error' in entry:
+                logger.warning(f"DSL解析失败 {rel}: {entry['error']}")
+
+    index = {'version': INDEX_VERSION, 'root': os.path.abspath(root), 'files': files}
+    if pending or set(files) != set(old_files):
+        write_json(index_file, index, fsync=False)
+    return index
+
+
+def query(index: Dict,
+          node_type: Optional[str] = None,
+          module: Optional[str] = None,
+          variable: Optional[str] = None,
+          model: Optional[str] = None) -> List[str]:
+    """
+    按条件查询工作流（条件之间为"且"）
+    :param node_type: 包含该类型节点（如 code、llm、http-request）
+    :param module: 代码节点导入了该模块或名称（如 main、main.monitor_flight_price）
+    :param variable: 使用了该变量名
+    :param model: 使用了该模型（子串匹配，如 gpt-4o）
+    :return: 匹配的DSL相对路径
+    """
+    results = []
+    for rel, entry in index['files'].items():
+        if 'error' in entry:
+            continue
+        if node_type and node_type not in entry['node_types']:
+            continue
+        if module and module not in entry['imports']:
+            continue
+        if variable and variable not in entry['variables']:
+            continue
+        if model and not any(model in m for m in entry['models']):
+            continue
+        results.append(rel)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dify 工作流 DSL 索引')
+    parser.add_argument('--root', default=DSL_DIR, help='DSL目录')
+    parser.add_argument('--index', default=INDEX_FILE, help='索引缓存文件')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('build', help='构建/更新索引')
+    sub.add_parser('stats', help='节点类型、导入和模型的汇总')
+    q = sub.add_parser('query', help='查询工作流')
+    q.add_argument('--node-type')
+    q.add_argument('--import', dest='module')
+    q.add_argument('--variable')
+    q.add_argument('--model')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(args.root, args.index)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if args.command == 'build':
+        errors = sum(1 for e in index['files'].values() if 'error' in e)
+        print(f"✓ 已索引 {len(index['files'])} 个DSL文件（{errors} 个解析失败），耗时 {elapsed:.1f} ms")
+    elif args.command == 'query':
+        start = time.perf_counter()
+        results = query(index, args.node_type, args.module, args.variable, args.model)
+        for rel in results:
+            print(rel)
+        print(f"共 {len(results)} 个（查询 {(time.perf_counter() - start) * 1000:.2f} ms）", file=sys.stderr)
+    else:
+        totals: Dict[str, Dict[str, int]] = {'node_types': {}, 'imports': {}, 'models': {}}
+        for entry in index['files'].values():
+            for key in totals:
+                for value in entry.get(key, []):
+                    totals[key][value] = totals[key].get(value, 0) + 1
+        for key, counts in totals.items():
+            print(f"\n{key}:")
+            for value, count in sorted(counts.items(), key=lambda x: -x[1]):
+                print(f"  {count:4d}  {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@
 展示更复杂的场景和集成方式
 """
 
-from flight_assistant import FlightAssistant
+from flight_assistant import FlightAssistant, setup_logging
 from datetime import datetime, timedelta
 import json
 
@@ -52,12 +52,10 @@ def example_1_batch_import():
         }
     ]
     
-    for flight in flights:
-        result = assistant.add_flight_record(**flight)
-        status = "✓" if result else "✗"
-        print(f"{status} 导入 {flight['flight_number']}")
+    # 重复运行时已存在的航班会被跳过，不会重复计入统计和成就
+    result = assistant.add_flight_records(flights)
     
-    print(f"\n✓ 共导入 {len(flights)} 条记录")
+    print(f"\n✓ 新增 {result['added']} 条记录，跳过重复 {result['skipped']} 条")
 
 
 def example_2_advanced_statistics():
@@ -284,6 +282,7 @@ def example_8_performance_stats():
 
 def main():
     """运行所有示例"""
+    setup_logging()
     print("\n" + "="*60)
     print("🛫 飞行智能体 - 高级用法示例")
     print("="*60)
@@ -6,38 +6,130 @@
 """
 
 import os
+import atexit
+import hashlib
+import heapq
+import itertools
 import json
 import logging
+import queue
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, asdict
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
-import requests
-from dotenv import load_dotenv
+from dataclasses import dataclass, asdict, replace
+from airports import flight_distance, is_international
+from json_store import create_json_if_missing, file_lock, read_json, read_json_cached, write_json
+from record_store import create_record_store, record_key
+from metrics import PROFILER, REGISTRY, instrument
+from price_detector import DropDetectorConfig, PriceDropDetector, is_valid_price
 
-# 加载环境变量
-load_dotenv()
+# 注意：qrcode、PIL、requests、dotenv 均在首次使用时才导入，
+# 日志输出需显式调用 setup_logging()，以保证导入本模块足够快
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('flight_assistant.log'),
+logger = logging.getLogger(__name__)
+
+_env_loaded = False
+_log_listener = None
+_debug_sample_rate = 100
+_debug_counters: Dict[str, itertools.count] = {}
+
+
+def load_env():
+    """加载 .env 环境变量（仅首次调用生效）"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def setup_logging(level: Optional[str] = None,
+                  log_file: str = 'flight_assistant.log',
+                  max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 5,
+                  sample_rate: Optional[int] = None):
+    """
+    配置日志输出到文件和控制台（重复调用不会重复添加处理器）
+    日志记录只入队，由后台线程写入按大小轮转的文件和控制台，调用方不等待磁盘IO
+    :param level: 日志级别，默认读取环境变量 LOG_LEVEL
+    :param log_file: 日志文件路径
+    :param max_bytes: 单个日志文件大小上限，超过后轮转
+    :param backup_count: 保留的历史日志文件数
+    :param sample_rate: 高频调试日志的采样间隔（每N次记录1次），默认读取 LOG_SAMPLE_RATE
+    """
+    global _log_listener, _debug_sample_rate
+    load_env()
+    if sample_rate is None:
+        sample_rate = int(os.getenv('LOG_SAMPLE_RATE', _debug_sample_rate))
+    _debug_sample_rate = max(1, sample_rate)
+    if _log_listener is not None:
+        return
+    
+    from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+    
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'),
         logging.StreamHandler()
     ]
-)
-logger = logging.getLogger(__name__)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel((level or os.getenv('LOG_LEVEL', 'INFO')).upper())
+    
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台日志线程并写出队列中剩余的日志"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+def _sampled_debug(key: str, msg: str, *args):
+    """
+    高频路径的采样调试日志：每个key每N次调用只记录1次
+    未开启DEBUG级别时只做一次级别判断，不格式化消息
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    counter = _debug_counters.get(key)
+    if counter is None:
+        counter = _debug_counters.setdefault(key, itertools.count())
+    if next(counter) % _debug_sample_rate == 0:
+        logger.debug(msg, *args)
+
 
 # 常量定义
 FLIGHT_RECORDS_FILE = 'flight_records.json'
+FLIGHT_RECORDS_DIR = 'flight_records'  # 分片布局的目录
 ACHIEVEMENTS_FILE = 'achievements.json'
 PRICE_ALERTS_FILE = 'price_alerts.json'
 FLIGHT_CARDS_DIR = 'flight_cards'
+CARD_JOURNAL_FILE = 'card_jobs.jsonl'  # 行程卡后台渲染的任务日志
 DOMESTIC_COUNTRIES = {'CN'}  # 国内标识
+STATS_CACHE_SIZE = 256  # 统计报告缓存条数（按最近使用淘汰）
+PRICE_CACHE_SIZE = 4096  # 价格缓存条数（按最近使用淘汰，写入时先清理过期条目）
+
+
+def _copy_stats(stats: Dict) -> Dict:
+    """复制统计结果（缓存中的对象不交给调用方修改）"""
+    return dict(stats,
+                airline_preference=dict(stats['airline_preference']),
+                cabin_distribution=dict(stats['cabin_distribution']))
+
 
 @dataclass
 class FlightRecord:
@@ -57,8 +149,8 @@ class FlightRecord:
             self.record_date = datetime.now().isoformat()
 
     def is_international(self) -> bool:
-        """判断是否为国际航班"""
-        return not (self.departure_airport[0] == 'Z' and self.arrival_airport[0] == 'Z')
+        """判断是否为国际航班（按机场所属国家/地区）"""
+        return is_international(self.departure_airport, self.arrival_airport, DOMESTIC_COUNTRIES)
     
     def get_key(self) -> str:
         """生成唯一标识符"""
@@ -68,17 +160,38 @@ class FlightRecord:
 class FlightAssistant:
     """飞行智能体主类"""
     
-    def __init__(self):
-        """初始化飞行助手"""
-        self.records_file = FLIGHT_RECORDS_FILE
-        self.achievements_file = ACHIEVEMENTS_FILE
-        self.price_alerts_file = PRICE_ALERTS_FILE
-        self.flight_cards_dir = FLIGHT_CARDS_DIR
-        
-        # 创建必要目录
-        Path(self.flight_cards_dir).mkdir(exist_ok=True)
+    def __init__(self,
+                 detector_config: Optional[DropDetectorConfig] = None,
+                 records_layout: Optional[str] = None,
+                 data_dir: Optional[str] = None,
+                 card_workers: Optional[int] = None):
+        """
+        初始化飞行助手
+        :param detector_config: 价格下跌检测配置（可选）
+        :param records_layout: 飞行记录存储布局 'flat'（单文件）、'sharded'（按起飞年月分片）
+                               或 'binary'（定长二进制行 + mmap），
+                               默认读取环境变量 FLIGHT_RECORDS_LAYOUT
+        :param data_dir: 数据目录（可选，默认当前目录），多用户部署时每个用户一个目录
+        :param card_workers: 行程卡后台渲染线程数，大于0时新增记录后在后台预先生成行程卡，
+                             默认读取环境变量 CARD_RENDER_WORKERS（0 为关闭）
+        """
+        load_env()
+        self.data_dir = data_dir
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+        base = data_dir or ''
+        self.records_file = os.path.join(base, FLIGHT_RECORDS_FILE)
+        self.records_dir = os.path.join(base, FLIGHT_RECORDS_DIR)
+        self.achievements_file = os.path.join(base, ACHIEVEMENTS_FILE)
+        self.price_alerts_file = os.path.join(base, PRICE_ALERTS_FILE)
+        self.flight_cards_dir = os.path.join(base, FLIGHT_CARDS_DIR)
         
         # 初始化数据文件
+        self.records_store = create_record_store(
+            records_layout or os.getenv('FLIGHT_RECORDS_LAYOUT', 'flat'),
+            self.records_file,
+            self.records_dir
+        )
         self._init_data_files()
         
         # 从环境变量读取API密钥
@@ -87,33 +200,73 @@ class FlightAssistant:
         self.flight_cookie = os.getenv('FLIGHT_COOKIE', '')
         self.price_check_interval = int(os.getenv('PRICE_CHECK_INTERVAL_HOURS', 24))
         
-        logger.info("飞行智能体初始化成功")
+        # 可选的采样剖析（默认关闭）
+        profile_rate = float(os.getenv('PROFILE_SAMPLE_RATE', 0) or 0)
+        if profile_rate > 0:
+            PROFILER.enable(profile_rate, trace_memory=os.getenv('PROFILE_TRACE_MEMORY') == '1')
+        
+        # 价格下跌检测配置
+        self.detector_config = detector_config or DropDetectorConfig()
+        
+        # 价格缓存：(出发地, 目的地, 日期) -> (查询时间戳, 价格信息)，按最近使用淘汰
+        self._price_cache: "OrderedDict[Tuple[str, str, str], Tuple[float, Dict]]" = OrderedDict()
+        self._price_cache_lock = threading.Lock()
+        
+        # 统计报告缓存：(年, 月) -> (记录存储版本, 统计信息)，存储有写入后自动失效
+        self._stats_cache: "OrderedDict[Tuple, Tuple[Tuple, Dict]]" = OrderedDict()
+        self._stats_cache_lock = threading.Lock()
+        
+        # HTTP连接池（首次查询价格时创建）
+        self._session = None
+        self._session_lock = threading.Lock()
+        
+        # 行程卡后台渲染队列（可选），启动时重新提交上次未完成的任务
+        self.card_queue = None
+        if card_workers is None:
+            card_workers = int(os.getenv('CARD_RENDER_WORKERS', 0) or 0)
+        if card_workers > 0:
+            from card_queue import CardQueue
+            self.card_queue = CardQueue(self.generate_itinerary_card,
+                                        os.path.join(base, CARD_JOURNAL_FILE),
+                                        max_workers=card_workers)
+        
+        logger.info(f"飞行智能体初始化成功{f' ({data_dir})' if data_dir else ''}")
     
     def _init_data_files(self):
         """初始化数据文件"""
-        for file_path in [self.records_file, self.achievements_file, self.price_alerts_file]:
-            if not Path(file_path).exists():
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump([], f, ensure_ascii=False, indent=2)
+        if self.records_store.init():
+            logger.info(f"创建飞行记录存储: {self.records_store.layout}")
+        for file_path in [self.achievements_file, self.price_alerts_file]:
+            if not Path(file_path).exists() and create_json_if_missing(file_path, []):
                 logger.info(f"创建数据文件: {file_path}")
     
+    def close(self):
+        """释放后台资源：停止行程卡渲染线程（未开始的任务下次启动时重试）、关闭HTTP连接池"""
+        if self.card_queue is not None:
+            self.card_queue.close(wait=False)
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+    
+    @instrument('load_json')
     def _load_json(self, file_path: str) -> List:
         """加载JSON数据文件"""
         try:
-            if not Path(file_path).exists():
-                return []
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return read_json(file_path, [])
         except Exception as e:
             logger.error(f"读取文件 {file_path} 失败: {e}")
             return []
     
+    @instrument('save_json')
     def _save_json(self, file_path: str, data: List) -> bool:
-        """保存JSON数据文件"""
+        """
+        保存JSON数据文件（写临时文件后原子替换）
+        读-改-写场景需由调用方持有 file_lock(file_path)
+        """
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logger.info(f"数据保存到 {file_path}")
+            write_json(file_path, data)
+            _sampled_debug('save_json', "数据保存到 %s", file_path)
             return True
         except Exception as e:
             logger.error(f"保存文件 {file_path} 失败: {e}")
@@ -121,6 +274,7 @@ class FlightAssistant:
 
     # ===================== 功能1：飞行记录管理 =====================
     
+    @instrument('add_flight_record')
     def add_flight_record(self, 
                          flight_number: str,
                          departure_airport: str,
@@ -129,7 +283,8 @@ class FlightAssistant:
                          arrival_time: str,
                          airline: str,
                          cabin_class: str,
-                         miles: int) -> bool:
+                         miles: Optional[int] = None,
+                         on_duplicate: str = 'reject') -> bool:
         """
         添加飞行记录
         :param flight_number: 航班号
@@ -139,63 +294,119 @@ class FlightAssistant:
         :param arrival_time: 降落时间 (ISO格式)
         :param airline: 航空公司
         :param cabin_class: 舱位
-        :param miles: 飞行里程
-        :return: 是否成功添加
+        :param miles: 飞行里程（可选，不填时按机场间大圆距离自动计算）
+        :param on_duplicate: 同一航班（FlightRecord.get_key 相同）已存在时的处理：
+                             'reject' 忽略（默认）、'upsert' 覆盖、'allow' 照常追加
+        :return: 是否成功添加或更新
         """
         try:
-            record = FlightRecord(
-                flight_number=flight_number,
-                departure_airport=departure_airport,
-                arrival_airport=arrival_airport,
-                departure_time=departure_time,
-                arrival_time=arrival_time,
-                airline=airline,
-                cabin_class=cabin_class,
-                miles=miles
-            )
+            record = self._build_record({
+                'flight_number': flight_number,
+                'departure_airport': departure_airport,
+                'arrival_airport': arrival_airport,
+                'departure_time': departure_time,
+                'arrival_time': arrival_time,
+                'airline': airline,
+                'cabin_class': cabin_class,
+                'miles': miles
+            })
+            if record is None:
+                return False
             
-            records = self._load_json(self.records_file)
-            records.append(asdict(record))
+            result = self.records_store.append([asdict(record)], on_duplicate=on_duplicate)
+            if result['skipped']:
+                logger.warning(f"飞行记录已存在，已忽略: {record.get_key()}")
+                return False
+            logger.info(f"飞行记录已{'更新' if result['updated'] else '添加'}: {flight_number}")
+            if self.card_queue is not None:
+                self.card_queue.submit(asdict(record), replace=bool(result['updated']))
             
-            if self._save_json(self.records_file, records):
-                logger.info(f"飞行记录已添加: {flight_number}")
-                
-                # 触发成就检测
+            # 触发成就检测
+            if result['added']:
                 self.check_and_unlock_achievements(record)
-                return True
-            return False
+            return True
             
         except Exception as e:
             logger.error(f"添加飞行记录失败: {e}")
             return False
     
+    def _build_record(self, flight: Dict) -> Optional[FlightRecord]:
+        """由字段字典构造飞行记录，未提供里程时按机场自动计算，无法计算时返回None"""
+        if flight.get('miles') is None:
+            miles = flight_distance(flight['departure_airport'], flight['arrival_airport'])
+            if miles is None:
+                logger.error(f"无法自动计算里程，未知机场: "
+                             f"{flight['departure_airport']}-{flight['arrival_airport']}")
+                return None
+            flight = dict(flight, miles=miles)
+        return FlightRecord(**flight)
+    
+    @instrument('add_flight_records')
+    def add_flight_records(self, flights: List[Dict], on_duplicate: str = 'reject') -> Dict[str, int]:
+        """
+        批量导入飞行记录（一次写入，按记录键索引判重）
+        :param flights: add_flight_record 参数组成的字典列表
+        :param on_duplicate: 重复记录的处理方式，同 add_flight_record
+        :return: {'added', 'updated', 'skipped', 'invalid'}
+        """
+        records, invalid = [], 0
+        for flight in flights:
+            try:
+                record = self._build_record(flight)
+            except (KeyError, TypeError) as e:
+                logger.error(f"飞行记录字段错误: {e}")
+                record = None
+            if record is None:
+                invalid += 1
+            else:
+                records.append(record)
+        
+        try:
+            result = self.records_store.append([asdict(r) for r in records], on_duplicate=on_duplicate)
+        except Exception as e:
+            logger.error(f"批量导入飞行记录失败: {e}")
+            return {'added': 0, 'updated': 0, 'skipped': 0, 'invalid': len(flights)}
+        written = result.pop('written')
+        result['invalid'] = invalid
+        if self.card_queue is not None:
+            # 只渲染实际写入的记录（被跳过的重复记录不提交）；已有行程卡的记录不会重复渲染（覆盖更新时除外）
+            for record in written:
+                self.card_queue.submit(record, replace=on_duplicate == 'upsert')
+        logger.info(f"批量导入飞行记录: 新增{result['added']}条, 更新{result['updated']}条, "
+                    f"跳过{result['skipped']}条, 无效{invalid}条")
+        
+        # 成就只需检测一次，优先用国际航班触发首次国际飞行的判断
+        if result['added']:
+            self.check_and_unlock_achievements(
+                next((r for r in records if r.is_international()), records[-1])
+            )
+        return result
+    
+    @instrument('get_flight_records')
     def get_flight_records(self, 
                           airline: Optional[str] = None,
                           cabin_class: Optional[str] = None,
-                          limit: int = None) -> List[Dict]:
+                          limit: int = None,
+                          start: Optional[str] = None,
+                          end: Optional[str] = None,
+                          order_by: str = 'record_date') -> List[Dict]:
         """
         查询飞行记录
         :param airline: 筛选航空公司（可选）
         :param cabin_class: 筛选舱位（可选）
         :param limit: 返回记录数限制
+        :param start: 起飞时间下限（含，ISO格式，可选）
+        :param end: 起飞时间上限（不含，可选；只给日期如 '2024-05-31' 时包含当天）
+        :param order_by: 排序方式 'record_date'（记录时间倒序，默认）、
+                         'departure_time'（起飞时间正序）或 '-departure_time'（起飞时间倒序）
         :return: 飞行记录列表
         """
         try:
-            records = self._load_json(self.records_file)
-            
-            # 筛选
-            if airline:
-                records = [r for r in records if r['airline'] == airline]
-            if cabin_class:
-                records = [r for r in records if r['cabin_class'] == cabin_class]
-            
-            # 按时间倒序排列
-            records.sort(key=lambda x: x['record_date'], reverse=True)
+            # 筛选并排序（由存储层完成：起飞时间范围走有序索引，二进制布局只还原返回的行）
+            records = self.records_store.query(airline=airline, cabin_class=cabin_class, limit=limit,
+                                               start=start, end=end, order_by=order_by)
             
-            if limit:
-                records = records[:limit]
-            
-            logger.info(f"查询飞行记录: 共{len(records)}条")
+            _sampled_debug('get_flight_records', "查询飞行记录: 共%d条", len(records))
             return records
             
         except Exception as e:
@@ -204,6 +415,7 @@ class FlightAssistant:
 
     # ===================== 功能2：行程卡生成 =====================
     
+    @instrument('generate_itinerary_card')
     def generate_itinerary_card(self, flight_record: Dict) -> Optional[str]:
         """
         生成带二维码的行程卡图片
@@ -211,6 +423,9 @@ class FlightAssistant:
         :return: 生成的图片路径，失败返回None
         """
         try:
+            import qrcode
+            from PIL import Image, ImageDraw, ImageFont
+            
             flight_number = flight_record['flight_number']
             departure = flight_record['departure_airport']
             arrival = flight_record['arrival_airport']
@@ -270,13 +485,17 @@ class FlightAssistant:
             qr_img_resized = qr_img.resize((qr_size, qr_size))
             card.paste(qr_img_resized, (card_width - qr_size - 50, card_height - qr_size - 50))
             
-            # 生成时间戳文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{flight_number}_{timestamp}.png"
+            # 文件名由记录键决定：同一记录重新渲染时覆盖，不同记录（即使同一秒内生成）互不冲突
+            Path(self.flight_cards_dir).mkdir(exist_ok=True)
+            safe_number = re.sub(r'[^A-Za-z0-9]', '', str(flight_number)) or 'card'
+            digest = hashlib.sha1(record_key(flight_record).encode('utf-8')).hexdigest()[:12]
+            filename = f"{safe_number}_{digest}.png"
             filepath = os.path.join(self.flight_cards_dir, filename)
             
-            # 保存图片
-            card.save(filepath)
+            # 保存图片（先写临时文件再替换，同一记录的并发渲染不会留下半截图片）
+            tmp_path = f"{filepath}.{threading.get_ident()}.tmp"
+            card.save(tmp_path, format='PNG')
+            os.replace(tmp_path, filepath)
             logger.info(f"行程卡已生成: {filepath}")
             return filepath
             
@@ -284,8 +503,38 @@ class FlightAssistant:
             logger.error(f"生成行程卡失败: {e}")
             return None
 
+    def get_card(self, record_key: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        取得后台预先生成的行程卡，正在渲染时等待其完成
+        :param record_key: 记录键（FlightRecord.get_key）
+        :param timeout: 最长等待秒数（None 为一直等待）
+        :return: 图片路径，未开启后台渲染、记录未入队、渲染失败或超时返回None
+        """
+        if self.card_queue is None:
+            logger.warning("未开启行程卡后台渲染（card_workers / CARD_RENDER_WORKERS）")
+            return None
+        return self.card_queue.get_card(record_key, timeout)
+
     # ===================== 功能3：机票价格监控 =====================
     
+    def _http_session(self):
+        """复用连接的 requests 会话（连接池大小与批量查询并发数匹配）"""
+        session = self._session
+        if session is not None:
+            return session
+        with self._session_lock:
+            # 并发的首次查询只创建一个会话
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+    
+    @instrument('check_flight_price')
     def check_flight_price(self,
                           departure: str,
                           arrival: str,
@@ -301,6 +550,7 @@ class FlightAssistant:
             logger.warning("未配置FLIGHT_API_KEY或FLIGHT_API_URL")
             return None
         
+        import requests
         try:
             headers = {
                 'Authorization': f'Bearer {self.flight_api_key}',
@@ -314,16 +564,20 @@ class FlightAssistant:
                 'date': travel_date
             }
             
-            response = requests.get(
-                self.flight_api_url,
-                params=params,
-                headers=headers,
-                timeout=10
-            )
+            with REGISTRY.time('http_request_seconds', endpoint='flight_api'):
+                response = self._http_session().get(
+                    self.flight_api_url,
+                    params=params,
+                    headers=headers,
+                    timeout=10
+                )
+            REGISTRY.inc('http_requests_total', endpoint='flight_api', code=response.status_code)
             response.raise_for_status()
             
             data = response.json()
-            logger.info(f"获取价格信息: {departure} -> {arrival} 日期: {travel_date}")
+            self._cache_price((departure, arrival, travel_date), data)
+            _sampled_debug('check_flight_price', "获取价格信息: %s -> %s 日期: %s",
+                           departure, arrival, travel_date)
             return data
             
         except requests.RequestException as e:
@@ -333,6 +587,134 @@ class FlightAssistant:
             logger.error("API返回数据解析失败")
             return None
     
+    def _cache_price(self, key: Tuple[str, str, str], data: Dict):
+        """写入价格缓存：先淘汰最久未用且已过期的条目，再按容量淘汰"""
+        now = time.time()
+        max_age = self.price_check_interval * 3600
+        with self._price_cache_lock:
+            self._price_cache[key] = (now, data)
+            self._price_cache.move_to_end(key)
+            while self._price_cache:
+                checked_at, _ = next(iter(self._price_cache.values()))
+                if now - checked_at <= max_age:
+                    break
+                self._price_cache.popitem(last=False)
+            while len(self._price_cache) > PRICE_CACHE_SIZE:
+                self._price_cache.popitem(last=False)
+    
+    def _get_cached_price(self,
+                          departure: str,
+                          arrival: str,
+                          travel_date: str,
+                          alerts_index: Optional[Dict[str, Dict]] = None) -> Optional[Dict]:
+        """
+        获取有效期内的缓存价格（内存缓存优先，其次是价格监控记录）
+        :param alerts_index: route_key -> 监控记录的索引（可选）
+        :return: 价格信息字典，无有效缓存返回None
+        """
+        max_age = self.price_check_interval * 3600
+        now = time.time()
+        key = (departure, arrival, travel_date)
+        with self._price_cache_lock:
+            cached = self._price_cache.get(key)
+            if cached is not None:
+                if now - cached[0] <= max_age:
+                    self._price_cache.move_to_end(key)
+                else:
+                    del self._price_cache[key]
+                    cached = None
+        if cached is not None:
+            return cached[1]
+        
+        alert = (alerts_index or {}).get(f"{departure}_{arrival}_{travel_date}")
+        if alert and alert.get('raw_data'):
+            checked_at = datetime.fromisoformat(alert['timestamp']).timestamp()
+            if now - checked_at <= max_age:
+                return alert['raw_data']
+        return None
+    
+    @instrument('find_cheapest_dates')
+    def find_cheapest_dates(self,
+                            departure: str,
+                            arrival: str,
+                            start: str,
+                            end: str,
+                            top_k: int = 5,
+                            trip_lengths: Optional[List[int]] = None,
+                            max_workers: int = 16) -> List[Dict]:
+        """
+        在日期范围内查找最便宜的出行日期（并发查询，复用缓存价格）
+        :param departure: 出发地
+        :param arrival: 目的地
+        :param start: 最早出发日期 (YYYY-MM-DD)
+        :param end: 最晚出发日期 (YYYY-MM-DD)
+        :param top_k: 返回结果数
+        :param trip_lengths: 往返行程天数（可选），如 range(5, 8) 表示往返5~7天
+        :param max_workers: 最大并发查询数
+        :return: 按价格升序排列的日期列表
+        """
+        try:
+            start_date = datetime.strptime(start, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end, "%Y-%m-%d").date()
+            outbound_dates = [start_date + timedelta(days=i)
+                              for i in range((end_date - start_date).days + 1)]
+            trip_lengths = sorted(set(trip_lengths)) if trip_lengths else []
+            
+            # 需要查询的 (出发地, 目的地, 日期)
+            queries = {(departure, arrival, d.isoformat()) for d in outbound_dates}
+            for d in outbound_dates:
+                for length in trip_lengths:
+                    queries.add((arrival, departure, (d + timedelta(days=length)).isoformat()))
+            
+            alerts_index = {a.get('route_key'): a for a in read_json_cached(self.price_alerts_file, [])}
+            prices = {}
+            missing = []
+            for query in queries:
+                info = self._get_cached_price(*query, alerts_index=alerts_index)
+                if info is None:
+                    missing.append(query)
+                else:
+                    prices[query] = info.get('min_price')
+            
+            # 并发查询未命中缓存的日期
+            if missing:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+                    for query, info in zip(missing, executor.map(lambda q: self.check_flight_price(*q), missing)):
+                        if info:
+                            prices[query] = info.get('min_price')
+            
+            results = []
+            for d in outbound_dates:
+                outbound_price = prices.get((departure, arrival, d.isoformat()))
+                if not outbound_price:
+                    continue
+                if not trip_lengths:
+                    results.append({'date': d.isoformat(), 'price': outbound_price})
+                    continue
+                for length in trip_lengths:
+                    return_date = (d + timedelta(days=length)).isoformat()
+                    return_price = prices.get((arrival, departure, return_date))
+                    if not return_price:
+                        continue
+                    results.append({
+                        'outbound_date': d.isoformat(),
+                        'return_date': return_date,
+                        'trip_days': length,
+                        'outbound_price': outbound_price,
+                        'return_price': return_price,
+                        'price': outbound_price + return_price
+                    })
+            
+            cheapest = heapq.nsmallest(top_k, results, key=lambda r: r['price'])
+            logger.info(f"最低价日期查询: {departure}->{arrival} {start}~{end}, "
+                        f"查询{len(missing)}次, 缓存命中{len(queries) - len(missing)}次")
+            return cheapest
+            
+        except Exception as e:
+            logger.error(f"最低价日期查询失败: {e}")
+            return []
+    
+    @instrument('monitor_price')
     def monitor_price(self,
                      departure: str,
                      arrival: str,
@@ -343,7 +725,7 @@ class FlightAssistant:
         :param departure: 出发地
         :param arrival: 目的地
         :param travel_date: 出行日期
-        :param price_threshold: 价格下跌阈值
+        :param price_threshold: 相对EWMA基线的最小下跌金额（可选）
         :return: 是否成功记录
         """
         try:
@@ -351,54 +733,166 @@ class FlightAssistant:
             if not price_info:
                 return False
             
-            alerts = self._load_json(self.price_alerts_file)
-            
-            # 生成监控记录
-            route_key = f"{departure}_{arrival}_{travel_date}"
-            current_price = price_info.get('min_price', 0)
-            
-            # 检查是否存在历史记录
-            previous_record = None
-            for alert in alerts:
-                if alert.get('route_key') == route_key:
-                    previous_record = alert
-                    break
-            
-            new_alert = {
-                'route_key': route_key,
-                'departure': departure,
-                'arrival': arrival,
-                'travel_date': travel_date,
-                'current_price': current_price,
-                'previous_price': previous_record.get('current_price') if previous_record else None,
-                'price_drop': False,
-                'timestamp': datetime.now().isoformat(),
-                'raw_data': price_info
-            }
-            
-            # 检测价格下跌
-            if previous_record and new_alert['previous_price']:
-                price_drop = new_alert['previous_price'] - current_price
-                if price_drop > 0 and (price_threshold is None or price_drop >= price_threshold):
-                    new_alert['price_drop'] = True
-                    logger.warning(f"⬇️ 价格下跌提醒: {departure}->{arrival} 下跌 ¥{price_drop}")
-            
-            # 更新或添加记录
-            if previous_record:
-                for i, alert in enumerate(alerts):
-                    if alert.get('route_key') == route_key:
-                        alerts[i] = new_alert
-                        break
-            else:
-                alerts.append(new_alert)
-            
-            self._save_json(self.price_alerts_file, alerts)
-            return True
+            with file_lock(self.price_alerts_file):
+                alerts = self._load_json(self.price_alerts_file)
+                self._apply_price_observation(alerts, departure, arrival, travel_date,
+                                              price_info, price_threshold)
+                return self._save_json(self.price_alerts_file, alerts)
             
         except Exception as e:
             logger.error(f"价格监控失败: {e}")
             return False
     
+    @instrument('monitor_routes')
+    def monitor_routes(self,
+                       routes: List,
+                       price_threshold: float = None,
+                       max_workers: int = 8) -> List[Dict]:
+        """
+        批量监控多条路线：并发查询价格，并在一次读-改-写中更新全部监控记录
+        :param routes: 路线列表，元素为 (出发地, 目的地, 出行日期) 或含 departure/arrival/travel_date 的字典
+        :param price_threshold: 相对EWMA基线的最小下跌金额（可选）
+        :param max_workers: 最大并发查询数
+        :return: 每条路线的精简结果列表
+        """
+        # 逐条校验路线，格式错误的路线单独记为失败，不影响其他路线
+        parsed, summaries = [], []
+        for route in routes:
+            try:
+                if isinstance(route, dict):
+                    departure, arrival, travel_date = route['departure'], route['arrival'], route['travel_date']
+                else:
+                    departure, arrival, travel_date = route
+                if not all(isinstance(v, str) and v for v in (departure, arrival, travel_date)):
+                    raise ValueError("出发地、目的地和出行日期必须是非空字符串")
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"路线格式错误，已跳过: {route!r}: {e}")
+                summaries.append({'route_key': None, 'route': str(route), 'date': None,
+                                  'success': False, 'error': f"路线格式错误: {e}"})
+                continue
+            summary = {
+                'route_key': f"{departure}_{arrival}_{travel_date}",
+                'route': f"{departure} → {arrival}",
+                'date': travel_date,
+            }
+            summaries.append(summary)
+            parsed.append(((departure, arrival, travel_date), summary))
+        if not parsed:
+            return summaries
+        
+        def query(route: Tuple[str, str, str]) -> Optional[Dict]:
+            try:
+                return self.check_flight_price(*route)
+            except Exception as e:
+                logger.error(f"价格查询异常 ({route[0]}->{route[1]}): {e}")
+                return None
+        
+        # 并发查询所有路线价格
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(parsed))) as executor:
+            price_infos = list(executor.map(query, [route for route, _ in parsed]))
+        
+        try:
+            with file_lock(self.price_alerts_file):
+                alerts = self._load_json(self.price_alerts_file)
+                index = {alert.get('route_key'): i for i, alert in enumerate(alerts)}
+                updated = False
+                for ((departure, arrival, travel_date), summary), price_info in zip(parsed, price_infos):
+                    if not price_info:
+                        summary.update({'success': False, 'error': '价格查询失败'})
+                        continue
+                    try:
+                        alert = self._apply_price_observation(alerts, departure, arrival, travel_date,
+                                                              price_info, price_threshold, index)
+                    except Exception as e:
+                        logger.error(f"价格记录更新失败 ({summary['route_key']}): {e}")
+                        summary.update({'success': False, 'error': str(e)})
+                        continue
+                    updated = True
+                    summary.update({
+                        'success': True,
+                        'price': alert['current_price'],
+                        'previous_price': alert['previous_price'],
+                        'price_drop': alert['price_drop'],
+                        'signals': alert['signals'],
+                    })
+                
+                if updated:
+                    self._save_json(self.price_alerts_file, alerts)
+        except Exception as e:
+            logger.error(f"批量价格监控失败: {e}")
+            return [dict(s, success=False, error=s.get('error') or str(e)) for s in summaries]
+        
+        logger.info(f"批量价格监控完成: {len(summaries)} 条路线")
+        return summaries
+    
+    def _apply_price_observation(self,
+                                 alerts: List[Dict],
+                                 departure: str,
+                                 arrival: str,
+                                 travel_date: str,
+                                 price_info: Dict,
+                                 price_threshold: float = None,
+                                 index: Optional[Dict[str, int]] = None) -> Dict:
+        """
+        将一次价格观测合并到监控记录列表（原地更新）
+        :param alerts: 监控记录列表
+        :param index: route_key -> 列表下标的索引（可选，批量更新时复用）
+        :return: 新的监控记录
+        """
+        # 生成监控记录
+        route_key = f"{departure}_{arrival}_{travel_date}"
+        current_price = price_info.get('min_price')
+        if not is_valid_price(current_price):
+            # 缺失或为0的价格不写入监控记录，也不进入检测器状态
+            raise ValueError(f"价格无效: {current_price!r}")
+        
+        # 检查是否存在历史记录
+        if index is None:
+            position = next((i for i, alert in enumerate(alerts)
+                             if alert.get('route_key') == route_key), None)
+        else:
+            position = index.get(route_key)
+        previous_record = alerts[position] if position is not None else None
+        
+        # 恢复该路线的增量检测状态（旧记录没有状态时以上次价格作为首个观测）
+        config = self.detector_config
+        if price_threshold is not None:
+            config = replace(config, min_abs_drop=price_threshold)
+        detector = PriceDropDetector(config, previous_record.get('detector') if previous_record else None)
+        if previous_record and not previous_record.get('detector') and previous_record.get('current_price'):
+            detector.update(previous_record['current_price'],
+                            datetime.fromisoformat(previous_record['timestamp']))
+        
+        # 检测价格下跌
+        detection = detector.update(current_price)
+        
+        new_alert = {
+            'route_key': route_key,
+            'departure': departure,
+            'arrival': arrival,
+            'travel_date': travel_date,
+            'current_price': current_price,
+            'previous_price': previous_record.get('current_price') if previous_record else None,
+            'price_drop': detection['fired'],
+            'signals': detection['signals'],
+            'timestamp': datetime.now().isoformat(),
+            'detector': detector.to_dict(),
+            'raw_data': price_info
+        }
+        
+        if new_alert['price_drop']:
+            logger.warning(f"⬇️ 价格下跌提醒: {departure}->{arrival} 当前 ¥{current_price} "
+                           f"(EWMA ¥{detection['ewma']}, 触发规则: {', '.join(detection['signals'])})")
+        
+        # 更新或添加记录
+        if position is not None:
+            alerts[position] = new_alert
+        else:
+            alerts.append(new_alert)
+            if index is not None:
+                index[route_key] = len(alerts) - 1
+        return new_alert
+    
     def start_price_monitoring(self,
                               departure: str,
                               arrival: str,
@@ -420,27 +914,30 @@ class FlightAssistant:
 
     # ===================== 功能4：飞行数据统计 =====================
     
+    @instrument('get_flight_statistics')
     def get_flight_statistics(self,
                              year: Optional[int] = None,
                              month: Optional[int] = None) -> Dict:
         """
         生成飞行统计报告
-        :param year: 统计年份（可选）
-        :param month: 统计月份（可选）
+        :param year: 统计年份（按起飞时间，可选）
+        :param month: 统计月份（按起飞时间，可选）
         :return: 统计信息字典
         """
         try:
-            records = self._load_json(self.records_file)
+            # 记录未变化时直接返回缓存的结果（存储版本在任何写入后都会变化）
+            cache_key = (year, month)
+            version = self.records_store.version()
+            with self._stats_cache_lock:
+                cached = self._stats_cache.get(cache_key)
+                if cached and cached[0] == version:
+                    self._stats_cache.move_to_end(cache_key)
+                    REGISTRY.inc('stats_cache_total', result='hit')
+                    return _copy_stats(cached[1])
+            REGISTRY.inc('stats_cache_total', result='miss')
             
-            # 按时间筛选
-            filtered_records = []
-            for record in records:
-                record_date = datetime.fromisoformat(record['record_date'])
-                if year and record_date.year != year:
-                    continue
-                if month and record_date.month != month:
-                    continue
-                filtered_records.append(record)
+            # 按起飞时间筛选（分片布局下只读取相关分片）
+            filtered_records = self.records_store.load(year, month)
             
             # 计算统计信息
             total_flights = len(filtered_records)
@@ -461,7 +958,7 @@ class FlightAssistant:
             # 国际航班数
             international_flights = sum(
                 1 for r in filtered_records
-                if r['departure_airport'][0] != 'Z' or r['arrival_airport'][0] != 'Z'
+                if is_international(r['departure_airport'], r['arrival_airport'], DOMESTIC_COUNTRIES)
             )
             
             stats = {
@@ -476,8 +973,14 @@ class FlightAssistant:
                 'top_airline': max(airline_count, key=airline_count.get) if airline_count else 'N/A'
             }
             
-            logger.info(f"统计报告生成: {stats['period']}, 总飞行次数: {total_flights}")
-            return stats
+            _sampled_debug('get_flight_statistics', "统计报告生成: %s, 总飞行次数: %d",
+                           stats['period'], total_flights)
+            with self._stats_cache_lock:
+                self._stats_cache[cache_key] = (version, stats)
+                self._stats_cache.move_to_end(cache_key)
+                while len(self._stats_cache) > STATS_CACHE_SIZE:
+                    self._stats_cache.popitem(last=False)
+            return _copy_stats(stats)
             
         except Exception as e:
             logger.error(f"生成统计报告失败: {e}")
@@ -509,76 +1012,74 @@ class FlightAssistant:
 
     # ===================== 功能5：飞行成就解锁 =====================
     
+    @instrument('check_and_unlock_achievements')
     def check_and_unlock_achievements(self, flight_record: FlightRecord):
         """
         检查并解锁成就
         :param flight_record: 飞行记录对象
         """
         try:
-            achievements = self._load_json(self.achievements_file)
-            unlocked = []
-            
-            # 检查首次国际飞行
-            if flight_record.is_international():
-                records = self._load_json(self.records_file)
-                intl_count = sum(
-                    1 for r in records
-                    if r['departure_airport'][0] != 'Z' or r['arrival_airport'][0] != 'Z'
-                )
-                if intl_count == 1:
-                    achievement = {
-                        'id': 'first_international',
-                        'name': '🌍 国际旅行家',
-                        'description': '完成首次国际航班',
-                        'unlocked_date': datetime.now().isoformat(),
-                        'flight': flight_record.flight_number
-                    }
-                    achievements.append(achievement)
-                    unlocked.append(achievement['name'])
-            
-            # 检查年度飞行达人（年度≥10次）
-            year = datetime.now().year
-            year_stats = self.get_flight_statistics(year=year)
-            if year_stats.get('total_flights', 0) >= 10:
-                # 检查是否已解锁
-                if not any(a['id'] == 'frequent_flyer' for a in achievements):
-                    achievement = {
-                        'id': 'frequent_flyer',
-                        'name': '✈️ 飞行达人',
-                        'description': '年度飞行次数≥10次',
-                        'unlocked_date': datetime.now().isoformat(),
-                        'stats': year_stats
-                    }
-                    achievements.append(achievement)
-                    unlocked.append(achievement['name'])
-            
-            # 检查长途旅人（累计里程≥10000）
-            all_stats = self.get_flight_statistics()
-            if all_stats.get('total_miles', 0) >= 10000:
-                if not any(a['id'] == 'long_distance_traveler' for a in achievements):
-                    achievement = {
-                        'id': 'long_distance_traveler',
-                        'name': '🚀 长途旅人',
-                        'description': '累计飞行里程≥10000公里',
-                        'unlocked_date': datetime.now().isoformat(),
-                        'total_miles': all_stats.get('total_miles', 0)
-                    }
-                    achievements.append(achievement)
-                    unlocked.append(achievement['name'])
-            
-            # 保存成就信息
-            if unlocked:
-                self._save_json(self.achievements_file, achievements)
-                logger.info(f"🎉 解锁成就: {', '.join(unlocked)}")
+            with file_lock(self.achievements_file):
+                achievements = self._load_json(self.achievements_file)
+                unlocked = []
+                
+                # 检查首次国际飞行（当前记录已入库，本身即为首个国际航班的充分条件）
+                if flight_record.is_international():
+                    if not any(a['id'] == 'first_international' for a in achievements):
+                        achievement = {
+                            'id': 'first_international',
+                            'name': '🌍 国际旅行家',
+                            'description': '完成首次国际航班',
+                            'unlocked_date': datetime.now().isoformat(),
+                            'flight': flight_record.flight_number
+                        }
+                        achievements.append(achievement)
+                        unlocked.append(achievement['name'])
+                
+                # 检查年度飞行达人（年度≥10次）
+                year = datetime.now().year
+                year_stats = self.get_flight_statistics(year=year)
+                if year_stats.get('total_flights', 0) >= 10:
+                    # 检查是否已解锁
+                    if not any(a['id'] == 'frequent_flyer' for a in achievements):
+                        achievement = {
+                            'id': 'frequent_flyer',
+                            'name': '✈️ 飞行达人',
+                            'description': '年度飞行次数≥10次',
+                            'unlocked_date': datetime.now().isoformat(),
+                            'stats': year_stats
+                        }
+                        achievements.append(achievement)
+                        unlocked.append(achievement['name'])
+                
+                # 检查长途旅人（累计里程≥10000）
+                total_miles = self.records_store.total_miles()
+                if total_miles >= 10000:
+                    if not any(a['id'] == 'long_distance_traveler' for a in achievements):
+                        achievement = {
+                            'id': 'long_distance_traveler',
+                            'name': '🚀 长途旅人',
+                            'description': '累计飞行里程≥10000公里',
+                            'unlocked_date': datetime.now().isoformat(),
+                            'total_miles': total_miles
+                        }
+                        achievements.append(achievement)
+                        unlocked.append(achievement['name'])
+                
+                # 保存成就信息
+                if unlocked:
+                    self._save_json(self.achievements_file, achievements)
+                    logger.info(f"🎉 解锁成就: {', '.join(unlocked)}")
             
         except Exception as e:
             logger.error(f"成就检查失败: {e}")
     
+    @instrument('get_achievements')
     def get_achievements(self) -> List[Dict]:
         """获取所有解锁的成就"""
         try:
-            achievements = self._load_json(self.achievements_file)
-            logger.info(f"已解锁成就数: {len(achievements)}")
+            achievements = [dict(a) for a in read_json_cached(self.achievements_file, [])]
+            _sampled_debug('get_achievements', "已解锁成就数: %d", len(achievements))
             return achievements
         except Exception as e:
             logger.error(f"获取成就失败: {e}")
@@ -603,6 +1104,7 @@ class FlightAssistant:
 
 def main():
     """主函数 - 演示用法"""
+    setup_logging()
     assistant = FlightAssistant()
     
     print("\n🛫 飞行生活记录与决策助手启动")
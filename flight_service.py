@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+飞行智能体常驻HTTP服务
+进程内保持一个预热的 FlightAssistant（数据文件解析缓存、价格缓存、HTTP连接池），
+Dify 工作流通过 HTTP 调用即可，无需在每个代码节点中重新导入模块和加载数据。
+指定 --data-root 时为多用户模式：每个请求通过 user_id 查询参数选择用户，
+各用户的数据保存在数据根目录下独立的分区中（见 tenants.py）
+
+用法:
+    python flight_service.py --host 127.0.0.1 --port 8765
+    python flight_service.py --data-root data/users --max-open-users 2000
+
+接口（均返回JSON）:
+    GET  /health
+    GET  /records?airline=&cabin_class=&limit=&start=&end=&order_by=departure_time
+    POST /records                 请求体为 add_flight_record 的参数
+    GET  /statistics?year=&month=
+    GET  /achievements
+    POST /cards                   请求体为飞行记录字典
+    GET  /price?departure=&arrival=&date=
+    GET  /cheapest?departure=&arrival=&start=&end=&top_k=&trip_lengths=5,6,7
+    POST /monitor                 请求体 {"routes": [...], "price_threshold": 可选}
+    GET  /metrics                 Prometheus 文本格式
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from flight_assistant import FlightAssistant, setup_logging
+from metrics import REGISTRY
+from record_store import ORDER_BY
+from tenants import TenantPool
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error'}
+# 航班号用于行程卡文件名，只接受字母和数字
+FLIGHT_NUMBER_PATTERN = re.compile(r'^[A-Za-z0-9]{2,10}$')
+
+
+class HTTPError(Exception):
+    """带状态码的请求错误"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_param(query: Dict[str, str], name: str) -> Optional[int]:
+    value = query.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(400, f"参数 {name} 必须是整数")
+
+
+def _required(source: Dict, *names: str):
+    missing = [n for n in names if not source.get(n)]
+    if missing:
+        raise HTTPError(400, f"缺少参数: {', '.join(missing)}")
+    return [source[n] for n in names]
+
+
+def _content_length(headers: Dict[str, str], limit: int) -> int:
+    """
+    校验 Content-Length 请求头
+    :return: 请求体长度，未提供时为0
+    """
+    value = headers.get('content-length', '')
+    if not value:
+        return 0
+    if not (value.isascii() and value.isdigit()):
+        raise HTTPError(400, f"Content-Length 无效: {value[:32]}")
+    length = int(value)
+    if length > limit:
+        raise HTTPError(413, "请求体过大")
+    return length
+
+
+class FlightService:
+    """把 FlightAssistant 的功能映射为HTTP路由"""
+
+    def __init__(self,
+                 assistant: Optional[FlightAssistant] = None,
+                 max_workers: int = 16,
+                 tenants: Optional[TenantPool] = None,
+                 max_body_bytes: int = MAX_BODY_BYTES):
+        """
+        :param assistant: 单用户模式下使用的 FlightAssistant
+        :param max_workers: 处理请求的线程数
+        :param tenants: 多用户模式的用户池，指定后按请求中的 user_id 选择用户
+        :param max_body_bytes: 请求体大小上限（字节）
+        """
+        self.tenants = tenants
+        self.max_body_bytes = max_body_bytes
+        self.assistant = assistant or (None if tenants else FlightAssistant())
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='flight-service')
+        self.routes: Dict[Tuple[str, str], Callable] = {
+            ('GET', '/health'): self.health,
+            ('GET', '/records'): self.list_records,
+            ('POST', '/records'): self.add_record,
+            ('GET', '/statistics'): self.statistics,
+            ('GET', '/achievements'): self.achievements,
+            ('POST', '/cards'): self.card,
+            ('GET', '/price'): self.price,
+            ('GET', '/cheapest'): self.cheapest,
+            ('POST', '/monitor'): self.monitor,
+        }
+
+    def _assistant(self, query: Dict[str, str]) -> FlightAssistant:
+        """当前请求对应的 FlightAssistant"""
+        if self.tenants is None:
+            return self.assistant
+        (user_id,) = _required(query, 'user_id')
+        try:
+            return self.tenants.get(user_id)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+    # ---------- 路由处理（在线程池中执行，可安全调用阻塞IO） ----------
+
+    def health(self, query, body):
+        return {'status': 'ok'}
+
+    def list_records(self, query, body):
+        order_by = query.get('order_by') or 'record_date'
+        if order_by not in ORDER_BY:
+            raise HTTPError(400, f"参数 order_by 应为: {', '.join(ORDER_BY)}")
+        return self._assistant(query).get_flight_records(
+            airline=query.get('airline') or None,
+            cabin_class=query.get('cabin_class') or None,
+            limit=_int_param(query, 'limit'),
+            start=query.get('start') or None,
+            end=query.get('end') or None,
+            order_by=order_by
+        )
+
+    def add_record(self, query, body):
+        try:
+            return {'success': self._assistant(query).add_flight_record(**body)}
+        except TypeError as e:
+            raise HTTPError(400, f"记录字段错误: {e}")
+
+    def statistics(self, query, body):
+        return self._assistant(query).get_flight_statistics(
+            year=_int_param(query, 'year'),
+            month=_int_param(query, 'month')
+        )
+
+    def achievements(self, query, body):
+        return self._assistant(query).get_achievements()
+
+    def card(self, query, body):
+        (flight_number,) = _required(body, 'flight_number')
+        if not isinstance(flight_number, str) or not FLIGHT_NUMBER_PATTERN.match(flight_number):
+            raise HTTPError(400, f"非法的航班号: {flight_number!r}")
+        path = self._assistant(query).generate_itinerary_card(body)
+        if path is None:
+            raise HTTPError(400, "行程卡生成失败")
+        return {'path': path}
+
+    def price(self, query, body):
+        departure, arrival, date = _required(query, 'departure', 'arrival', 'date')
+        return {'price_info': self._assistant(query).check_flight_price(departure, arrival, date)}
+
+    def cheapest(self, query, body):
+        departure, arrival, start, end = _required(query, 'departure', 'arrival', 'start', 'end')
+        lengths = query.get('trip_lengths')
+        try:
+            trip_lengths = [int(x) for x in lengths.split(',')] if lengths else None
+        except ValueError:
+            raise HTTPError(400, "参数 trip_lengths 格式应为 5,6,7")
+        return self._assistant(query).find_cheapest_dates(
+            departure, arrival, start, end,
+            top_k=_int_param(query, 'top_k') or 5,
+            trip_lengths=trip_lengths
+        )
+
+    def monitor(self, query, body):
+        (routes,) = _required(body, 'routes')
+        return self._assistant(query).monitor_routes(routes, price_threshold=body.get('price_threshold'))
+
+    # ---------- HTTP 协议处理 ----------
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, str, bytes]:
+        """执行路由，返回 (状态码, Content-Type, 响应体)"""
+        url = urlsplit(target)
+        if method == 'GET' and url.path == '/metrics':
+            return 200, 'text/plain; version=0.0.4; charset=utf-8', REGISTRY.to_prometheus().encode('utf-8')
+
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            known = any(path == url.path for _, path in self.routes)
+            raise HTTPError(405 if known else 404, f"不支持的请求: {method} {url.path}")
+
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            payload = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            raise HTTPError(400, "请求体不是合法的JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "请求体必须是JSON对象")
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executor, handler, query, payload)
+        return 200, 'application/json; charset=utf-8', json.dumps(result, ensure_ascii=False).encode('utf-8')
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接（HTTP/1.1 keep-alive）"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close') \
+                    or headers.get('connection', '').lower() == 'keep-alive'
+                start = time.perf_counter()
+                try:
+                    try:
+                        length = _content_length(headers, self.max_body_bytes)
+                    except HTTPError:
+                        # 请求体边界无法确定，不再复用连接
+                        keep_alive = False
+                        raise
+                    body = await reader.readexactly(length) if length else b''
+                    status, content_type, data = await self.dispatch(method.upper(), target, body)
+                except HTTPError as e:
+                    status, content_type = e.status, 'application/json; charset=utf-8'
+                    data = json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8')
+                except Exception as e:
+                    logger.error(f"请求处理失败 {method} {target}: {e}")
+                    status, content_type = 500, 'application/json; charset=utf-8'
+                    data = json.dumps({'error': '服务器内部错误'}, ensure_ascii=False).encode('utf-8')
+
+                REGISTRY.observe('http_server_seconds', time.perf_counter() - start,
+                                 path=urlsplit(target).path)
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        addresses = ', '.join(str(s.getsockname()) for s in server.sockets)
+        logger.info(f"飞行智能体服务已启动: {addresses}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='飞行智能体常驻HTTP服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--workers', type=int, default=16, help='处理请求的线程数')
+    parser.add_argument('--data-root', help='多用户数据根目录（不指定则为单用户模式）')
+    parser.add_argument('--max-open-users', type=int, default=1024, help='同时保持打开的用户数上限')
+    parser.add_argument('--idle-seconds', type=float, default=1800, help='用户空闲多久后被淘汰')
+    args = parser.parse_args()
+
+    setup_logging()
+    tenants = None
+    if args.data_root:
+        tenants = TenantPool(args.data_root, max_open=args.max_open_users, idle_seconds=args.idle_seconds)
+    service = FlightService(max_workers=args.workers, tenants=tenants)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("飞行智能体服务已停止")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+README 截图压缩流水线
+把 snapshots/ 和 images/ 下的图片在进程池中生成缩略图以及 WebP / 渐进式 JPEG 版本，
+输出到 optimized/（不纳入版本库，README 引用的变体除外，见 .gitignore；
+更新这些截图后重新运行并提交对应变体）。清单按源文件内容哈希缓存，只有新增或修改的图片才会重新处理，
+结束时报告节省的字节数
+
+用法:
+    python image_pipeline.py
+    python image_pipeline.py --widths 400,1200 --formats webp,jpeg --quality 80
+    python image_pipeline.py --force
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from json_store import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIRS = ('snapshots', 'images')
+OUTPUT_DIR = 'optimized'
+MANIFEST_FILE = 'manifest.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+FORMAT_EXTENSIONS = {'webp': '.webp', 'jpeg': '.jpg'}
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def variant_name(rel: str, width: Optional[int], fmt: str) -> str:
+    """输出文件相对路径，如 snapshots/001.w400.webp；width 为 None 表示原尺寸"""
+    stem = os.path.splitext(rel)[0]
+    size = f"w{width}" if width else 'full'
+    return f"{stem}.{size}{FORMAT_EXTENSIONS[fmt]}"
+
+
+def process_image(job: Dict) -> Dict:
+    """
+    处理一张图片（在子进程中运行）：按每个宽度生成每种格式
+    :return: {'rel', 'outputs': {输出相对路径: 字节数}} 或 {'rel', 'error'}
+    """
+    from PIL import Image, ImageOps
+
+    rel = job['rel']
+    try:
+        with Image.open(job['source']) as original:
+            image = ImageOps.exif_transpose(original)
+            image.load()
+        outputs = {}
+        for width in [None] + job['widths']:
+            if width and width >= image.width:
+                continue
+            resized = image
+            if width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+            for fmt in job['formats']:
+                name = variant_name(rel, width, fmt)
+                path = os.path.join(job['output_dir'], name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if fmt == 'webp':
+                    target = resized if resized.mode in ('RGB', 'RGBA') else resized.convert('RGBA')
+                    target.save(path, 'WEBP', quality=job['quality'], method=4)
+                else:
+                    target = resized
+                    if target.mode in ('RGBA', 'LA', 'P'):
+                        rgba = target.convert('RGBA')
+                        target = Image.new('RGB', rgba.size, (255, 255, 255))
+                        target.paste(rgba, mask=rgba.getchannel('A'))
+                    elif target.mode != 'RGB':
+                        target = target.convert('RGB')
+                    target.save(path, 'JPEG', quality=job['quality'], progressive=True, optimize=True)
+                outputs[name] = os.path.getsize(path)
+        return {'rel': rel, 'outputs': outputs}
+    except Exception as e:
+        return {'rel': rel, 'error': str(e)}
+
+
+def discover(root: str, source_dirs=SOURCE_DIRS) -> List[str]:
+    paths = []
+    for source in source_dirs:
+        for directory, _, files in os.walk(os.path.join(root, source)):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.relpath(os.path.join(directory, name), root))
+    return sorted(paths)
+
+
+def run_pipeline(root: str = PROJECT_ROOT,
+                 output_dir: Optional[str] = None,
+                 widths: Optional[List[int]] = None,
+                 formats: Optional[List[str]] = None,
+                 quality: int = 80,
+                 max_workers: Optional[int] = None,
+                 force: bool = False) -> Dict:
+    """
+    运行流水线
+    :return: 清单 {'settings', 'images': {源相对路径: {'sha256', 'mtime_ns', 'size', 'outputs'}}}
+    """
+    output_dir = output_dir or os.path.join(root, OUTPUT_DIR)
+    settings = {'widths': sorted(widths or [400, 1200]), 'formats': sorted(formats or ['webp', 'jpeg']),
+                'quality': quality}
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = read_json(manifest_path, None) or {}
+    # 输出参数变化时全部重新生成
+    cached = manifest.get('images', {}) if manifest.get('settings') == settings and not force else {}
+
+    images, jobs = {}, []
+    for rel in discover(root):
+        source = os.path.join(root, rel)
+        st = os.stat(source)
+        entry = cached.get(rel)
+        outputs_exist = entry and all(os.path.exists(os.path.join(output_dir, n)) for n in entry['outputs'])
+        if outputs_exist and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            images[rel] = entry
+            continue
+        digest = file_sha256(source)
+        if outputs_exist and entry['sha256'] == digest:
+            images[rel] = dict(entry, mtime_ns=st.st_mtime_ns)
+            continue
+        images[rel] = {'sha256': digest, 'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'outputs': {}}
+        jobs.append({'rel': rel, 'source': source, 'output_dir': output_dir, **settings})
+
+    if jobs:
+        os.makedirs(output_dir, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for result in pool.map(process_image, jobs, chunksize=4):
+                if 'error' in result:
+                    logger.warning(f"图片处理失败 {result['rel']}: {result['error']}")
+                    print(f"  ✗ {result['rel']}: {result['error']}")
+                    del images[result['rel']]
+                else:
+                    images[result['rel']]['outputs'] = result['outputs']
+
+    manifest = {'settings': settings, 'images': images}
+    if jobs or set(images) != set(cached):
+        os.makedirs(output_dir, exist_ok=True)
+        write_json(manifest_path, manifest, fsync=False)
+    manifest['processed'] = len(jobs)
+    return manifest
+
+
+def report(manifest: Dict) -> Dict:
+    """
+    统计节省的字节数：每张图取最小的原尺寸输出与原图比较（原图更小时保留原图）；
+    缩略图单独统计
+    """
+    original = optimized = thumbnails = 0
+    for entry in manifest['images'].values():
+        full = [size for name, size in entry['outputs'].items() if '.full.' in name]
+        original += entry['size']
+        optimized += min(full + [entry['size']])
+        thumbnails += sum(size for name, size in entry['outputs'].items() if '.full.' not in name)
+    return {
+        'images': len(manifest['images']),
+        'processed': manifest.get('processed', 0),
+        'original_bytes': original,
+        'optimized_bytes': optimized,
+        'saved_bytes': original - optimized,
+        'saved_ratio': (original - optimized) / original if original else 0,
+        'thumbnail_bytes': thumbnails,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='README 截图压缩流水线')
+    parser.add_argument('--output', default=os.path.join(PROJECT_ROOT, OUTPUT_DIR), help='输出目录')
+    parser.add_argument('--widths', default='400,1200', help='缩略图宽度，逗号分隔')
+    parser.add_argument('--formats', default='webp,jpeg', help='输出格式: webp,jpeg')
+    parser.add_argument('--quality', type=int, default=80, help='压缩质量 1-100')
+    parser.add_argument('--workers', type=int, help='进程数（默认CPU核数）')
+    parser.add_argument('--force', action='store_true', help='忽略缓存全部重新生成')
+    args = parser.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in FORMAT_EXTENSIONS]
+    if unknown:
+        print(f"不支持的格式: {', '.join(unknown)}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    manifest = run_pipeline(
+        output_dir=args.output,
+        widths=[int(w) for w in args.widths.split(',') if w.strip()],
+        formats=formats,
+        quality=args.quality,
+        max_workers=args.workers,
+        force=args.force
+    )
+    stats = report(manifest)
+    mb = 1024 * 1024
+    print(f"✓ {stats['images']} 张图片，本次处理 {stats['processed']} 张，耗时 {time.perf_counter() - start:.1f}s")
+    print(f"  原图 {stats['original_bytes'] / mb:.1f} MB -> 压缩后 {stats['optimized_bytes'] / mb:.1f} MB，"
+          f"节省 {stats['saved_bytes'] / mb:.1f} MB ({stats['saved_ratio']:.0%})")
+    print(f"  缩略图共 {stats['thumbnail_bytes'] / mb:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+意图索引：从意图表（JSON/YAML）构建 Aho-Corasick 自动机，
+对问题只扫描一遍即可找出全部命中的关键词和城市名，
+再按优先级选出意图，并提取航班号、出发/到达城市等槽位
+
+意图表格式:
+{
+  "default_response": "无匹配时的回复",
+  "cities": {"北京": "PEK", ...},
+  "intents": [
+    {"name": "flight_status", "keywords": ["状态", "准点"], "priority": 10,
+     "requires": ["flight_number"], "response": "{flight_number} ..."}
+  ]
+}
+"""
+
+import json
+import re
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# 航班号：两位航司代码（字母或字母数字组合）+ 3~4位数字，前后不能紧跟字母数字
+FLIGHT_NUMBER_PATTERN = re.compile(r'(?<![A-Z0-9])([A-Z]{2}|[A-Z]\d|\d[A-Z])\s?(\d{3,4})(?![0-9])')
+
+
+class AhoCorasick:
+    """多模式字符串匹配自动机"""
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for pattern_id, pattern in enumerate(patterns):
+            self._insert(pattern, pattern_id)
+        self._build_fail_links()
+
+    def _insert(self, pattern: str, pattern_id: int):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(pattern_id)
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # 合并后缀状态的输出，匹配时无需沿失败链回溯
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """遍历所有命中，产出 (起始位置, 模式ID)"""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern_id in out[state]:
+                yield end - len(patterns[pattern_id]) + 1, pattern_id
+
+
+class Intent(NamedTuple):
+    name: str
+    response: str
+    priority: int
+    requires: Tuple[str, ...]
+
+
+class IntentMatch(NamedTuple):
+    intent: Intent
+    keywords: List[str]
+    slots: Dict[str, str]
+    response: str
+
+
+class IntentIndex:
+    """意图索引，构建一次后可并发只读使用"""
+
+    def __init__(self, table: Dict):
+        self.default_response = table.get('default_response', '')
+        self.cities: Dict[str, str] = dict(table.get('cities', {}))
+        self.intents: List[Intent] = []
+        patterns: List[str] = []
+        # 模式ID -> 命中该关键词的意图下标列表
+        self._targets: List[List[int]] = []
+        pattern_ids: Dict[str, int] = {}
+
+        def add_pattern(pattern: str) -> int:
+            pattern = pattern.lower()
+            if pattern not in pattern_ids:
+                pattern_ids[pattern] = len(patterns)
+                patterns.append(pattern)
+                self._targets.append([])
+            return pattern_ids[pattern]
+
+        for item in table.get('intents', []):
+            intent_id = len(self.intents)
+            self.intents.append(Intent(
+                name=item['name'],
+                response=item['response'],
+                priority=int(item.get('priority', 0)),
+                requires=tuple(item.get('requires', ()))
+            ))
+            for keyword in item['keywords']:
+                self._targets[add_pattern(keyword)].append(intent_id)
+        self._city_patterns = {add_pattern(city): city for city in self.cities}
+        self._automaton = AhoCorasick(patterns)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'IntentIndex':
+        """从 JSON 或 YAML（需安装 PyYAML）意图表构建"""
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith(('.yml', '.yaml')):
+                import yaml
+                return cls(yaml.safe_load(f))
+            return cls(json.load(f))
+
+    def extract_slots(self, question: str, city_hits: List[Tuple[int, str]]) -> Dict[str, str]:
+        """提取航班号和出发/到达城市（按出现顺序取前两个不同城市）"""
+        slots = {}
+        flight = FLIGHT_NUMBER_PATTERN.search(question.upper())
+        if flight:
+            slots['flight_number'] = flight.group(1) + flight.group(2)
+        cities = []
+        for _, city in sorted(city_hits):
+            if city not in cities:
+                cities.append(city)
+        if cities:
+            slots['departure_city'] = cities[0]
+            slots['departure_airport'] = self.cities[cities[0]]
+        if len(cities) > 1:
+            slots['arrival_city'] = cities[1]
+            slots['arrival_airport'] = self.cities[cities[1]]
+        return slots
+
+    def match(self, question: str, context: Optional[Dict[str, str]] = None) -> Optional[IntentMatch]:
+        """
+        匹配问题的意图
+        :param context: 会话上下文中已知的槽位（问题中没有提到时沿用，如追问"延误了吗"）
+        :return: 命中的意图、关键词、槽位和渲染后的回复；没有意图命中时返回None
+        """
+        hits: Dict[int, List[Tuple[int, str]]] = {}
+        city_hits: List[Tuple[int, str]] = []
+        for start, pattern_id in self._automaton.iter_matches(question.lower()):
+            if pattern_id in self._city_patterns:
+                city_hits.append((start, self._city_patterns[pattern_id]))
+            for intent_id in self._targets[pattern_id]:
+                hits.setdefault(intent_id, []).append((start, self._automaton.patterns[pattern_id]))
+        if not hits:
+            return None
+
+        slots = self.extract_slots(question, city_hits)
+        if context:
+            slots = {**context, **slots}
+        # 优先级高者优先，其次命中的关键词越长越具体，再其次出现位置越靠前
+        candidates = sorted(
+            hits.items(),
+            key=lambda item: (-self.intents[item[0]].priority,
+                              -max(len(k) for _, k in item[1]),
+                              min(s for s, _ in item[1]))
+        )
+        for intent_id, keyword_hits in candidates:
+            intent = self.intents[intent_id]
+            if all(slot in slots for slot in intent.requires):
+                return IntentMatch(intent, [k for _, k in keyword_hits], slots,
+                                   intent.response.format_map(_SlotDefaults(slots)))
+        return None
+
+    def answer(self, question: str, context: Optional[Dict[str, str]] = None) -> str:
+        """返回回复文本，无匹配时返回默认回复"""
+        result = self.match(question, context)
+        return result.response if result else self.default_response
+
+
+class _SlotDefaults(dict):
+    """渲染回复模板时缺失的槽位保留原样"""
+
+    def __missing__(self, key):
+        return '{' + key + '}'
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON数据文件的并发安全读写
+写入先落到同目录临时文件再 os.replace 原子替换，读者永远看不到半截文件；
+读-改-写过程通过 fcntl 建议锁在多个进程间串行化
+"""
+
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Tuple
+
+from metrics import REGISTRY
+
+try:
+    import fcntl
+except ImportError:  # Windows 等平台没有 fcntl，退化为进程内锁
+    fcntl = None
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+# 解析结果缓存：路径 -> ((inode, mtime_ns, size), 数据)，按最近使用淘汰
+PARSE_CACHE_SIZE = 256
+_parse_cache: "OrderedDict[str, Tuple[Tuple[int, int, int], Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def lock_path(path: str) -> str:
+    """数据文件对应的锁文件路径"""
+    return f"{path}.lock"
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False):
+    """
+    获取数据文件的建议锁（阻塞直到获得）
+    锁加在独立的 .lock 文件上，因此不受原子替换影响
+    :param path: 数据文件路径
+    :param shared: 是否为共享锁（只读场景），默认独占锁
+    """
+    if fcntl is None:
+        with _local_locks_guard:
+            lock = _local_locks.setdefault(os.path.abspath(path), threading.Lock())
+        with lock:
+            yield
+        return
+
+    fd = os.open(lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path: str, content: str, fsync: bool = True):
+    """
+    原子写入文本文件：写临时文件 -> fsync -> os.replace
+    :param path: 目标文件路径
+    :param content: 文件内容
+    :param fsync: 是否在替换前刷盘
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    """
+    读取JSON文件（文件不存在时返回默认值），分别记录读文件与解析耗时
+    :param path: 文件路径
+    :param default: 文件不存在时的返回值
+    """
+    if not os.path.exists(path):
+        return default
+    with REGISTRY.time('phase_seconds', phase='file_read'):
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    with REGISTRY.time('phase_seconds', phase='json_parse'):
+        return json.loads(content)
+
+
+def read_json_cached(path: str, default: Any = None) -> Any:
+    """
+    读取JSON文件并在进程内缓存解析结果，文件的 (inode, mtime, size) 变化时重新解析
+    原子替换会更换 inode，因此其他进程的写入总能被发现
+    注意：返回的对象在调用方之间共享，只能读取，不能原地修改
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return default
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        cached = _parse_cache.get(path)
+        if cached and cached[0] == key:
+            _parse_cache.move_to_end(path)
+            REGISTRY.inc('json_cache_total', result='hit')
+            return cached[1]
+    REGISTRY.inc('json_cache_total', result='miss')
+    data = read_json(path, default)
+    with _cache_lock:
+        _parse_cache[path] = (key, data)
+        _parse_cache.move_to_end(path)
+        while len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return data
+
+
+def write_json(path: str, data: Any, fsync: bool = True):
+    """原子写入JSON文件，分别记录序列化与写文件耗时"""
+    with REGISTRY.time('phase_seconds', phase='json_dump'):
+        content = json.dumps(data, ensure_ascii=False, indent=2)
+    with REGISTRY.time('phase_seconds', phase='file_write'):
+        atomic_write_text(path, content, fsync=fsync)
+
+
+def create_json_if_missing(path: str, data: Any) -> bool:
+    """
+    文件不存在时创建（O_EXCL，不会覆盖其他进程刚创建的文件）
+    :return: 是否由本次调用创建
+    """
+    try:
+        with open(path, 'x', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return True
+    except FileExistsError:
+        return False
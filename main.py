@@ -8,18 +8,33 @@
 import os
 import random
 import sys
+import time
 from datetime import datetime
-from dotenv import load_dotenv
+from functools import lru_cache
 
-# 加载环境变量
-load_dotenv()
 
-# 读取测试密钥（从环境变量读取，安全且可配置）
-API_KEY = os.getenv("FLIGHT_API_KEY", "")
-COOKIE = os.getenv("FLIGHT_COOKIE", "")
+@lru_cache(maxsize=None)
+def _load_credentials() -> tuple:
+    """
+    首次使用时加载环境变量并读取测试密钥（从环境变量读取，安全且可配置）
+    
+    :return: (API_KEY, COOKIE)
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.getenv("FLIGHT_API_KEY", ""), os.getenv("FLIGHT_COOKIE", "")
+
 
+def __getattr__(name: str):
+    """延迟提供模块属性 API_KEY / COOKIE，避免导入时加载 .env"""
+    if name == "API_KEY":
+        return _load_credentials()[0]
+    if name == "COOKIE":
+        return _load_credentials()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def monitor_flight_price(departure: str, destination: str, date: str) -> dict:
+
+def monitor_flight_price(departure: str, destination: str, date: str, seed=None) -> dict:
     """
     模拟机票价格查询函数（测试用）
     
@@ -29,18 +44,22 @@ def monitor_flight_price(departure: str, destination: str, date: str) -> dict:
     :param departure: 出发地
     :param destination: 目的地
     :param date: 出行日期（格式：YYYY-MM-DD）
+    :param seed: 随机种子（可选），相同种子和参数得到相同结果
     :return: 包含价格和趋势的字典
     :raises ValueError: 当密钥未正确读取时
     """
     # 验证密钥是否读取成功（测试用）
+    API_KEY, COOKIE = _load_credentials()
     if not API_KEY or not COOKIE:
         print("⚠️  警告：密钥未正确读取")
         print(f"   FLIGHT_API_KEY: {'✓ 已设置' if API_KEY else '✗ 未设置'}")
         print(f"   FLIGHT_COOKIE: {'✓ 已设置' if COOKIE else '✗ 未设置'}")
         print("\n   请配置 .env 文件或设置环境变量")
     
+    rng = random.Random(f"{seed}|{departure}|{destination}|{date}") if seed is not None else random
+    
     # 模拟不同日期的价格波动
-    base_price = random.randint(500, 1500)
+    base_price = rng.randint(500, 1500)
     
     try:
         date_obj = datetime.strptime(date, "%Y-%m-%d")
@@ -52,7 +71,7 @@ def monitor_flight_price(departure: str, destination: str, date: str) -> dict:
         raise
     
     # 模拟价格趋势：随机返回上涨/下跌/持平
-    trend = random.choice(["上涨 📈", "下跌 📉", "持平 ➡️"])
+    trend = rng.choice(["上涨 📈", "下跌 📉", "持平 ➡️"])
     
     return {
         "departure": departure,
@@ -65,6 +84,115 @@ def monitor_flight_price(departure: str, destination: str, date: str) -> dict:
     }
 
 
+def simulate_fare_matrix(routes,
+                         dates,
+                         observations: int = 1,
+                         seed=None,
+                         price_range: tuple = (500, 1500),
+                         weekend_markup: float = 0.2,
+                         seasonality: float = 0.15,
+                         peak_day_of_year: int = 200,
+                         volatility: float = 0.05):
+    """
+    向量化生成模拟票价矩阵（用于基准测试）
+    
+    一次性生成 (路线 × 日期 × 观测次数) 的价格矩阵，规则与 monitor_flight_price 一致：
+    每条路线随机基础价，周末上浮20%；另外叠加按年周期的季节性波动，
+    以及每条路线/日期在多次观测间的随机游走（volatility 为单次对数收益率标准差）。
+    
+    :param routes: 路线列表或路线数量
+    :param dates: 出行日期序列（YYYY-MM-DD 字符串、date 或 numpy datetime64）
+    :param observations: 每条路线/日期的观测次数
+    :param seed: 随机种子，相同种子得到相同矩阵
+    :param price_range: 基础价格区间（含两端）
+    :param weekend_markup: 周末上浮比例
+    :param seasonality: 季节性振幅（0 表示关闭）
+    :param peak_day_of_year: 季节性高峰所在的年内天数
+    :param volatility: 观测间价格波动率（0 表示不波动）
+    :return: 形状为 (路线数, 日期数, 观测次数) 的 int32 价格矩阵
+    """
+    import numpy as np
+    
+    rng = np.random.default_rng(seed)
+    n_routes = routes if isinstance(routes, int) else len(routes)
+    days = np.asarray(dates, dtype='datetime64[D]')
+    
+    # 每条路线的基础价格
+    low, high = price_range
+    base = rng.integers(low, high + 1, size=(n_routes, 1, 1)).astype(np.float64)
+    
+    # 周末上浮（1970-01-01 为周四，weekday 以周一为0）
+    weekday = (days.astype(np.int64) + 3) % 7
+    weekend = np.where(weekday >= 5, 1 + weekend_markup, 1.0)
+    
+    # 按年周期的季节性
+    day_of_year = (days - days.astype('datetime64[Y]')).astype(np.int64) + 1
+    season = 1 + seasonality * np.cos(2 * np.pi * (day_of_year - peak_day_of_year) / 365.25)
+    
+    # 观测间的对数随机游走，首次观测为基准价
+    shape = (n_routes, len(days), observations)
+    returns = rng.normal(0.0, volatility, size=shape) if volatility else np.zeros(shape)
+    returns[..., 0] = 0.0
+    walk = np.exp(np.cumsum(returns, axis=-1))
+    
+    prices = base * (weekend * season)[np.newaxis, :, np.newaxis] * walk
+    return np.floor(prices).astype(np.int32)
+
+
+def monitor_routes(routes: list, max_workers: int = 8) -> dict:
+    """
+    批量查询多条路线的机票价格（并发执行）
+    
+    供 Dify 工作流批量节点直接使用，返回每条路线的精简结果。
+    
+    :param routes: 路线列表，元素为 (出发地, 目的地, 日期) 或含 departure/destination/date 的字典
+    :param max_workers: 最大并发查询数
+    :return: 包含路线总数、成功数和各路线结果的字典
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    def query(route):
+        # 在各路线自己的任务中解析，格式错误的路线只影响自身的结果
+        try:
+            if isinstance(route, dict):
+                departure, destination, date = route["departure"], route["destination"], route["date"]
+            else:
+                departure, destination, date = route
+        except (KeyError, TypeError, ValueError) as e:
+            return {
+                "route": str(route),
+                "date": None,
+                "error": f"路线格式错误: {e!r}"
+            }
+        try:
+            result = monitor_flight_price(departure, destination, date)
+            return {
+                "route": f"{departure} → {destination}",
+                "date": date,
+                "price": result["price"],
+                "trend": result["trend"]
+            }
+        except Exception as e:
+            return {
+                "route": f"{departure} → {destination}",
+                "date": date,
+                "error": str(e)
+            }
+    
+    routes = list(routes)
+    if routes:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(routes))) as executor:
+            results = list(executor.map(query, routes))
+    else:
+        results = []
+    
+    return {
+        "total_routes": len(results),
+        "succeeded": sum(1 for r in results if "error" not in r),
+        "results": results
+    }
+
+
 def test_single_query():
     """测试单次价格查询"""
     print("\n" + "="*60)
@@ -102,18 +230,15 @@ def test_batch_query():
     
     print(f"\n查询 {len(routes)} 条路线...\n")
     
-    results = []
-    for departure, destination, date in routes:
-        try:
-            result = monitor_flight_price(departure, destination, date)
-            results.append(result)
-            
-            status = "✓" if "下跌" in result['trend'] else "○"
-            print(f"{status} {departure} → {destination} ({date}): ¥{result['price']} {result['trend']}")
-        except Exception as e:
-            print(f"✗ {departure} → {destination} 查询失败: {e}")
+    summary = monitor_routes(routes)
+    for result in summary["results"]:
+        if "error" in result:
+            print(f"✗ {result['route']} 查询失败: {result['error']}")
+            continue
+        status = "✓" if "下跌" in result['trend'] else "○"
+        print(f"{status} {result['route']} ({result['date']}): ¥{result['price']} {result['trend']}")
     
-    return len(results) == len(routes)
+    return summary["succeeded"] == len(routes)
 
 
 def test_price_drop_detection():
@@ -180,6 +305,32 @@ def test_error_handling():
     return True
 
 
+def test_vectorized_simulation():
+    """测试向量化票价模拟"""
+    print("\n" + "="*60)
+    print("📝 测试5: 向量化票价模拟")
+    print("="*60)
+    
+    try:
+        import numpy as np
+    except ImportError:
+        print("\n⚠️  未安装 numpy，跳过向量化模拟测试")
+        return True
+    
+    dates = np.arange('2026-01-01', '2027-01-01', dtype='datetime64[D]')
+    start = time.perf_counter()
+    prices = simulate_fare_matrix(100, dates, observations=30, seed=42)
+    elapsed = time.perf_counter() - start
+    
+    print(f"\n✓ 生成 {prices.size:,} 个观测值，耗时 {elapsed:.3f}s")
+    print(f"  价格区间: ¥{prices.min()} ~ ¥{prices.max()}，均价 ¥{prices.mean():.0f}")
+    
+    # 相同种子必须得到相同结果
+    same = np.array_equal(prices, simulate_fare_matrix(100, dates, observations=30, seed=42))
+    print(f"  可复现: {'✓' if same else '✗'}")
+    return same
+
+
 def main():
     """运行所有测试"""
     print("\n" + "╔" + "="*58 + "╗")
@@ -187,6 +338,7 @@ def main():
     print("╚" + "="*58 + "╝")
     
     # 显示配置状态
+    API_KEY, COOKIE = _load_credentials()
     print("\n📊 配置状态:")
     print(f"  API密钥: {'✓ 已配置' if API_KEY else '✗ 未配置'}")
     print(f"  Cookie: {'✓ 已配置' if COOKIE else '✗ 未配置'}")
@@ -197,6 +349,7 @@ def main():
         ("批量价格查询", test_batch_query),
         ("价格下跌检测", test_price_drop_detection),
         ("异常处理", test_error_handling),
+        ("向量化票价模拟", test_vectorized_simulation),
     ]
     
     results = []
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+飞行智能体运行指标与性能剖析
+提供计数器、延迟直方图（快照字典 / Prometheus 文本格式），
+以及按采样率开启的 cProfile / tracemalloc 剖析（相关模块在开启时才导入）
+"""
+
+import bisect
+import functools
+import json
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# 延迟直方图桶（秒）
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 内存直方图桶（字节）
+MEMORY_BUCKETS = (1024, 16 * 1024, 256 * 1024, 1024 ** 2, 16 * 1024 ** 2, 256 * 1024 ** 2)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """固定桶直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        按桶上界估算分位数
+        落在最大桶之外的分位数返回最大桶上界（实际值不小于它），保证快照可序列化为标准JSON
+        """
+        if not self.count:
+            return None
+        rank = math.ceil(q * self.count)
+        seen = 0
+        for i, c in enumerate(self.counts[:-1]):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i]
+        return self.buckets[-1]
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'avg': self.total / self.count if self.count else 0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表"""
+
+    def __init__(self, namespace: str = 'flight_assistant'):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._histogram_buckets: Dict[str, Tuple[float, ...]] = {}
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """计数器加值"""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels):
+        """记录一次直方图观测值"""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            self._histogram_buckets.setdefault(name, buckets)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._histogram_buckets[name])
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """计时上下文，耗时（秒）记入直方图"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        """清空所有指标"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._histogram_buckets.clear()
+
+    def snapshot(self) -> Dict:
+        """
+        导出指标快照
+        :return: {'counters': {名称: [{labels, value}]}, 'histograms': {名称: [{labels, count, sum, p50...}]}}
+        """
+        with self._lock:
+            return {
+                'counters': {
+                    name: [{'labels': dict(k), 'value': v} for k, v in series.items()]
+                    for name, series in self._counters.items()
+                },
+                'histograms': {
+                    name: [dict(h.to_dict(), labels=dict(k)) for k, h in series.items()]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """导出 Prometheus 文本格式"""
+        def fmt_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = key + extra
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}={json.dumps(v, ensure_ascii=False)}' for k, v in pairs) + '}'
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = f'{self.namespace}_{name}'
+                lines.append(f'# TYPE {full} counter')
+                for key, value in series.items():
+                    lines.append(f'{full}{fmt_labels(key)} {value:g}')
+            for name, series in sorted(self._histograms.items()):
+                full = f'{self.namespace}_{name}'
+                lines.append(f'# TYPE {full} histogram')
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, count in zip(h.buckets + (math.inf,), h.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == math.inf else f'{bound:g}'
+                        lines.append(f'{full}_bucket{fmt_labels(key, (("le", le),))} {cumulative}')
+                    lines.append(f'{full}_sum{fmt_labels(key)} {h.total:.6f}')
+                    lines.append(f'{full}_count{fmt_labels(key)} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class Profiler:
+    """按采样率对被装饰的操作做 cProfile / tracemalloc 剖析（默认关闭）"""
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.trace_memory = False
+        self._stats = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # 同一时刻只剖析一个线程：Python 3.12 起 cProfile 基于 sys.monitoring，
+        # 多个线程同时启用会报 "Another profiling tool is already active"
+        self._profiling = threading.Lock()
+
+    def enable(self, sample_rate: float = 0.01, trace_memory: bool = False):
+        """
+        开启剖析
+        :param sample_rate: 被剖析调用的比例（0~1）
+        :param trace_memory: 是否同时用 tracemalloc 记录峰值内存
+        """
+        import tracemalloc
+
+        self.sample_rate = sample_rate
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        """关闭剖析"""
+        import tracemalloc
+
+        self.sample_rate = 0.0
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+
+    def should_sample(self) -> bool:
+        # 同一线程内嵌套的操作不重复剖析
+        return (self.sample_rate > 0 and not getattr(self._local, 'active', False)
+                and random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self, operation: str, registry: 'MetricsRegistry'):
+        """剖析一次调用，结果累积到汇总统计中（其他线程正在剖析时本次调用不剖析）"""
+        import cProfile
+        import pstats
+        import tracemalloc
+
+        if not self._profiling.acquire(blocking=False):
+            yield
+            return
+        self._local.active = True
+        profiler = cProfile.Profile()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+        finally:
+            self._local.active = False
+            self._profiling.release()
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                registry.observe('operation_peak_bytes', max(0, peak - base),
+                                 buckets=MEMORY_BUCKETS, operation=operation)
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profiler)
+                else:
+                    self._stats.add(profiler)
+
+    def report(self, limit: int = 20, sort: str = 'cumulative') -> str:
+        """汇总剖析结果（文本）"""
+        import io
+
+        with self._lock:
+            if self._stats is None:
+                return ''
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+    def reset(self):
+        with self._lock:
+            self._stats = None
+
+
+REGISTRY = MetricsRegistry()
+PROFILER = Profiler()
+
+
+def instrument(operation: str) -> Callable:
+    """
+    装饰器：记录操作调用次数（按成功/异常）与耗时直方图，并按采样率剖析
+    :param operation: 操作名称（作为 operation 标签）
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            status = 'error'
+            start = time.perf_counter()
+            try:
+                if PROFILER.should_sample():
+                    with PROFILER.profile(operation, REGISTRY):
+                        result = func(*args, **kwargs)
+                else:
+                    result = func(*args, **kwargs)
+                status = 'ok'
+                return result
+            finally:
+                REGISTRY.observe('operation_seconds', time.perf_counter() - start, operation=operation)
+                REGISTRY.inc('operation_total', operation=operation, status=status)
+        return wrapper
+    return decorator
+
+
+def serve_metrics(host: str = '127.0.0.1', port: int = 9108):
+    """
+    在后台线程启动指标HTTP服务：/metrics 为 Prometheus 文本，/metrics.json 为快照
+    :return: HTTPServer 实例（调用 shutdown() 停止）
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = REGISTRY.to_prometheus(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, content_type = json.dumps(REGISTRY.snapshot(), ensure_ascii=False), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+机票价格下跌检测器
+为每条监控路线维护可增量更新的状态（滚动最低价、EWMA、峰值回撤、分位数基线），
+每次检查只处理当前观测值，无需重读历史记录
+"""
+
+import math
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# 可用的检测规则
+RULE_EWMA = 'ewma'              # 低于EWMA基线一定比例
+RULE_PEAK = 'peak'              # 较窗口内峰值回撤一定比例
+RULE_NEW_LOW = 'new_low'        # 达到窗口内最低价
+RULE_PERCENTILE = 'percentile'  # 低于历史分位数基线
+ALL_RULES = (RULE_EWMA, RULE_PEAK, RULE_NEW_LOW, RULE_PERCENTILE)
+
+
+@dataclass
+class DropDetectorConfig:
+    """价格下跌检测配置"""
+    window_days: float = 7.0          # 滚动最低价/峰值的时间窗口（天）
+    ewma_alpha: float = 0.3           # EWMA平滑系数
+    ewma_drop_pct: float = 0.05       # 低于EWMA的比例阈值
+    peak_drop_pct: float = 0.10       # 较峰值回撤的比例阈值
+    percentile: float = 0.10          # 分位数基线（0~1）
+    min_observations: int = 3         # 预热观测次数，之前不触发
+    min_rules: int = 2                # 至少满足的规则数
+    confirmations: int = 2            # 连续满足的检查次数，过滤单次噪声
+    min_abs_drop: Optional[float] = None  # 相对EWMA的最小绝对跌幅（可选）
+    rules: Tuple[str, ...] = field(default=ALL_RULES)
+
+
+def is_valid_price(price) -> bool:
+    """价格是否可用于检测（接口缺失价格时常返回 None 或 0）"""
+    return isinstance(price, (int, float)) and not isinstance(price, bool) \
+        and math.isfinite(price) and price > 0
+
+
+class P2Quantile:
+    """P²算法流式分位数估计，O(1)空间与更新"""
+
+    def __init__(self, p: float, state: Optional[Dict] = None):
+        self.p = p
+        if state:
+            self.heights = list(state['heights'])
+            self.positions = list(state['positions'])
+            self.desired = list(state['desired'])
+        else:
+            self.heights = []
+            self.positions = [1, 2, 3, 4, 5]
+            self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        """加入一个观测值"""
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # 定位所在区间并更新极值
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while k < 3 and x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # 调整中间三个标记的高度
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = candidate
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        """当前分位数估计"""
+        q = self.heights
+        if not q:
+            return None
+        if len(q) < 5:
+            idx = min(len(q) - 1, max(0, int(math.ceil(self.p * len(q))) - 1))
+            return q[idx]
+        return q[2]
+
+    def to_dict(self) -> Dict:
+        return {
+            'heights': self.heights,
+            'positions': self.positions,
+            'desired': self.desired,
+        }
+
+
+class PriceDropDetector:
+    """
+    单条路线的增量价格下跌检测器
+    状态可序列化为字典，随价格监控记录一起持久化
+    """
+
+    def __init__(self, config: Optional[DropDetectorConfig] = None, state: Optional[Dict] = None):
+        self.config = config or DropDetectorConfig()
+        state = state or {}
+        self.count = state.get('count', 0)
+        self.ewma = state.get('ewma')
+        self.streak = state.get('streak', 0)
+        # 单调队列：窗口最低价（价格递增）与窗口峰值（价格递减），元素为 [时间戳, 价格]
+        self.min_window = deque(state.get('min_window', []))
+        self.max_window = deque(state.get('max_window', []))
+        self.quantile = P2Quantile(self.config.percentile, state.get('quantile'))
+
+    def _expire(self, now: float):
+        cutoff = now - self.config.window_days * 86400
+        while self.min_window and self.min_window[0][0] < cutoff:
+            self.min_window.popleft()
+        while self.max_window and self.max_window[0][0] < cutoff:
+            self.max_window.popleft()
+
+    def evaluate(self, price: float, now: float) -> List[str]:
+        """根据当前状态评估触发的规则（不修改状态）"""
+        cfg = self.config
+        if self.count < cfg.min_observations or price <= 0:
+            return []
+
+        cutoff = now - cfg.window_days * 86400
+        window_min = next((p for t, p in self.min_window if t >= cutoff), None)
+        window_max = next((p for t, p in self.max_window if t >= cutoff), None)
+        baseline = self.quantile.value()
+
+        signals = []
+        if RULE_EWMA in cfg.rules and self.ewma and (self.ewma - price) / self.ewma >= cfg.ewma_drop_pct:
+            signals.append(RULE_EWMA)
+        if RULE_PEAK in cfg.rules and window_max and (window_max - price) / window_max >= cfg.peak_drop_pct:
+            signals.append(RULE_PEAK)
+        if RULE_NEW_LOW in cfg.rules and window_min is not None and price <= window_min:
+            signals.append(RULE_NEW_LOW)
+        if RULE_PERCENTILE in cfg.rules and baseline is not None and price <= baseline:
+            signals.append(RULE_PERCENTILE)
+        return signals
+
+    def update(self, price: float, observed_at: Optional[datetime] = None) -> Dict:
+        """
+        加入一次价格观测并判断是否触发下跌提醒
+        :param price: 当前价格（缺失或非正数时不更新状态，也不触发）
+        :param observed_at: 观测时间，默认当前时间
+        :return: 检测结果（fired、signals、基线指标）
+        """
+        if not is_valid_price(price):
+            return {
+                'fired': False,
+                'signals': [],
+                'ewma': round(self.ewma, 2) if self.ewma is not None else None,
+                'window_min': self.min_window[0][1] if self.min_window else None,
+                'window_peak': self.max_window[0][1] if self.max_window else None,
+                'percentile_baseline': self.quantile.value(),
+            }
+        cfg = self.config
+        now = (observed_at or datetime.now()).timestamp()
+        signals = self.evaluate(price, now)
+
+        fired_rules = len(signals) >= cfg.min_rules
+        if fired_rules and cfg.min_abs_drop is not None:
+            fired_rules = self.ewma is not None and self.ewma - price >= cfg.min_abs_drop
+        self.streak = self.streak + 1 if fired_rules else 0
+        fired = fired_rules and self.streak >= cfg.confirmations
+
+        # 增量更新状态
+        self.ewma = price if self.ewma is None else cfg.ewma_alpha * price + (1 - cfg.ewma_alpha) * self.ewma
+        while self.min_window and self.min_window[-1][1] >= price:
+            self.min_window.pop()
+        self.min_window.append([now, price])
+        while self.max_window and self.max_window[-1][1] <= price:
+            self.max_window.pop()
+        self.max_window.append([now, price])
+        self._expire(now)
+        self.quantile.add(price)
+        self.count += 1
+
+        return {
+            'fired': fired,
+            'signals': signals,
+            'ewma': round(self.ewma, 2),
+            'window_min': self.min_window[0][1],
+            'window_peak': self.max_window[0][1],
+            'percentile_baseline': self.quantile.value(),
+        }
+
+    def to_dict(self) -> Dict:
+        """序列化检测器状态"""
+        return {
+            'count': self.count,
+            'ewma': self.ewma,
+            'streak': self.streak,
+            'min_window': list(self.min_window),
+            'max_window': list(self.max_window),
+            'quantile': self.quantile.to_dict(),
+        }
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化的价格检查任务队列（SQLite）
+每个任务以 (route_key, 时间槽) 为主键：同一路线在同一时间槽内只会被调度一次，重复调度被忽略。
+工作进程以租约方式领取任务（BEGIN IMMEDIATE 保证多个进程不会领到同一任务），执行 monitor_price 后标记完成；
+进程中途退出时租约到期，任务由其他工作进程重新领取（至少执行一次）。
+完成操作是幂等的，重复完成不会改变结果；重新领取的任务如果发现该路线在本时间槽内已有价格观测
+（上次执行已写入监控记录但未来得及标记完成），直接标记完成，不再重复请求价格接口。
+
+用法:
+    python price_jobs.py schedule routes.json [--interval-hours 24]   # routes.json 格式同 monitor_routes
+    python price_jobs.py worker [--once] [--batch 4]                   # 可同时启动多个
+    python price_jobs.py stats
+    python price_jobs.py retry-failed
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from json_store import read_json, read_json_cached
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = 'price_jobs.db'
+LEASE_SECONDS = 300     # 租约时长，超时未完成的任务可被重新领取
+MAX_ATTEMPTS = 5        # 超过该次数仍失败的任务标记为 failed
+RETRY_BACKOFF = 60      # 失败后的重试间隔（秒，按次数递增）
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_jobs (
+    route_key      TEXT NOT NULL,
+    slot           TEXT NOT NULL,
+    departure      TEXT NOT NULL,
+    arrival        TEXT NOT NULL,
+    travel_date    TEXT NOT NULL,
+    price_threshold REAL,
+    state          TEXT NOT NULL DEFAULT 'pending',
+    attempts       INTEGER NOT NULL DEFAULT 0,
+    available_at   REAL NOT NULL,
+    lease_owner    TEXT,
+    lease_expires  REAL,
+    error          TEXT,
+    created_at     REAL NOT NULL,
+    finished_at    REAL,
+    PRIMARY KEY (route_key, slot)
+);
+CREATE INDEX IF NOT EXISTS price_jobs_ready ON price_jobs (state, available_at);
+"""
+
+
+def time_slot(interval_hours: float, now: Optional[float] = None) -> str:
+    """当前时间所在时间槽的起点（本地时间，按间隔对齐），如 '2024-02-15T08:00'"""
+    now = time.time() if now is None else now
+    seconds = max(1, int(interval_hours * 3600))
+    start = datetime.fromtimestamp(now)
+    midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    # 一天内按间隔切分，间隔超过一天时按自 1970-01-01 起的天数对齐
+    if seconds < 86400:
+        elapsed = int((start - midnight).total_seconds()) // seconds * seconds
+        return (midnight + timedelta(seconds=elapsed)).strftime('%Y-%m-%dT%H:%M')
+    days = seconds // 86400
+    ordinal = midnight.toordinal() // days * days
+    return datetime.fromordinal(ordinal).strftime('%Y-%m-%dT%H:%M')
+
+
+def route_key(departure: str, arrival: str, travel_date: str) -> str:
+    """与价格监控记录中的 route_key 一致"""
+    return f"{departure}_{arrival}_{travel_date}"
+
+
+def parse_route(route) -> Tuple[str, str, str]:
+    """
+    解析一条路线
+    :param route: (出发地, 目的地, 出行日期) 或含 departure/arrival/travel_date 的字典
+    :return: (出发地, 目的地, 出行日期)，格式错误时抛出 ValueError
+    """
+    if isinstance(route, dict):
+        missing = [k for k in ('departure', 'arrival', 'travel_date') if k not in route]
+        if missing:
+            raise ValueError(f"缺少字段: {', '.join(missing)}")
+        fields = (route['departure'], route['arrival'], route['travel_date'])
+    elif isinstance(route, (list, tuple)) and len(route) == 3:
+        fields = tuple(route)
+    else:
+        raise ValueError("路线应为 [出发地, 目的地, 出行日期] 或对象")
+    if not all(isinstance(f, str) and f.strip() for f in fields):
+        raise ValueError("出发地、目的地和出行日期必须是非空字符串")
+    try:
+        date.fromisoformat(fields[2])
+    except ValueError:
+        raise ValueError(f"出行日期应为 YYYY-MM-DD: {fields[2]}")
+    return fields
+
+
+class PriceJobQueue:
+    """价格检查任务队列，可在多个线程和进程间共享同一个数据库文件"""
+
+    def __init__(self,
+                 path: str = DB_FILE,
+                 lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程一个连接（自动提交模式，需要原子性的操作显式开启事务）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def schedule(self,
+                 routes: List,
+                 slot: str,
+                 price_threshold: Optional[float] = None) -> Dict:
+        """
+        调度一批价格检查（同一路线同一时间槽已存在时忽略）
+        格式错误的路线逐条跳过并在结果中列出，不影响同批其他路线
+        :param routes: 路线列表，元素为 (出发地, 目的地, 出行日期) 或含 departure/arrival/travel_date 的字典
+        :param slot: 时间槽（见 time_slot）
+        :param price_threshold: 相对EWMA基线的最小下跌金额（可选）
+        :return: {'added': 新增任务数, 'existing': 已存在数, 'invalid': [{'index', 'route', 'error'}]}
+        """
+        now = time.time()
+        rows, invalid = [], []
+        for i, route in enumerate(routes):
+            try:
+                departure, arrival, travel_date = parse_route(route)
+            except ValueError as e:
+                invalid.append({'index': i, 'route': route, 'error': str(e)})
+                continue
+            rows.append((route_key(departure, arrival, travel_date), slot, departure, arrival,
+                         travel_date, price_threshold, now, now))
+        added = 0
+        if rows:
+            conn = self._connect()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                before = conn.total_changes
+                conn.executemany(
+                    'INSERT OR IGNORE INTO price_jobs (route_key, slot, departure, arrival, travel_date, '
+                    'price_threshold, available_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+                )
+                added = conn.total_changes - before
+        return {'added': added, 'existing': len(rows) - added, 'invalid': invalid}
+
+    def lease(self, worker_id: str, limit: int = 1) -> List[Dict]:
+        """
+        领取可执行的任务：待执行且已到重试时间的任务，以及租约已过期的任务
+        :param worker_id: 工作进程标识（完成/失败时用于校验租约）
+        :param limit: 最多领取数
+        :return: 任务字典列表
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                "SELECT * FROM price_jobs WHERE (state = 'pending' AND available_at <= ?) "
+                "OR (state = 'leased' AND lease_expires <= ?) ORDER BY available_at LIMIT ?",
+                (now, now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE price_jobs SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE route_key = ? AND slot = ?",
+                [(worker_id, now + self.lease_seconds, r['route_key'], r['slot']) for r in rows]
+            )
+        jobs = [dict(r) for r in rows]
+        for job in jobs:
+            job['attempts'] += 1
+            job['lease_owner'] = worker_id
+        return jobs
+
+    def complete(self, job: Dict) -> bool:
+        """
+        标记任务完成（幂等：已完成的任务保持不变）
+        租约已过期并被其他进程领取的任务同样可以完成，检查已经执行过，无需再做一次
+        :return: 本次调用是否改变了任务状态
+        """
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE price_jobs SET state = 'done', lease_owner = NULL, lease_expires = NULL, "
+            "error = NULL, finished_at = ? WHERE route_key = ? AND slot = ? AND state != 'done'",
+            (time.time(), job['route_key'], job['slot'])
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, job: Dict, error: str) -> bool:
+        """
+        记录一次失败：未超过最大次数时退避后重新排队，否则标记为 failed
+        只有仍持有租约的进程才能改变任务状态
+        :return: 是否仍会重试（租约已被其他进程接管时返回 False）
+        """
+        retry = job['attempts'] < self.max_attempts
+        now = time.time()
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE price_jobs SET state = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, "
+            "error = ?, finished_at = ? WHERE route_key = ? AND slot = ? AND state = 'leased' AND lease_owner = ?",
+            ('pending' if retry else 'failed', now + RETRY_BACKOFF * job['attempts'], error,
+             None if retry else now, job['route_key'], job['slot'], job['lease_owner'])
+        )
+        return cursor.rowcount > 0 and retry
+
+    def retry_failed(self) -> int:
+        """把 failed 的任务重新排队（重置尝试次数），返回任务数"""
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE price_jobs SET state = 'pending', attempts = 0, available_at = ?, finished_at = NULL "
+            "WHERE state = 'failed'", (time.time(),)
+        )
+        return cursor.rowcount
+
+    def purge(self, older_than_days: float = 30) -> int:
+        """删除早于指定天数完成的任务，返回删除数"""
+        conn = self._connect()
+        cursor = conn.execute(
+            "DELETE FROM price_jobs WHERE state = 'done' AND finished_at < ?",
+            (time.time() - older_than_days * 86400,)
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的任务数（租约过期的 leased 任务单独计为 expired）"""
+        conn = self._connect()
+        counts = {'pending': 0, 'leased': 0, 'expired': 0, 'done': 0, 'failed': 0}
+        rows = conn.execute(
+            "SELECT CASE WHEN state = 'leased' AND lease_expires <= ? THEN 'expired' ELSE state END, count(*) "
+            "FROM price_jobs GROUP BY 1", (time.time(),)
+        ).fetchall()
+        counts.update({state: count for state, count in rows})
+        return counts
+
+
+def already_observed(alerts_file: str, job: Dict) -> bool:
+    """该路线在任务所属时间槽内是否已有价格观测（上次执行写入了监控记录但没来得及标记完成）"""
+    slot_start = datetime.fromisoformat(job['slot'])
+    for alert in read_json_cached(alerts_file, []):
+        if alert.get('route_key') == job['route_key']:
+            try:
+                return datetime.fromisoformat(alert['timestamp']) >= slot_start
+            except (KeyError, TypeError, ValueError):
+                return False
+    return False
+
+
+def run_worker(queue: PriceJobQueue,
+               assistant,
+               worker_id: Optional[str] = None,
+               batch: int = 4,
+               idle_seconds: float = 5,
+               once: bool = False,
+               stop: Optional[threading.Event] = None) -> Dict[str, int]:
+    """
+    工作循环：领取任务 -> monitor_price -> 完成/失败
+    :param assistant: FlightAssistant 实例
+    :param worker_id: 工作进程标识（默认 主机名:进程号）
+    :param batch: 每次领取的任务数
+    :param idle_seconds: 没有任务时的等待时间
+    :param once: 为 True 时处理完当前可执行的任务后退出
+    :param stop: 设置后在当前批次结束时退出
+    :return: {'done', 'skipped', 'failed'} 计数
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+    while not (stop and stop.is_set()):
+        jobs = queue.lease(worker_id, batch)
+        if not jobs:
+            if once:
+                break
+            time.sleep(idle_seconds)
+            continue
+        for job in jobs:
+            if job['attempts'] > 1 and already_observed(assistant.price_alerts_file, job):
+                queue.complete(job)
+                counts['skipped'] += 1
+                continue
+            try:
+                ok = assistant.monitor_price(job['departure'], job['arrival'], job['travel_date'],
+                                             price_threshold=job['price_threshold'])
+                error = None if ok else '价格查询或记录失败'
+            except Exception as e:
+                ok, error = False, str(e)
+            if ok:
+                queue.complete(job)
+                counts['done'] += 1
+            else:
+                retry = queue.fail(job, error)
+                counts['failed'] += 1
+                logger.warning(f"价格检查失败 {job['route_key']} ({job['slot']}): {error}"
+                               f"{'，稍后重试' if retry else '，已放弃'}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='持久化的价格检查任务队列')
+    parser.add_argument('--db', default=DB_FILE, help='任务数据库文件')
+    sub = parser.add_subparsers(dest='command', required=True)
+    s = sub.add_parser('schedule', help='调度当前时间槽的价格检查')
+    s.add_argument('routes', help='路线JSON文件：[[出发地, 目的地, 日期], ...] 或对象列表')
+    s.add_argument('--interval-hours', type=float, help='检查间隔（默认 PRICE_CHECK_INTERVAL_HOURS）')
+    s.add_argument('--threshold', type=float, help='最小下跌金额')
+    w = sub.add_parser('worker', help='运行工作进程')
+    w.add_argument('--once', action='store_true', help='处理完当前任务后退出')
+    w.add_argument('--batch', type=int, default=4, help='每次领取的任务数')
+    w.add_argument('--id', help='工作进程标识')
+    sub.add_parser('stats', help='各状态任务数')
+    sub.add_parser('retry-failed', help='重新排队失败的任务')
+    args = parser.parse_args()
+
+    queue = PriceJobQueue(args.db)
+    if args.command == 'schedule':
+        from flight_assistant import load_env
+        load_env()
+        interval = args.interval_hours or float(os.getenv('PRICE_CHECK_INTERVAL_HOURS', 24))
+        routes = read_json(args.routes, None)
+        if not isinstance(routes, list):
+            print(f"✗ 路线文件格式错误: {args.routes}")
+            sys.exit(1)
+        slot = time_slot(interval)
+        result = queue.schedule(routes, slot, args.threshold)
+        print(f"✓ 时间槽 {slot}: 新增 {result['added']} 个任务，{result['existing']} 个已存在")
+        for item in result['invalid']:
+            print(f"✗ 第 {item['index'] + 1} 条路线格式错误 {json.dumps(item['route'], ensure_ascii=False)}: "
+                  f"{item['error']}")
+        if result['invalid']:
+            sys.exit(1)
+    elif args.command == 'worker':
+        from flight_assistant import FlightAssistant, setup_logging
+        setup_logging()
+        counts = run_worker(queue, FlightAssistant(), args.id, args.batch, once=args.once)
+        print(f"✓ 完成 {counts['done']}，跳过 {counts['skipped']}，失败 {counts['failed']}")
+    elif args.command == 'stats':
+        print(json.dumps(queue.stats(), ensure_ascii=False))
+    else:
+        print(f"✓ 已重新排队 {queue.retry_failed()} 个任务")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+定长二进制飞行记录存储（可选布局 'binary'）
+- flight_records.bin: 16字节文件头 + 每条56字节的定长行（struct 打包）
+- flight_records.strings.json: 字符串字典（航班号、机场、航司、舱位）
+
+读取时用 mmap 打开，按列直接筛选航司、舱位、起飞年月并排序，
+只有最终返回的行才还原为字典，查询无需解析整个文件
+
+用法（将JSON记录转换为二进制布局）:
+    python record_binary.py convert flight_records.json flight_records.bin
+"""
+
+import heapq
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from json_store import file_lock, read_json, read_json_cached, write_json
+from metrics import instrument
+from record_store import (DepartureIndex, RecordKeyIndex, append_result, file_signature, plan_append,
+                          query_departures, record_key)
+
+MAGIC = b'FLRB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')  # 魔数、版本、保留、行数
+# 行：航班号/起飞机场/到达机场/航司/舱位的字符串ID，里程，起飞/到达/记录时间（微秒），标志位，填充到8字节对齐
+ROW = struct.Struct('<5Ii3qB7x')
+ROW_INTS = ROW.size // 4      # uint32 视图中每行的跨度
+ROW_INT64S = ROW.size // 8    # int64 视图中每行的跨度
+FLAGS_OFFSET = 48             # 标志位在行内的字节偏移
+
+# 字段在 uint32 / int64 视图中的列下标
+COL_AIRLINE, COL_CABIN, COL_MILES = 3, 4, 5
+COL_DEPARTURE, COL_RECORD_DATE = 3, 5
+
+# 标志位：时间字段无法无损编码为微秒时，改存字符串ID
+FLAG_DEPARTURE_STR, FLAG_ARRIVAL_STR, FLAG_RECORD_DATE_STR = 1, 2, 4
+
+STRING_FIELDS = ('flight_number', 'departure_airport', 'arrival_airport', 'airline', 'cabin_class')
+TIME_FIELDS = (('departure_time', FLAG_DEPARTURE_STR),
+               ('arrival_time', FLAG_ARRIVAL_STR),
+               ('record_date', FLAG_RECORD_DATE_STR))
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_time(value: str) -> Optional[int]:
+    """ISO时间字符串 -> 自1970年起的微秒数；无法无损还原（带时区、非标准写法）时返回None"""
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is not None:
+        return None
+    micros = (dt - EPOCH) // MICROSECOND
+    return micros if decode_time(micros) == value else None
+
+
+def decode_time(micros: int) -> str:
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+UNPARSED_TIME_KEY = -(1 << 63)   # 无法解析的时间字符串的排序键
+
+
+def _string_time_key(value: str) -> int:
+    """以字符串保存的时间换算为微秒用于排序/筛选，无法解析时排在最前"""
+    try:
+        return (datetime.fromisoformat(value).replace(tzinfo=None) - EPOCH) // MICROSECOND
+    except ValueError:
+        return UNPARSED_TIME_KEY
+
+
+class BinaryRecordView(Sequence):
+    """二进制记录的惰性序列：按下标访问时才把对应行还原为字典"""
+
+    def __init__(self, buffer, strings: List[str], rows: Sequence):
+        self._buffer = buffer
+        self._strings = strings
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return BinaryRecordView(self._buffer, self._strings, self._rows[index])
+        return self._materialize(self._rows[index])
+
+    def _materialize(self, row: int) -> Dict:
+        (flight_number, departure_airport, arrival_airport, airline, cabin_class,
+         miles, departure_time, arrival_time, record_date, flags) = \
+            ROW.unpack_from(self._buffer, HEADER.size + row * ROW.size)
+        strings = self._strings
+
+        def time_value(raw: int, flag: int) -> str:
+            return strings[raw] if flags & flag else decode_time(raw)
+
+        return {
+            'flight_number': strings[flight_number],
+            'departure_airport': strings[departure_airport],
+            'arrival_airport': strings[arrival_airport],
+            'departure_time': time_value(departure_time, FLAG_DEPARTURE_STR),
+            'arrival_time': time_value(arrival_time, FLAG_ARRIVAL_STR),
+            'airline': strings[airline],
+            'cabin_class': strings[cabin_class],
+            'miles': miles,
+            'record_date': time_value(record_date, FLAG_RECORD_DATE_STR),
+        }
+
+
+class BinaryRecordStore:
+    """定长二进制记录存储，接口与 FlatRecordStore / ShardedRecordStore 一致"""
+
+    layout = 'binary'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.strings_path = os.path.splitext(path)[0] + '.strings.json'
+        self.key_index = RecordKeyIndex(f"{path}.keys")
+        self.write_generation = 0
+        self.departure_index = DepartureIndex(self)
+
+    def version(self) -> Tuple:
+        """数据版本：任何写入后都会变化（追加会更新数据文件的 mtime，覆盖更新会替换数据文件）"""
+        return self.write_generation, file_signature(self.path, self.strings_path)
+
+    def init(self) -> bool:
+        """创建只含文件头的空数据文件，返回是否新建"""
+        try:
+            with open(self.path, 'xb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+            return True
+        except FileExistsError:
+            return False
+
+    def _open(self):
+        """
+        mmap 数据文件，返回 (缓冲区, 行数, 字符串字典)
+        读者不加锁：写入方按 字符串字典 -> 行 -> 行数 的顺序落盘，因此必须先读行数再读字典
+        （字典只增不减），行数内的行引用的字符串都已在字典中
+        """
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= HEADER.size:
+                return b'', 0, read_json_cached(self.strings_path, [])
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是有效的二进制记录文件: {self.path}")
+        strings = read_json_cached(self.strings_path, [])
+        # 写入方先写行再更新行数，按映射长度截断以防越过映射区域
+        return buffer, min(count, (len(buffer) - HEADER.size) // ROW.size), strings
+
+    @staticmethod
+    def _rows_view(buffer, count: int) -> memoryview:
+        return memoryview(buffer)[HEADER.size:HEADER.size + count * ROW.size]
+
+    @staticmethod
+    def _month_range(year: int, month: Optional[int]):
+        start = datetime(year, month or 1, 1)
+        if month:
+            end = datetime(year + month // 12, month % 12 + 1, 1)
+        else:
+            end = datetime(year + 1, 1, 1)
+        return (start - EPOCH) // MICROSECOND, (end - EPOCH) // MICROSECOND
+
+    def _select(self, buffer, count: int, strings: List[str],
+                airline: Optional[str] = None,
+                cabin_class: Optional[str] = None,
+                year: Optional[int] = None,
+                month: Optional[int] = None) -> Sequence:
+        """按列筛选，返回匹配的行号（不还原字典）"""
+        rows = range(count)
+        if not (airline or cabin_class or year or month):
+            return rows
+        data = self._rows_view(buffer, count)
+        ints = data.cast('I')
+        flags = data[FLAGS_OFFSET::ROW.size]
+        ids = {s: i for i, s in enumerate(strings)} if (airline or cabin_class) else {}
+
+        for column, value in ((COL_AIRLINE, airline), (COL_CABIN, cabin_class)):
+            if value:
+                target = ids.get(value)
+                values = ints[column::ROW_INTS]
+                rows = [r for r in rows if values[r] == target] if target is not None else []
+
+        if year or month:
+            departures = data.cast('q')[COL_DEPARTURE::ROW_INT64S]
+
+            def departure(r: int) -> int:
+                raw = departures[r]
+                return _string_time_key(strings[raw]) if flags[r] & FLAG_DEPARTURE_STR else raw
+
+            if year:
+                low, high = self._month_range(year, month)
+                rows = [r for r in rows if low <= departure(r) < high]
+            else:
+                def in_month(r: int) -> bool:
+                    # 无法解析的起飞时间不属于任何月份（哨兵值换算为日期会溢出）
+                    key = departure(r)
+                    return key != UNPARSED_TIME_KEY and (EPOCH + key * MICROSECOND).month == month
+
+                rows = [r for r in rows if in_month(r)]
+        return rows
+
+    @instrument('store_load')
+    def load(self, year: Optional[int] = None, month: Optional[int] = None) -> BinaryRecordView:
+        """
+        读取记录，返回惰性序列（访问时才还原为字典）
+        :param year: 起飞年份（可选）
+        :param month: 起飞月份（可选）
+        """
+        buffer, count, strings = self._open()
+        return BinaryRecordView(buffer, strings, self._select(buffer, count, strings, year=year, month=month))
+
+    @instrument('store_query')
+    def query(self,
+              airline: Optional[str] = None,
+              cabin_class: Optional[str] = None,
+              limit: Optional[int] = None,
+              start=None,
+              end=None,
+              order_by: str = 'record_date') -> List[Dict]:
+        """
+        筛选并按记录时间倒序返回，排序只读取时间列，最后只还原需要返回的行
+        带起飞时间范围或按起飞时间排序时改用起飞时间索引（参数含义见 query_departures）
+        :param airline: 筛选航空公司（可选）
+        :param cabin_class: 筛选舱位（可选）
+        :param limit: 返回记录数限制
+        """
+        if start or end or order_by != 'record_date':
+            return query_departures(self.departure_index, airline, cabin_class, limit, start, end, order_by)
+        buffer, count, strings = self._open()
+        rows = self._select(buffer, count, strings, airline=airline, cabin_class=cabin_class)
+        if not rows:
+            return []
+        data = self._rows_view(buffer, count)
+        record_dates = data.cast('q')[COL_RECORD_DATE::ROW_INT64S]
+        flags = data[FLAGS_OFFSET::ROW.size]
+
+        def sort_key(row: int) -> int:
+            raw = record_dates[row]
+            return _string_time_key(strings[raw]) if flags[row] & FLAG_RECORD_DATE_STR else raw
+
+        if limit:
+            ordered = heapq.nlargest(limit, rows, key=sort_key)
+        else:
+            ordered = sorted(rows, key=sort_key, reverse=True)
+        return list(BinaryRecordView(buffer, strings, ordered))
+
+    def _sync_key_index(self) -> Dict[str, str]:
+        """索引缺失或与行数不一致时逐行重建（调用方持有写锁）"""
+        buffer, count, strings = self._open()
+        if self.key_index.count() != count:
+            view = BinaryRecordView(buffer, strings, range(count))
+            self.key_index.rewrite((record_key(record), str(row)) for row, record in enumerate(view))
+        return self.key_index.refresh()
+
+    def contains(self, key: str) -> bool:
+        """是否已有该键的记录（O(1)，索引落后时先重建）"""
+        _, count, _ = self._open()
+        if self.key_index.count() == count:
+            return key in self.key_index.refresh()
+        with file_lock(self.path):
+            return key in self._sync_key_index()
+
+    @instrument('store_append')
+    def append(self, records: Iterable[Dict], on_duplicate: str = 'allow') -> Dict:
+        """
+        追加记录：先写字符串字典，再写行，最后更新文件头中的行数（文件锁内完成）
+        覆盖已有记录（upsert）时写出新文件再原子替换，已映射旧文件的读者不会读到改写了一半的行
+        :param on_duplicate: 键已存在时 'allow' 照常追加、'reject' 跳过、'upsert' 覆盖
+        :return: {'added', 'updated', 'skipped', 'written'（写入的记录）}
+        """
+        with self.departure_index.lock, file_lock(self.path):
+            before = self.version()
+            new, updates, skipped = plan_append(records, self._sync_key_index(), on_duplicate)
+            if not new and not updates:
+                return append_result(new, updates, skipped)
+            strings = list(read_json(self.strings_path, []))
+            known = len(strings)
+            ids = {s: i for i, s in enumerate(strings)}
+
+            def string_id(value: str) -> int:
+                if value not in ids:
+                    ids[value] = len(strings)
+                    strings.append(value)
+                return ids[value]
+
+            def pack(record: Dict) -> bytes:
+                flags = 0
+                times = []
+                for field, flag in TIME_FIELDS:
+                    micros = encode_time(record[field])
+                    if micros is None:
+                        flags |= flag
+                        micros = string_id(record[field])
+                    times.append(micros)
+                return ROW.pack(*(string_id(record[field]) for field in STRING_FIELDS),
+                                int(record['miles']), *times, flags)
+
+            packed = [pack(record) for record in new]
+            replaced = {int(row): pack(record) for row, record in updates.items()}
+            # 行中引用的字符串必须先于行数更新落盘
+            if len(strings) != known:
+                write_json(self.strings_path, strings)
+
+            if replaced:
+                count = self._rewrite(replaced, packed)
+            else:
+                with open(self.path, 'r+b') as f:
+                    magic, version, reserved, count = HEADER.unpack(f.read(HEADER.size))
+                    f.seek(HEADER.size + count * ROW.size)
+                    f.write(b''.join(packed))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.seek(0)
+                    f.write(HEADER.pack(magic, version, reserved, count + len(packed)))
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.write_generation += 1
+            self.key_index.add((record_key(r), str(count + i)) for i, r in enumerate(new))
+            self.departure_index.apply(before, self.version(), new, updates.values())
+        return append_result(new, updates, skipped)
+
+    def _rewrite(self, replaced: Dict[int, bytes], packed: List[bytes]) -> int:
+        """
+        写出替换了部分行并追加新行的完整数据文件，再原子替换（调用方持有写锁）
+        :return: 替换前的行数
+        """
+        with open(self.path, 'rb') as f:
+            magic, version, reserved, count = HEADER.unpack(f.read(HEADER.size))
+            rows = bytearray(f.read(count * ROW.size))
+        for row, data in replaced.items():
+            rows[row * ROW.size:(row + 1) * ROW.size] = data
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(magic, version, reserved, count + len(packed)))
+            f.write(rows)
+            f.write(b''.join(packed))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return count
+
+    def compact(self) -> int:
+        """去除重复记录（保留每个键最早的一行），按原始字节复制保留的行，返回删除的条数"""
+        with file_lock(self.path):
+            buffer, count, strings = self._open()
+            seen, kept = set(), []
+            for row, record in enumerate(BinaryRecordView(buffer, strings, range(count))):
+                key = record_key(record)
+                if key not in seen:
+                    seen.add(key)
+                    kept.append((key, row))
+            if len(kept) != count:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(HEADER.pack(MAGIC, VERSION, 0, len(kept)))
+                    for _, row in kept:
+                        offset = HEADER.size + row * ROW.size
+                        f.write(buffer[offset:offset + ROW.size])
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self.write_generation += 1
+            self.key_index.rewrite((key, str(i)) for i, (key, _) in enumerate(kept))
+        return count - len(kept)
+
+    def total_miles(self) -> int:
+        """累计里程（只读取里程列）"""
+        buffer, count, _ = self._open()
+        if not count:
+            return 0
+        return sum(self._rows_view(buffer, count).cast('i')[COL_MILES::ROW_INTS])
+
+
+def convert_json_to_binary(json_path: str, binary_path: str) -> int:
+    """
+    将JSON记录文件转换为二进制布局（目标文件不能已存在）
+    :return: 转换的记录数
+    """
+    if os.path.exists(binary_path):
+        raise ValueError(f"目标文件已存在: {binary_path}")
+    store = BinaryRecordStore(binary_path)
+    store.init()
+    records = read_json(json_path, [])
+    store.append(records)
+    return len(records)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'convert':
+        count = convert_json_to_binary(sys.argv[2], sys.argv[3])
+        print(f"✓ 已转换 {count} 条记录到 {sys.argv[3]}")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,687 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+飞行记录存储
+- FlatRecordStore: 单个 flight_records.json 文件（默认布局）
+- ShardedRecordStore: 按起飞年月分片的目录布局，附带清单文件，
+  按年/月的查询和新增记录只读写相关分片
+- BinaryRecordStore: 定长二进制行 + mmap 读取（见 record_binary.py）
+
+每种布局都维护一个持久化的记录键索引（RecordKeyIndex），新增记录时按
+FlightRecord.get_key 在 O(1) 内发现重复，可选择拒绝或覆盖（upsert）
+
+每种布局都带一个按起飞时间排序的内存索引（DepartureIndex），起飞时间范围查询和按起飞时间
+排序只需二分查找，本进程的写入会增量更新索引，其他进程写入后在下次查询时重建
+
+每种布局都提供 version()：本进程的写入代数加上数据文件的 (inode, mtime, size)，
+任何写入（包括其他进程的写入）都会改变它，上层据此判断派生结果（如统计报告）是否过期
+
+用法:
+    python record_store.py migrate flight_records.json flight_records   # 单文件迁移为分片布局
+    python record_store.py dedupe flat [flight_records.json] [flight_records]   # 一次性去重压缩
+"""
+
+import bisect
+import itertools
+import logging
+import os
+import sys
+import threading
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from json_store import (atomic_write_text, create_json_if_missing, file_lock, read_json,
+                        read_json_cached, write_json)
+from metrics import instrument
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+KEY_INDEX_FILE = 'keys'
+UNKNOWN_PARTITION = 'unknown'
+
+# 遇到重复记录时的处理方式：照常追加、拒绝（跳过）、覆盖已有记录
+DUPLICATE_POLICIES = ('allow', 'reject', 'upsert')
+
+# 查询结果的排序方式：记录时间倒序（默认）、起飞时间正序、起飞时间倒序
+ORDER_BY = ('record_date', 'departure_time', '-departure_time')
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def departure_partition(record: Dict) -> str:
+    """记录所属分片（起飞时间的 YYYY-MM），无法解析时归入 unknown"""
+    value = record.get('departure_time')
+    # 常见的 ISO 字符串直接截取前缀，避免逐条解析日期
+    if isinstance(value, str) and len(value) >= 10 and value[4] == '-' and value[7] == '-' \
+            and value[:4].isdigit() and value[5:7].isdigit():
+        return value[:7]
+    try:
+        return datetime.fromisoformat(record['departure_time']).strftime('%Y-%m')
+    except (KeyError, TypeError, ValueError):
+        return UNKNOWN_PARTITION
+
+
+def partition_matches(partition: str, year: Optional[int] = None, month: Optional[int] = None) -> bool:
+    """分片是否落在指定年/月内（未指定年月时全部匹配）"""
+    return partition_filter(year, month)(partition)
+
+
+def partition_filter(year: Optional[int] = None, month: Optional[int] = None):
+    """生成判断分片是否落在指定年/月内的函数（比较预先格式化的字符串）"""
+    if year and month:
+        target = f"{year:04d}-{month:02d}"
+        return lambda p: p == target
+    if year:
+        prefix = f"{year:04d}-"
+        return lambda p: p.startswith(prefix)
+    if month:
+        suffix = f"-{month:02d}"
+        return lambda p: p != UNKNOWN_PARTITION and p.endswith(suffix)
+    return lambda p: True
+
+
+def query_records(records: Iterable[Dict],
+                  airline: Optional[str] = None,
+                  cabin_class: Optional[str] = None,
+                  limit: Optional[int] = None) -> List[Dict]:
+    """按航司/舱位筛选并按记录时间倒序排列（返回副本，调用方修改不会影响缓存中的记录）"""
+    if airline:
+        records = [r for r in records if r['airline'] == airline]
+    if cabin_class:
+        records = [r for r in records if r['cabin_class'] == cabin_class]
+    records = sorted(records, key=lambda x: x['record_date'], reverse=True)
+    return [dict(r) for r in (records[:limit] if limit else records)]
+
+
+def file_signature(*paths: str) -> Tuple:
+    """文件的 (inode, mtime_ns, size)，不存在的文件为 None"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def record_key(record: Dict) -> str:
+    """记录唯一标识（与 FlightRecord.get_key 一致）"""
+    return f"{record['flight_number']}_{record['departure_time']}_{record['departure_airport']}"
+
+
+class RecordKeyIndex:
+    """
+    持久化的记录键索引：只追加的文本文件，每条记录一行 "键\t位置"
+    进程内保留 键 -> 位置 的字典，文件增长时只读取新增的部分，被整体替换（压缩、重建）时重新加载
+    位置由各存储自行解释（单文件/二进制为行号，分片为 "分片/行号"）
+    行数与存储中的记录数一致，不一致时说明索引落后（如旧版本写入的数据），由存储负责重建
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._positions: Dict[str, str] = {}
+        self._lines = 0
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Dict[str, str]:
+        """读取文件中新增的行，返回 键 -> 位置（共享字典，只读）"""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._positions, self._lines, self._offset, self._inode = {}, 0, 0, None
+                return self._positions
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                self._positions, self._lines, self._offset = {}, 0, 0
+                self._inode = st.st_ino
+            if st.st_size > self._offset:
+                with open(self.path, 'rb') as f:
+                    f.seek(self._offset)
+                    chunk = f.read(st.st_size - self._offset)
+                # 只处理完整的行，写了一半的行留到下次
+                end = chunk.rfind(b'\n') + 1
+                for line in chunk[:end].decode('utf-8').splitlines():
+                    key, _, position = line.partition('\t')
+                    self._positions[key] = position
+                    self._lines += 1
+                self._offset += end
+            return self._positions
+
+    def count(self) -> int:
+        """索引覆盖的记录数（文件不存在时为 -1）"""
+        self.refresh()
+        return self._lines if self._inode is not None else -1
+
+    def add(self, entries: Iterable[Tuple[str, str]]):
+        """追加索引行（调用方持有存储的写锁）"""
+        content = ''.join(f"{key}\t{position}\n" for key, position in entries)
+        if not content:
+            return
+        with open(self.path, 'ab') as f:
+            f.write(content.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rewrite(self, entries: Iterable[Tuple[str, str]]):
+        """整体重写索引（原子替换）"""
+        atomic_write_text(self.path, ''.join(f"{key}\t{position}\n" for key, position in entries))
+
+
+def plan_append(records: Iterable[Dict], positions: Dict[str, str], on_duplicate: str):
+    """
+    按重复处理方式划分待写入的记录
+    :param positions: 已有记录的 键 -> 位置
+    :param on_duplicate: 'allow'、'reject' 或 'upsert'（同一批内的重复也按此处理）
+    :return: (新增记录列表, 需覆盖的 {位置: 记录}, 跳过数)
+    """
+    if on_duplicate not in DUPLICATE_POLICIES:
+        raise ValueError(f"未知的重复处理方式: {on_duplicate}")
+    if on_duplicate == 'allow':
+        return list(records), {}, 0
+    new, updates, skipped = [], {}, 0
+    batch: Dict[str, int] = {}
+    for record in records:
+        key = record_key(record)
+        if key in batch:
+            if on_duplicate == 'upsert':
+                new[batch[key]] = record
+            else:
+                skipped += 1
+        elif key in positions:
+            if on_duplicate == 'upsert':
+                updates[positions[key]] = record
+            else:
+                skipped += 1
+        else:
+            batch[key] = len(new)
+            new.append(record)
+    return new, updates, skipped
+
+
+def append_result(new: List[Dict], updates: Dict, skipped: int) -> Dict:
+    """追加结果：各类计数，以及实际写入（新增或覆盖）的记录"""
+    return {'added': len(new), 'updated': len(updates), 'skipped': skipped,
+            'written': new + list(updates.values())}
+
+
+def departure_epoch(value) -> Optional[int]:
+    """起飞时间 -> 自1970年起的微秒数（带时区的时间按其本地时间计），无法解析时返回None"""
+    try:
+        dt = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return (dt.replace(tzinfo=None) - EPOCH) // MICROSECOND
+
+
+def departure_bound(value, end: bool = False) -> Optional[int]:
+    """
+    查询范围的边界 -> 微秒数（起点包含、终点不包含）
+    只给日期（'2024-05-31' 或 date 对象）的终点包含当天
+    """
+    if value is None:
+        return None
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time()) + timedelta(days=1 if end else 0)
+    elif isinstance(value, str) and len(value) == 10 and end:
+        value = datetime.fromisoformat(value) + timedelta(days=1)
+    bound = departure_epoch(value)
+    if bound is None:
+        raise ValueError(f"无法解析的时间: {value}")
+    return bound
+
+
+class DepartureIndex:
+    """
+    按起飞时间排序的内存索引：并列的 时间列表 / 记录列表，范围查询用 bisect 定位，
+    代价为 O(log n + k)。索引对应存储的某个 version()，本进程写入时在存储的写锁内
+    用 insort 增量插入；版本对不上（其他进程写入过）时在下次查询时整体重建
+    起飞时间无法解析的记录不参与范围查询，按起飞时间排序时排在最后
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.RLock()
+        self._version = None
+        self._times: List[int] = []
+        self._records: List[Dict] = []
+        self._unparsed: List[Dict] = []
+
+    def _ensure(self):
+        """版本变化时从存储重建（调用方持有 self.lock）"""
+        version = self.store.version()
+        if version == self._version:
+            return
+        entries, unparsed = [], []
+        for record in self.store.load():
+            epoch = departure_epoch(record.get('departure_time'))
+            if epoch is None:
+                unparsed.append(record)
+            else:
+                entries.append((epoch, record))
+        entries.sort(key=lambda e: e[0])
+        self._times = [e[0] for e in entries]
+        self._records = [e[1] for e in entries]
+        self._unparsed = unparsed
+        self._version = version
+
+    def apply(self, before: Tuple, after: Tuple, new: List[Dict], updated: Iterable[Dict]):
+        """
+        写入后增量更新（调用方持有 self.lock 和存储的写锁）
+        :param before: 写入前的存储版本，与索引版本不一致时放弃增量更新，留待重建
+        :param after: 写入后的存储版本
+        :param new: 新增的记录
+        :param updated: 覆盖写入的记录（键相同，起飞时间必然相同）
+        """
+        if self._version != before or before == after:
+            return
+        for record in updated:
+            epoch = departure_epoch(record['departure_time'])
+            key = record_key(record)
+            if epoch is None:
+                candidates = range(len(self._unparsed))
+                target = self._unparsed
+            else:
+                lo = bisect.bisect_left(self._times, epoch)
+                candidates = range(lo, bisect.bisect_right(self._times, epoch, lo))
+                target = self._records
+            for i in candidates:
+                if record_key(target[i]) == key:
+                    target[i] = record
+                    break
+        for record in new:
+            epoch = departure_epoch(record.get('departure_time'))
+            if epoch is None:
+                self._unparsed.append(record)
+                continue
+            i = bisect.bisect_right(self._times, epoch)
+            self._times.insert(i, epoch)
+            self._records.insert(i, record)
+        self._version = after
+
+    def select(self,
+               start=None,
+               end=None,
+               descending: bool = False,
+               match=None,
+               limit: Optional[int] = None) -> List[Dict]:
+        """
+        按起飞时间范围取记录
+        :param start: 起点（含），ISO字符串、datetime 或 date
+        :param end: 终点（不含；纯日期时包含当天）
+        :param descending: 是否按起飞时间倒序
+        :param match: 额外的筛选函数（可选）
+        :param limit: 最多返回条数，达到后停止扫描
+        """
+        low, high = departure_bound(start), departure_bound(end, end=True)
+        with self.lock:
+            self._ensure()
+            lo = bisect.bisect_left(self._times, low) if low is not None else 0
+            hi = bisect.bisect_left(self._times, high) if high is not None else len(self._times)
+            parsed = self._records[lo:hi]
+            unparsed = list(self._unparsed) if low is None and high is None else []
+        if descending:
+            parsed.reverse()
+        results = []
+        for record in itertools.chain(parsed, unparsed):
+            if match is None or match(record):
+                results.append(record)
+                if limit and len(results) >= limit:
+                    break
+        return results
+
+
+def query_departures(index: DepartureIndex,
+                     airline: Optional[str] = None,
+                     cabin_class: Optional[str] = None,
+                     limit: Optional[int] = None,
+                     start=None,
+                     end=None,
+                     order_by: str = 'record_date') -> List[Dict]:
+    """通过起飞时间索引完成带时间范围或按起飞时间排序的查询"""
+    if order_by not in ORDER_BY:
+        raise ValueError(f"未知的排序方式: {order_by}")
+
+    def match(record: Dict) -> bool:
+        return (not airline or record['airline'] == airline) and \
+            (not cabin_class or record['cabin_class'] == cabin_class)
+
+    if order_by == 'record_date':
+        return query_records(index.select(start, end), airline, cabin_class, limit)
+    records = index.select(start, end, descending=order_by.startswith('-'),
+                           match=match if airline or cabin_class else None, limit=limit)
+    return [dict(r) for r in records]
+
+
+class FlatRecordStore:
+    """单文件记录存储"""
+
+    layout = 'flat'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.key_index = RecordKeyIndex(f"{path}.keys")
+        self.write_generation = 0
+        self.departure_index = DepartureIndex(self)
+
+    def init(self) -> bool:
+        """创建空数据文件，返回是否新建"""
+        return create_json_if_missing(self.path, [])
+
+    def version(self) -> Tuple:
+        """数据版本：任何写入后都会变化"""
+        return self.write_generation, file_signature(self.path)
+
+    def _sync_key_index(self, data: List[Dict]) -> Dict[str, str]:
+        """索引缺失或与数据条数不一致时按数据重建（调用方持有写锁）"""
+        if self.key_index.count() != len(data):
+            self.key_index.rewrite((record_key(r), str(i)) for i, r in enumerate(data))
+        return self.key_index.refresh()
+
+    def contains(self, key: str) -> bool:
+        """是否已有该键的记录（O(1)，索引落后时先重建）"""
+        if self.key_index.count() == len(read_json_cached(self.path, [])):
+            return key in self.key_index.refresh()
+        with file_lock(self.path):
+            return key in self._sync_key_index(read_json(self.path, []))
+
+    @instrument('store_load')
+    def load(self, year: Optional[int] = None, month: Optional[int] = None) -> List[Dict]:
+        """
+        读取记录（解析结果按文件版本缓存，返回的字典不应原地修改）
+        :param year: 起飞年份（可选）
+        :param month: 起飞月份（可选）
+        """
+        records = read_json_cached(self.path, [])
+        if year or month:
+            matches = partition_filter(year, month)
+            return [r for r in records if matches(departure_partition(r))]
+        return list(records)
+
+    @instrument('store_query')
+    def query(self,
+              airline: Optional[str] = None,
+              cabin_class: Optional[str] = None,
+              limit: Optional[int] = None,
+              start=None,
+              end=None,
+              order_by: str = 'record_date') -> List[Dict]:
+        """按航司/舱位/起飞时间范围筛选，默认按记录时间倒序返回（参数含义见 query_departures）"""
+        if start or end or order_by != 'record_date':
+            return query_departures(self.departure_index, airline, cabin_class, limit, start, end, order_by)
+        return query_records(self.load(), airline, cabin_class, limit)
+
+    @instrument('store_append')
+    def append(self, records: Iterable[Dict], on_duplicate: str = 'allow') -> Dict:
+        """
+        追加记录（文件锁内读-改-写）
+        :param on_duplicate: 键已存在时 'allow' 照常追加、'reject' 跳过、'upsert' 覆盖
+        :return: {'added', 'updated', 'skipped', 'written'（写入的记录）}
+        """
+        with self.departure_index.lock, file_lock(self.path):
+            before = self.version()
+            data = read_json(self.path, [])
+            positions = self._sync_key_index(data)
+            new, updates, skipped = plan_append(records, positions, on_duplicate)
+            for position, record in updates.items():
+                data[int(position)] = record
+            start = len(data)
+            data.extend(new)
+            if new or updates:
+                write_json(self.path, data)
+                self.write_generation += 1
+            self.key_index.add((record_key(r), str(start + i)) for i, r in enumerate(new))
+            self.departure_index.apply(before, self.version(), new, updates.values())
+        return append_result(new, updates, skipped)
+
+    def compact(self) -> int:
+        """去除重复记录（保留每个键最早的一条）并重建索引，返回删除的条数"""
+        with file_lock(self.path):
+            data = read_json(self.path, [])
+            kept = dedupe_records(data)
+            if len(kept) != len(data):
+                write_json(self.path, kept)
+                self.write_generation += 1
+            self.key_index.rewrite((record_key(r), str(i)) for i, r in enumerate(kept))
+        return len(data) - len(kept)
+
+    def total_miles(self) -> int:
+        """累计里程"""
+        return sum(r['miles'] for r in self.load())
+
+
+class ShardedRecordStore:
+    """
+    按起飞年月分片的记录存储
+    目录结构: <root>/manifest.json, <root>/2024-01.json, <root>/2024-02.json ...
+    清单记录每个分片的文件名、记录数和里程，查询时据此只打开需要的分片
+    """
+
+    layout = 'sharded'
+
+    def __init__(self, root: str):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self.key_index = RecordKeyIndex(os.path.join(root, KEY_INDEX_FILE))
+        self.write_generation = 0
+        self.departure_index = DepartureIndex(self)
+
+    def init(self) -> bool:
+        """创建分片目录和空清单，返回是否新建"""
+        os.makedirs(self.root, exist_ok=True)
+        return create_json_if_missing(self.manifest_path, {'version': 1, 'shards': {}})
+
+    def version(self) -> Tuple:
+        """数据版本：每次写入分片后都会重写清单，因此只需检查清单文件"""
+        return self.write_generation, file_signature(self.manifest_path)
+
+    def shard_path(self, partition: str) -> str:
+        return os.path.join(self.root, f"{partition}.json")
+
+    def manifest(self) -> Dict:
+        return read_json(self.manifest_path, None) or {'version': 1, 'shards': {}}
+
+    def _cached_manifest(self) -> Dict:
+        """只读场景使用的清单（进程内缓存）"""
+        return read_json_cached(self.manifest_path, None) or {'version': 1, 'shards': {}}
+
+    def partitions(self, year: Optional[int] = None, month: Optional[int] = None) -> List[str]:
+        """返回与年/月匹配的分片名（按时间排序）"""
+        return sorted(p for p in self._cached_manifest()['shards'] if partition_matches(p, year, month))
+
+    @instrument('store_load')
+    def load(self, year: Optional[int] = None, month: Optional[int] = None) -> List[Dict]:
+        """
+        读取记录，只打开与年/月匹配的分片
+        :param year: 起飞年份（可选）
+        :param month: 起飞月份（可选）
+        """
+        records = []
+        for partition in self.partitions(year, month):
+            records.extend(read_json_cached(self.shard_path(partition), []))
+        return records
+
+    @instrument('store_query')
+    def query(self,
+              airline: Optional[str] = None,
+              cabin_class: Optional[str] = None,
+              limit: Optional[int] = None,
+              start=None,
+              end=None,
+              order_by: str = 'record_date') -> List[Dict]:
+        """按航司/舱位/起飞时间范围筛选，默认按记录时间倒序返回（参数含义见 query_departures）"""
+        if start or end or order_by != 'record_date':
+            return query_departures(self.departure_index, airline, cabin_class, limit, start, end, order_by)
+        return query_records(self.load(), airline, cabin_class, limit)
+
+    def _sync_key_index(self) -> Dict[str, str]:
+        """索引缺失或与清单中的记录总数不一致时，读取全部分片重建"""
+        if self.key_index.count() != self.count():
+            with file_lock(self.manifest_path):
+                shards = self.manifest()['shards']
+                if self.key_index.count() != sum(s['count'] for s in shards.values()):
+                    self.key_index.rewrite(
+                        (record_key(r), f"{partition}/{i}")
+                        for partition in sorted(shards)
+                        for i, r in enumerate(read_json(self.shard_path(partition), []))
+                    )
+        return self.key_index.refresh()
+
+    def contains(self, key: str) -> bool:
+        """是否已有该键的记录（O(1)，索引落后时先重建）"""
+        return key in self._sync_key_index()
+
+    @instrument('store_append')
+    def append(self, records: Iterable[Dict], on_duplicate: str = 'allow') -> Dict:
+        """
+        追加记录：按分片分组，只读写涉及的分片，最后更新清单和键索引
+        相同的键必然落在同一分片（键包含起飞时间），因此在分片锁内判重即可
+        :param on_duplicate: 键已存在时 'allow' 照常追加、'reject' 跳过、'upsert' 覆盖
+        :return: {'added', 'updated', 'skipped', 'written'（写入的记录）}
+        """
+        records = list(records)
+        self._sync_key_index()
+        partitions = sorted({departure_partition(r) for r in records})
+
+        # 按分片名顺序加锁并持有到清单更新完成，保证清单中的计数不会被并发写入覆盖为旧值
+        summaries, index_entries = {}, []
+        with ExitStack() as stack:
+            stack.enter_context(self.departure_index.lock)
+            for partition in partitions:
+                stack.enter_context(file_lock(self.shard_path(partition)))
+            new, updates, skipped = plan_append(records, self.key_index.refresh(), on_duplicate)
+
+            groups: Dict[str, List[Dict]] = {}
+            for record in new:
+                groups.setdefault(departure_partition(record), []).append(record)
+            replaced: Dict[str, Dict[int, Dict]] = {}
+            for position, record in updates.items():
+                partition, _, row = position.rpartition('/')
+                replaced.setdefault(partition, {})[int(row)] = record
+
+            for partition in sorted(set(groups) | set(replaced)):
+                path = self.shard_path(partition)
+                data = read_json(path, [])
+                for row, record in replaced.get(partition, {}).items():
+                    data[row] = record
+                start = len(data)
+                data.extend(groups.get(partition, []))
+                write_json(path, data)
+                index_entries.extend((record_key(r), f"{partition}/{start + i}")
+                                     for i, r in enumerate(groups.get(partition, [])))
+                summaries[partition] = {
+                    'file': f"{partition}.json",
+                    'count': len(data),
+                    'miles': sum(r['miles'] for r in data)
+                }
+
+            # 锁顺序：分片 -> 清单（清单锁同时保护键索引的追加）
+            if summaries:
+                with file_lock(self.manifest_path):
+                    # 清单锁内没有其他写入者，读到的版本与起飞时间索引一致时即可增量更新
+                    before = self.version()
+                    manifest = self.manifest()
+                    manifest['shards'].update(summaries)
+                    write_json(self.manifest_path, manifest)
+                    self.key_index.add(index_entries)
+                    self.write_generation += 1
+                    self.departure_index.apply(before, self.version(), new, updates.values())
+        return append_result(new, updates, skipped)
+
+    def compact(self) -> int:
+        """逐个分片去除重复记录（保留每个键最早的一条）并重建索引，返回删除的条数"""
+        removed = 0
+        for partition in self.partitions():
+            path = self.shard_path(partition)
+            with file_lock(path):
+                data = read_json(path, [])
+                kept = dedupe_records(data)
+                if len(kept) == len(data):
+                    continue
+                write_json(path, kept)
+                removed += len(data) - len(kept)
+                with file_lock(self.manifest_path):
+                    manifest = self.manifest()
+                    manifest['shards'][partition].update(count=len(kept), miles=sum(r['miles'] for r in kept))
+                    write_json(self.manifest_path, manifest)
+                    self.write_generation += 1
+        with file_lock(self.manifest_path):
+            shards = self.manifest()['shards']
+            self.key_index.rewrite(
+                (record_key(r), f"{partition}/{i}")
+                for partition in sorted(shards)
+                for i, r in enumerate(read_json(self.shard_path(partition), []))
+            )
+        return removed
+
+    def count(self, year: Optional[int] = None, month: Optional[int] = None) -> int:
+        """根据清单统计记录数（不读取分片）"""
+        shards = self._cached_manifest()['shards']
+        return sum(shards[p]['count'] for p in self.partitions(year, month))
+
+    def total_miles(self) -> int:
+        """根据清单统计累计里程（不读取分片）"""
+        return sum(shard['miles'] for shard in self._cached_manifest()['shards'].values())
+
+
+def dedupe_records(records: Iterable[Dict]) -> List[Dict]:
+    """去除重复键的记录，保留每个键最早出现的一条"""
+    seen = set()
+    kept = []
+    for record in records:
+        key = record_key(record)
+        if key not in seen:
+            seen.add(key)
+            kept.append(record)
+    return kept
+
+
+def create_record_store(layout: str, records_file: str, records_dir: str):
+    """
+    按布局名创建记录存储
+    :param layout: 'flat'、'sharded' 或 'binary'（数据文件为与 records_file 同名的 .bin）
+    """
+    if layout == FlatRecordStore.layout:
+        return FlatRecordStore(records_file)
+    if layout == ShardedRecordStore.layout:
+        return ShardedRecordStore(records_dir)
+    if layout == 'binary':
+        from record_binary import BinaryRecordStore
+        return BinaryRecordStore(os.path.splitext(records_file)[0] + '.bin')
+    raise ValueError(f"未知的记录存储布局: {layout}")
+
+
+def migrate_to_shards(flat_path: str, root: str) -> int:
+    """
+    将单文件记录迁移为分片布局（目标目录应为空）
+    :return: 迁移的记录数
+    """
+    store = ShardedRecordStore(root)
+    if os.path.exists(store.manifest_path) and store.manifest()['shards']:
+        raise ValueError(f"目标目录已有分片数据: {root}")
+    store.init()
+    records = read_json(flat_path, [])
+    store.append(records)
+    logger.info(f"已迁移 {len(records)} 条记录到 {root}")
+    return len(records)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'migrate':
+        count = migrate_to_shards(sys.argv[2], sys.argv[3])
+        print(f"✓ 已迁移 {count} 条记录到 {sys.argv[3]}")
+    elif 3 <= len(sys.argv) <= 5 and sys.argv[1] == 'dedupe':
+        store = create_record_store(
+            sys.argv[2],
+            sys.argv[3] if len(sys.argv) > 3 else 'flight_records.json',
+            sys.argv[4] if len(sys.argv) > 4 else 'flight_records'
+        )
+        print(f"✓ 已删除 {store.compact()} 条重复记录（{store.layout}）")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多用户 FlightAssistant 池
+每个用户的数据（飞行记录、成就、价格提醒、行程卡）保存在数据根目录下独立的分区中：
+    <data_root>/<用户ID哈希前两位>/<用户ID>/
+进程内只保留最近使用的 max_open 个用户的 FlightAssistant（含各自的存储和缓存），
+超出上限或空闲超时的用户被淘汰，下次访问时再从磁盘打开，内存占用与活跃用户数无关
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from flight_assistant import FlightAssistant
+from price_detector import DropDetectorConfig
+
+logger = logging.getLogger(__name__)
+
+USER_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.@-]{0,127}$')
+
+
+class TenantPool:
+    """按用户ID取得 FlightAssistant，按最近使用淘汰"""
+
+    def __init__(self,
+                 data_root: str,
+                 max_open: int = 1024,
+                 idle_seconds: Optional[float] = None,
+                 records_layout: Optional[str] = None,
+                 detector_config: Optional[DropDetectorConfig] = None):
+        """
+        :param data_root: 数据根目录
+        :param max_open: 同时保持打开的用户数上限
+        :param idle_seconds: 空闲超过该时长的用户在下次访问池时被淘汰（可选）
+        :param records_layout: 飞行记录存储布局，同 FlightAssistant
+        :param detector_config: 价格下跌检测配置，所有用户共用
+        """
+        self.data_root = data_root
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.records_layout = records_layout
+        self.detector_config = detector_config
+        # 用户ID -> (FlightAssistant, 最近访问时间)
+        self._open: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._opening: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(data_root, exist_ok=True)
+
+    def user_dir(self, user_id: str) -> str:
+        """用户的数据目录（按ID哈希分散到子目录，避免单个目录下文件过多）"""
+        if not USER_ID_PATTERN.match(user_id):
+            raise ValueError(f"非法的用户ID: {user_id!r}")
+        bucket = hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:2]
+        return os.path.join(self.data_root, bucket, user_id)
+
+    def get(self, user_id: str) -> FlightAssistant:
+        """取得用户的 FlightAssistant，未打开时从其数据目录创建（非法的用户ID抛出 ValueError）"""
+        user_dir = self.user_dir(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._open.get(user_id)
+            if entry is not None:
+                self._open[user_id] = (entry[0], now)
+                self._open.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            # 同一用户的并发首次访问只创建一次
+            opening = self._opening.setdefault(user_id, threading.Lock())
+
+        with opening:
+            try:
+                with self._lock:
+                    entry = self._open.get(user_id)
+                    if entry is not None:
+                        self.hits += 1
+                        return entry[0]
+                assistant = FlightAssistant(
+                    detector_config=self.detector_config,
+                    records_layout=self.records_layout,
+                    data_dir=user_dir
+                )
+                with self._lock:
+                    self.misses += 1
+                    self._open[user_id] = (assistant, now)
+                    evicted = self._evict(now)
+            finally:
+                # 打开失败时同样移除，避免为每个失败的用户ID残留一把锁
+                with self._lock:
+                    if self._opening.get(user_id) is opening:
+                        del self._opening[user_id]
+            self._close_all(evicted)
+            return assistant
+
+    def _evict(self, now: float) -> List[FlightAssistant]:
+        """
+        从池中移除超出容量或空闲超时的用户（调用方持有 self._lock）
+        :return: 被移除的 FlightAssistant，由调用方在释放锁后关闭
+        """
+        evicted = []
+        while len(self._open) > self.max_open:
+            user_id, (assistant, _) = self._open.popitem(last=False)
+            evicted.append(assistant)
+            logger.debug(f"淘汰用户: {user_id}")
+        if self.idle_seconds is not None:
+            while self._open:
+                user_id, (assistant, last_used) = next(iter(self._open.items()))
+                if now - last_used < self.idle_seconds:
+                    break
+                self._open.popitem(last=False)
+                evicted.append(assistant)
+                logger.debug(f"淘汰空闲用户: {user_id}")
+        self.evictions += len(evicted)
+        return evicted
+
+    @staticmethod
+    def _close_all(assistants: List[FlightAssistant]):
+        """
+        关闭被淘汰的用户。其他线程可能仍在使用刚取得的实例：关闭只停止行程卡渲染线程和连接池，
+        之后提交的渲染任务只写入日志（下次打开该用户时执行），HTTP会话按需重建，数据写入不受影响
+        """
+        for assistant in assistants:
+            assistant.close()
+
+    def evict_idle(self) -> int:
+        """立即淘汰空闲超时的用户，返回淘汰数"""
+        with self._lock:
+            evicted = self._evict(time.monotonic())
+        self._close_all(evicted)
+        return len(evicted)
+
+    def close(self, user_id: str) -> bool:
+        """关闭单个用户（如删除账号前）"""
+        with self._lock:
+            entry = self._open.pop(user_id, None)
+        if entry is None:
+            return False
+        entry[0].close()
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'open': len(self._open),
+                'max_open': self.max_open,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
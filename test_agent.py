@@ -1,25 +1,188 @@
 # 极简版 Flight Agent 本地测试脚本
+#
+# 用法:
+#   python test_agent.py                                  交互式对话
+#   python test_agent.py --serve --port 8766              本地 socket 服务（每行一个JSON请求）
+#   python test_agent.py --batch questions.jsonl -o answers.jsonl
+#
+# 请求/响应格式（socket 与 JSONL 相同）:
+#   {"session_id": "u1", "question": "MU5101延误了吗"}
+#   {"session_id": "u1", "question": "MU5101延误了吗", "answer": "..."}
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict, deque
+
+from intent_index import IntentIndex
+
+# 意图表（关键词、优先级、回复模板），可扩展到成千上万条意图
+INTENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.json")
+
+# 意图表不存在时使用的内置回复
+DEFAULT_INTENTS = {
+    "default_response": "你可以问我航班状态、行程规划或机场相关问题~",
+    "intents": [
+        {"name": "ca1501_status", "keywords": ["CA1501状态"],
+         "response": "CA1501 今日准点起飞，北京首都机场 T3 → 上海虹桥机场 T2"},
+        {"name": "tianjin_guangzhou_flights", "keywords": ["天津飞广州航班"],
+         "response": "下周五天津→广州有国航CA3302、南航CZ3121，经济舱最低650元"},
+        {"name": "lost_baggage", "keywords": ["行李丢失怎么办"],
+         "response": "联系机场行李服务中心，提供行李牌、身份证和航班信息登记挂失"},
+    ]
+}
+
+RESPONSE_CACHE_SIZE = 4096   # 回复缓存条数（按最近使用淘汰）
+MAX_SESSIONS = 10000         # 同时保留上下文的会话数
+SESSION_HISTORY = 20         # 每个会话保留的问答轮数
+
+_index_cache = {}
+
+
+def load_intent_index(intents_file=INTENTS_FILE):
+    """构建意图索引（同一意图表在进程内只构建一次）"""
+    if intents_file not in _index_cache:
+        if os.path.exists(intents_file):
+            _index_cache[intents_file] = IntentIndex.from_file(intents_file)
+        else:
+            _index_cache[intents_file] = IntentIndex(DEFAULT_INTENTS)
+    return _index_cache[intents_file]
+
+
 class FlightAssistant:
-    def answer(self, question):
+    def __init__(self, intents_file=INTENTS_FILE, cache_size=RESPONSE_CACHE_SIZE, max_sessions=MAX_SESSIONS):
+        self.index = load_intent_index(intents_file)
+        self.cache_size = cache_size
+        self.max_sessions = max_sessions
+        self._cache = OrderedDict()      # (问题, 上下文槽位) -> (回复, 槽位)
+        self._sessions = OrderedDict()   # 会话ID -> {"slots": 槽位, "history": 最近问答}
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _session(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = {"slots": {}, "history": deque(maxlen=SESSION_HISTORY)}
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def answer(self, question, session_id=None):
         # 这里可以替换成你的智能体核心逻辑
-        basic_responses = {
-            "CA1501状态": "CA1501 今日准点起飞，北京首都机场 T3 → 上海虹桥机场 T2",
-            "天津飞广州航班": "下周五天津→广州有国航CA3302、南航CZ3121，经济舱最低650元",
-            "行李丢失怎么办": "联系机场行李服务中心，提供行李牌、身份证和航班信息登记挂失"
-        }
-        # 匹配问题关键词返回结果，无匹配则默认回复
-        for key in basic_responses:
-            if key in question:
-                return basic_responses[key]
-        return "你可以问我航班状态、行程规划或机场相关问题~"
+        # 一次扫描匹配全部关键词，按优先级返回结果，无匹配则默认回复
+        # 传入 session_id 时沿用该会话之前提到的航班号、城市等槽位
+        with self._lock:
+            session = self._session(session_id) if session_id is not None else None
+            context = session["slots"] if session else {}
+            key = (question, tuple(sorted(context.items())))
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        if cached is None:
+            match = self.index.match(question, context)
+            cached = (match.response, match.slots) if match else (self.index.default_response, context)
+            with self._lock:
+                self._cache[key] = cached
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        response, slots = cached
+        if session is not None:
+            with self._lock:
+                session["slots"] = dict(slots)
+                session["history"].append((question, response))
+        return response
 
-# 对话入口
-if __name__ == "__main__":
-    agent = FlightAssistant()
+    def answer_many(self, questions, session_id=None):
+        """批量回答；questions 为问题列表，或 (session_id, question) 元组列表"""
+        answers = []
+        for item in questions:
+            if isinstance(item, tuple):
+                answers.append(self.answer(item[1], session_id=item[0]))
+            else:
+                answers.append(self.answer(item, session_id=session_id))
+        return answers
+
+    def history(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return list(session["history"]) if session else []
+
+
+async def handle_client(agent, reader, writer):
+    """处理一个 socket 连接：每行一个JSON请求，按行返回JSON响应"""
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                reply = dict(request, answer=agent.answer(request["question"], request.get("session_id")))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                reply = {"error": "请求格式应为 {\"session_id\": ..., \"question\": ...}"}
+            writer.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+    except ConnectionResetError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(agent, host, port):
+    server = await asyncio.start_server(lambda r, w: handle_client(agent, r, w), host, port)
+    print(f"✈️  航班助手服务已启动: {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def run_batch(agent, input_path, output_path=None):
+    """批量模式：读取JSONL问题文件，输出带 answer 字段的JSONL"""
+    with open(input_path, "r", encoding="utf-8") as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+    answers = agent.answer_many([(r.get("session_id"), r["question"]) for r in requests])
+    out = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+    try:
+        for request, answer in zip(requests, answers):
+            out.write(json.dumps(dict(request, answer=answer), ensure_ascii=False) + "\n")
+    finally:
+        if output_path:
+            out.close()
+
+
+def chat(agent):
     print("✈️  航班助手已启动（输入 exit 退出）")
     while True:
         user_q = input("你：")
         if user_q.lower() == "exit":
             print("助手：再见啦~")
             break
-        print("助手：", agent.answer(user_q))
+        print("助手：", agent.answer(user_q, session_id="local"))
+
+# 对话入口
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="航班助手本地测试")
+    parser.add_argument("--serve", action="store_true", help="以 socket 服务方式运行")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--batch", help="批量回答JSONL文件中的问题")
+    parser.add_argument("-o", "--output", help="批量模式的输出文件（默认标准输出）")
+    args = parser.parse_args()
+
+    agent = FlightAssistant()
+    if args.batch:
+        run_batch(agent, args.batch, args.output)
+    elif args.serve:
+        try:
+            asyncio.run(serve(agent, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        chat(agent)
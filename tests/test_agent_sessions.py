@@ -0,0 +1,71 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import test_agent
+
+
+@pytest.fixture
+def agent():
+    return test_agent.FlightAssistant()
+
+
+def test_session_context_carries_over(agent):
+    assert agent.answer('MU5101延误了吗', session_id='u1') == '正在为你查询 MU5101 的实时状态，请稍候~'
+    assert agent.answer('登机口在哪', session_id='u1') == '正在为你查询 MU5101 的实时状态，请稍候~'
+    # 其他会话没有上下文
+    assert agent.answer('登机口在哪', session_id='u2') == '你可以问我航班状态、行程规划或机场相关问题~'
+    assert [q for q, _ in agent.history('u1')] == ['MU5101延误了吗', '登机口在哪']
+    assert agent.history('missing') == []
+
+
+def test_concurrent_sessions_keep_separate_context(agent):
+    flights = [f'CA{1000 + i}' for i in range(32)]
+
+    def run(flight):
+        session_id = f's-{flight}'
+        agent.answer(f'{flight}延误了吗', session_id=session_id)
+        replies = [agent.answer('几点起飞', session_id=session_id) for _ in range(20)]
+        return flight, replies, agent.history(session_id)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(run, flights))
+
+    for flight, replies, history in results:
+        assert all(flight in reply for reply in replies)
+        assert len(history) == test_agent.SESSION_HISTORY
+        assert all(flight in answer for _, answer in history)
+
+
+def test_answer_many_accepts_plain_and_session_items(agent):
+    answers = agent.answer_many([('u1', 'CZ3121状态'), ('u1', '延误了吗'), '行李丢失怎么办'])
+
+    assert answers == [
+        '正在为你查询 CZ3121 的实时状态，请稍候~',
+        '正在为你查询 CZ3121 的实时状态，请稍候~',
+        '联系机场行李服务中心，提供行李牌、身份证和航班信息登记挂失',
+    ]
+    assert agent.answer_many(['延误了吗'], session_id='u1') == ['正在为你查询 CZ3121 的实时状态，请稍候~']
+
+
+def test_run_batch_writes_answers_jsonl(agent, tmp_path):
+    input_path = tmp_path / 'questions.jsonl'
+    output_path = tmp_path / 'answers.jsonl'
+    requests = [
+        {'session_id': 'u1', 'question': 'MU5101延误了吗'},
+        {'session_id': 'u1', 'question': '几点起飞'},
+        {'question': 'CA1501状态'},
+    ]
+    input_path.write_text('\n'.join(json.dumps(r, ensure_ascii=False) for r in requests) + '\n\n',
+                          encoding='utf-8')
+
+    test_agent.run_batch(agent, str(input_path), str(output_path))
+
+    lines = [json.loads(line) for line in output_path.read_text(encoding='utf-8').splitlines()]
+    assert [{k: v for k, v in line.items() if k != 'answer'} for line in lines] == requests
+    assert [line['answer'] for line in lines] == [
+        '正在为你查询 MU5101 的实时状态，请稍候~',
+        '正在为你查询 MU5101 的实时状态，请稍候~',
+        'CA1501 今日准点起飞，北京首都机场 T3 → 上海虹桥机场 T2',
+    ]
@@ -0,0 +1,50 @@
+import pytest
+
+import airports
+from flight_assistant import FlightAssistant
+
+
+@pytest.fixture
+def assistant(tmp_path):
+    assistant = FlightAssistant(data_dir=str(tmp_path), card_workers=0)
+    yield assistant
+    assistant.close()
+
+
+@pytest.mark.parametrize('departure, arrival', [('PEK', 'SHA'), ('SHA', 'CTU'), ('CTU', 'PEK')])
+def test_mainland_routes_are_domestic(departure, arrival):
+    assert not airports.is_international(departure, arrival)
+
+
+@pytest.mark.parametrize('departure, arrival', [('PEK', 'NRT'), ('LHR', 'SHA'), ('CTU', 'HKG')])
+def test_routes_leaving_domestic_countries_are_international(departure, arrival):
+    assert airports.is_international(departure, arrival)
+
+
+def test_domestic_countries_can_be_widened():
+    assert not airports.is_international('PEK', 'HKG', domestic_countries=('CN', 'HK'))
+
+
+def test_unknown_codes_fall_back_to_z_prefix_rule():
+    assert airports.airport_country('ZZZ') is None
+    assert not airports.is_international('ZZZ', 'PEK')
+    assert airports.is_international('XXX', 'PEK')
+    assert airports.flight_distance('XXX', 'PEK') is None
+
+
+def test_flight_distance():
+    assert airports.flight_distance('PEK', 'PEK') == 0
+    assert airports.flight_distance('PEK', 'SHA') == airports.flight_distance('SHA', 'PEK')
+    # 北京首都 - 上海虹桥约 1080 公里
+    assert 1050 <= airports.flight_distance('PEK', 'SHA', unit='km') <= 1110
+
+
+def test_add_flight_record_fills_in_miles(assistant):
+    added = assistant.add_flight_record('CA1501', 'PEK', 'SHA', '2024-03-01T08:00:00',
+                                        '2024-03-01T10:00:00', 'CA', 'economy')
+    unknown = assistant.add_flight_record('CA9999', 'PEK', 'XXX', '2024-03-02T08:00:00',
+                                          '2024-03-02T10:00:00', 'CA', 'economy')
+
+    assert added and not unknown
+    [record] = assistant.records_store.load()
+    assert record['miles'] == airports.flight_distance('PEK', 'SHA')
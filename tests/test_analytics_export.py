@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from analytics_export import run_export
+from record_store import create_record_store
+
+
+def make_record(flight_number='CA1501', departure_time='2024-03-01T08:00:00', **fields):
+    record = {
+        'flight_number': flight_number,
+        'departure_airport': 'PEK',
+        'arrival_airport': 'SHA',
+        'departure_time': departure_time,
+        'arrival_time': '2024-03-01T10:00:00',
+        'airline': 'CA',
+        'cabin_class': 'economy',
+        'miles': 700,
+        'record_date': '2024-03-01T12:00:00',
+    }
+    record.update(fields)
+    return record
+
+
+@pytest.fixture(params=['flat', 'sharded', 'binary'])
+def store(request, tmp_path):
+    store = create_record_store(request.param, str(tmp_path / 'flight_records.json'), str(tmp_path / 'records'))
+    store.init()
+    return store
+
+
+def test_second_run_exports_nothing(store, tmp_path):
+    alerts = tmp_path / 'price_alerts.json'
+    alerts.write_text(json.dumps([{'route_key': 'PEK-SHA-2024-03-01', 'timestamp': '2024-02-01T00:00:00',
+                                   'current_price': 800}]), encoding='utf-8')
+    store.append([make_record(), make_record('MU5101', '2024-04-01T09:00:00')])
+    output = str(tmp_path / 'analytics')
+
+    assert run_export(store, str(alerts), output) == {'records': 2, 'prices': 1}
+    assert run_export(store, str(alerts), output) == {'records': 0, 'prices': 0}
+
+    store.append([make_record('CZ3121', '2024-05-01T09:00:00')])
+    assert run_export(store, str(alerts), output) == {'records': 1, 'prices': 0}
+    assert sorted(os.listdir(os.path.join(output, 'flight_records'))) == ['part-00001.parquet', 'part-00002.parquet']
+
+
+def test_duplicate_keys_are_exported_once(tmp_path):
+    path = tmp_path / 'flight_records.json'
+    first = make_record()
+    second = make_record(record_date='2024-03-02T12:00:00')
+    path.write_text(json.dumps([first, second, first]), encoding='utf-8')
+    store = create_record_store('flat', str(path), str(tmp_path / 'records'))
+    output = str(tmp_path / 'analytics')
+
+    assert run_export(store, str(tmp_path / 'missing.json'), output)['records'] == 3
+    assert run_export(store, str(tmp_path / 'missing.json'), output)['records'] == 0
+
+    # 数据文件变化（需要重新扫描）但行未变
+    path.write_text(json.dumps([second, first, first], indent=2), encoding='utf-8')
+    assert run_export(store, str(tmp_path / 'missing.json'), output)['records'] == 0
+
+
+def test_upsert_exports_new_version(tmp_path):
+    store = create_record_store('flat', str(tmp_path / 'flight_records.json'), str(tmp_path / 'records'))
+    store.init()
+    output = str(tmp_path / 'analytics')
+    store.append([make_record()])
+    run_export(store, str(tmp_path / 'missing.json'), output)
+
+    store.append([make_record(miles=900)], on_duplicate='upsert')
+    assert run_export(store, str(tmp_path / 'missing.json'), output)['records'] == 1
+    assert run_export(store, str(tmp_path / 'missing.json'), output)['records'] == 0
@@ -0,0 +1,98 @@
+import json
+import threading
+
+from card_queue import CardQueue
+from record_store import record_key
+
+
+def make_record(flight_number='CA1501'):
+    return {
+        'flight_number': flight_number,
+        'departure_airport': 'PEK',
+        'arrival_airport': 'SHA',
+        'departure_time': '2024-03-01T08:00:00',
+        'arrival_time': '2024-03-01T10:00:00',
+        'airline': 'CA',
+        'cabin_class': 'economy',
+        'miles': 700,
+        'record_date': '2024-03-01T12:00:00',
+    }
+
+
+def test_unfinished_jobs_are_resubmitted(tmp_path):
+    journal = tmp_path / 'card_jobs.jsonl'
+    done, pending = make_record('CA1501'), make_record('MU5101')
+    card = tmp_path / 'CA1501.png'
+    card.write_bytes(b'png')
+    journal.write_text(
+        json.dumps({'op': 'enqueue', 'key': record_key(done), 'record': done}) + '\n'
+        + json.dumps({'op': 'enqueue', 'key': record_key(pending), 'record': pending}) + '\n'
+        + json.dumps({'op': 'done', 'key': record_key(done), 'path': str(card)}) + '\n'
+        + '{"op": "enq',  # 写了一半的最后一行
+        encoding='utf-8'
+    )
+    rendered = []
+
+    def render(record):
+        rendered.append(record['flight_number'])
+        return str(tmp_path / f"{record['flight_number']}.png")
+
+    queue = CardQueue(render, str(journal), max_workers=1)
+    assert queue.get_card(record_key(pending), timeout=5) == str(tmp_path / 'MU5101.png')
+    assert queue.get_card(record_key(done)) == str(card)
+    queue.close()
+    assert rendered == ['MU5101']
+
+    # 压缩后的日志只保留每个键的最新状态
+    ops = [json.loads(line)['op'] for line in journal.read_text(encoding='utf-8').splitlines()]
+    assert ops.count('enqueue') == 1
+
+
+def test_get_card_returns_none_for_cancelled_job(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def render(record):
+        started.set()
+        release.wait(5)
+        return str(tmp_path / f"{record['flight_number']}.png")
+
+    queue = CardQueue(render, str(tmp_path / 'card_jobs.jsonl'), max_workers=1)
+    queue.submit(make_record('CA1501'))
+    started.wait(5)
+    queued = make_record('MU5101')
+    queue.submit(queued)
+    queue.close(wait=False)
+    release.set()
+
+    assert queue.get_card(record_key(queued), timeout=5) is None
+
+
+def test_replacing_a_key_never_renders_it_twice_at_once(tmp_path):
+    started, release = threading.Event(), threading.Event()
+    active, overlaps, rendered = [], [], []
+    lock = threading.Lock()
+
+    def render(record):
+        with lock:
+            active.append(record['miles'])
+            if len(active) > 1:
+                overlaps.append(list(active))
+        if record['miles'] == 700:
+            started.set()
+            release.wait(5)
+        with lock:
+            active.remove(record['miles'])
+            rendered.append(record['miles'])
+        return str(tmp_path / f"{record['miles']}.png")
+
+    queue = CardQueue(render, str(tmp_path / 'card_jobs.jsonl'), max_workers=4)
+    queue.submit(make_record())
+    started.wait(5)
+    queue.submit(dict(make_record(), miles=800), replace=True)   # 旧任务正在渲染：等待其结束
+    queue.submit(dict(make_record(), miles=900), replace=True)   # 800 尚未开始：直接取消
+    release.set()
+
+    assert queue.get_card(record_key(make_record()), timeout=5) == str(tmp_path / '900.png')
+    queue.close()
+    assert overlaps == []
+    assert rendered == [700, 900]
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+
+import pytest
+
+import deploy
+from deploy import deploy_manifest, make_stub_server
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        server = make_stub_server(0, verbose=False, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    (tmp_path / 'monitor.yml').write_text('app: monitor\n', encoding='utf-8')
+    (tmp_path / 'assistant.yml').write_text('app: assistant\n', encoding='utf-8')
+    path = tmp_path / 'deploy_manifest.json'
+    path.write_text(json.dumps({'apps': [
+        {'dsl': 'monitor.yml', 'app_id': 'app-monitor'},
+        {'dsl': 'assistant.yml', 'app_id': 'app-assistant'},
+    ]}), encoding='utf-8')
+    return path
+
+
+def test_manifest_upload_and_idempotent_redeploy(stub, manifest, tmp_path):
+    server, api_base = stub()
+    state = str(tmp_path / 'state.json')
+
+    assert deploy_manifest(str(manifest), 'key', api_base, state, workers=2) == (2, 0, 0)
+    uploaded = {app_id: json.loads(body)['yaml_content'] for app_id, status, body in server.requests}
+    assert uploaded == {'app-monitor': 'app: monitor\n', 'app-assistant': 'app: assistant\n'}
+
+    # 内容未变：不再请求接口
+    assert deploy_manifest(str(manifest), 'key', api_base, state, workers=2) == (0, 0, 2)
+    assert len(server.requests) == 2
+
+    (tmp_path / 'monitor.yml').write_text('app: monitor v2\n', encoding='utf-8')
+    assert deploy_manifest(str(manifest), 'key', api_base, state, workers=2) == (1, 0, 1)
+    assert server.requests[-1][0] == 'app-monitor'
+
+
+def test_retry_on_unavailable(stub, manifest, tmp_path):
+    server, api_base = stub(fail_first=2)
+
+    result = deploy_manifest(str(manifest), 'key', api_base, str(tmp_path / 'state.json'), workers=1)
+
+    assert result == (2, 0, 0)
+    assert [status for _, status, _ in server.requests] == [503, 503, 200, 200]
+
+
+def test_missing_dsl_file_is_reported_as_failed(stub, manifest, tmp_path, capsys):
+    server, api_base = stub()
+    (tmp_path / 'assistant.yml').unlink()
+    state = tmp_path / 'state.json'
+
+    assert deploy_manifest(str(manifest), 'key', api_base, str(state), workers=2) == (1, 1, 0)
+    assert '✗ app-assistant' in capsys.readouterr().out
+    assert list(json.loads(state.read_text(encoding='utf-8'))) == ['app-monitor']
+
+
+def run_main(monkeypatch, tmp_path, *argv, **env):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr('sys.argv', ['deploy.py', *argv])
+    for name in ('DIFY_API_KEY', 'DIFY_APP_ID', 'DIFY_API_BASE', 'DIFY_DEPLOY_MANIFEST'):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    with pytest.raises(SystemExit) as exc:
+        deploy.main()
+    return exc.value.code
+
+
+def test_single_app_failure_exits_nonzero(stub, monkeypatch, tmp_path):
+    server, api_base = stub()
+
+    # 路径不匹配时桩服务返回 404（不重试）
+    assert run_main(monkeypatch, tmp_path, DIFY_API_KEY='key', DIFY_APP_ID='app',
+                    DIFY_API_BASE=api_base.replace('/v1', '/v0')) == 1
+    assert server.requests == [(None, 404, b'')]
+    assert run_main(monkeypatch, tmp_path, DIFY_API_KEY='key') == 1
+
+
+def test_manifest_failure_exits_nonzero(stub, manifest, monkeypatch, tmp_path):
+    (tmp_path / 'assistant.yml').unlink()
+    server, api_base = stub()
+
+    assert run_main(monkeypatch, tmp_path, '--manifest', str(manifest),
+                    DIFY_API_KEY='key', DIFY_API_BASE=api_base) == 1
+    assert [app_id for app_id, _, _ in server.requests] == ['app-monitor']
+    assert run_main(monkeypatch, tmp_path, '--manifest', str(manifest)) == 1
+
+
+def test_example_manifest_resolves_app_ids_from_env(monkeypatch):
+    monkeypatch.setenv('DIFY_PRICE_MONITOR_APP_ID', 'app-monitor')
+    monkeypatch.setenv('DIFY_FLIGHT_ASSISTANT_APP_ID', 'app-assistant')
+    path = os.path.join(os.path.dirname(deploy.__file__), 'deploy_manifest.example.json')
+
+    apps = deploy.load_manifest(path)
+
+    assert [app_id for _, app_id in apps] == ['app-monitor', 'app-assistant']
+    assert all(os.path.isfile(dsl_path) for dsl_path, _ in apps)
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip('yaml')
+
+import dsl_index
+
+WORKFLOW = '''app:
+  name: 价格监控
+  mode: workflow
+workflow:
+  graph:
+    nodes:
+      - data:
+          type: code
+          code: "from main import monitor_flight_price"
+          variables:
+            - variable: departure
+'''
+
+
+def test_non_mapping_documents_are_reported_per_file(tmp_path):
+    (tmp_path / 'ok.yml').write_text(WORKFLOW, encoding='utf-8')
+    (tmp_path / 'list.yml').write_text('- a\n- b\n', encoding='utf-8')
+    (tmp_path / 'scalar.yml').write_text('just text\n', encoding='utf-8')
+    (tmp_path / 'broken.yml').write_text('app: [\n', encoding='utf-8')
+
+    index = dsl_index.build_index(str(tmp_path), str(tmp_path / 'index.json'), max_workers=2)
+
+    files = index['files']
+    assert 'list' in files['list.yml']['error'] and 'str' in files['scalar.yml']['error']
+    assert 'error' in files['broken.yml']
+    assert 'error' not in files['ok.yml']
+    assert dsl_index.query(index, node_type='code', module='main.monitor_flight_price',
+                           variable='departure') == ['ok.yml']
+
+
+def test_empty_document_has_no_nodes(tmp_path):
+    path = tmp_path / 'empty.yml'
+    path.write_text('', encoding='utf-8')
+
+    entry = dsl_index.parse_dsl(str(path))
+
+    assert 'error' not in entry and entry['node_types'] == {}
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+
+import pytest
+
+import flight_assistant
+from flight_assistant import FlightAssistant
+
+
+def make_record(flight_number='CA1501', departure_time='2024-03-01T08:00:00', **fields):
+    record = {
+        'flight_number': flight_number,
+        'departure_airport': 'PEK',
+        'arrival_airport': 'SHA',
+        'departure_time': departure_time,
+        'arrival_time': '2024-03-01T10:00:00',
+        'airline': 'CA',
+        'cabin_class': 'economy',
+        'miles': 700,
+        'record_date': '2024-03-01T12:00:00',
+    }
+    record.update(fields)
+    return record
+
+
+@pytest.fixture
+def assistant(tmp_path):
+    assistant = FlightAssistant(data_dir=str(tmp_path), card_workers=0)
+    yield assistant
+    assistant.close()
+
+
+def test_card_filenames_are_unique_per_record(assistant):
+    pytest.importorskip('qrcode')
+    first = assistant.generate_itinerary_card(make_record())
+    second = assistant.generate_itinerary_card(make_record(departure_time='2024-03-02T08:00:00'))
+    unsafe = assistant.generate_itinerary_card(make_record(flight_number='../CA1501'))
+
+    assert first and second and unsafe
+    assert first != second
+    assert assistant.generate_itinerary_card(make_record()) == first
+    for path in (first, second, unsafe):
+        assert os.path.dirname(path) == assistant.flight_cards_dir
+
+
+def test_skipped_records_are_not_rendered(tmp_path):
+    assistant = FlightAssistant(data_dir=str(tmp_path), card_workers=1)
+    rendered = []
+    assistant.card_queue.render = lambda record: rendered.append(record) or f"{record['flight_number']}.png"
+
+    assert assistant.add_flight_record('CA1501', 'PEK', 'SHA', '2024-03-01T08:00:00',
+                                       '2024-03-01T10:00:00', 'CA', 'economy')
+    assistant.get_card('CA1501_2024-03-01T08:00:00_PEK', timeout=5)
+    flights = [
+        dict(make_record(cabin_class='business'), miles=None),
+        make_record('MU5101', '2024-04-01T09:00:00'),
+    ]
+    for flight in flights:
+        flight.pop('record_date')
+    result = assistant.add_flight_records(flights, on_duplicate='reject')
+    assistant.get_card('MU5101_2024-04-01T09:00:00_PEK', timeout=5)
+    assistant.close()
+
+    assert result == {'added': 1, 'updated': 0, 'skipped': 1, 'invalid': 0}
+    assert [(r['flight_number'], r['cabin_class']) for r in rendered] == [('CA1501', 'economy'),
+                                                                          ('MU5101', 'economy')]
+
+
+def test_price_cache_is_bounded_and_drops_expired(assistant, monkeypatch):
+    monkeypatch.setattr(flight_assistant, 'PRICE_CACHE_SIZE', 3)
+    assistant._price_cache[('PEK', 'SHA', '2024-01-01')] = (time.time() - 2 * 86400, {'min_price': 1})
+
+    for day in range(1, 6):
+        assistant._cache_price(('PEK', 'CAN', f'2024-03-0{day}'), {'min_price': day})
+
+    assert list(assistant._price_cache) == [('PEK', 'CAN', f'2024-03-0{day}') for day in (3, 4, 5)]
+    assert assistant._get_cached_price('PEK', 'CAN', '2024-03-03') == {'min_price': 3}
+    assistant._cache_price(('PEK', 'CAN', '2024-03-06'), {'min_price': 6})
+    assert ('PEK', 'CAN', '2024-03-03') in assistant._price_cache
+    assert ('PEK', 'CAN', '2024-03-04') not in assistant._price_cache
+
+
+def test_http_session_is_created_once(assistant):
+    pytest.importorskip('requests')
+    barrier = threading.Barrier(8)
+    sessions = []
+
+    def worker():
+        barrier.wait()
+        sessions.append(assistant._http_session())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(s) for s in sessions}) == 1
+
+
+def test_monitor_routes_reports_bad_routes_individually(assistant, monkeypatch):
+    monkeypatch.setattr(assistant, 'check_flight_price', lambda *route: {'min_price': 800})
+    routes = [
+        ('PEK', 'SHA', '2024-03-01'),
+        {'departure': 'PEK', 'arrival': 'CAN'},
+        ('PEK', 'SHA'),
+        None,
+        {'departure': 'SHA', 'arrival': 'PEK', 'travel_date': '2024-03-05'},
+    ]
+
+    summaries = assistant.monitor_routes(routes)
+
+    assert [s['success'] for s in summaries] == [True, False, False, False, True]
+    assert all('路线格式错误' in s['error'] for s in summaries[1:4])
+    assert [s['price'] for s in summaries if s['success']] == [800, 800]
+
+
+def test_zero_price_is_not_recorded(assistant, monkeypatch):
+    prices = iter([{'min_price': 800}, {'min_price': 0}])
+    monkeypatch.setattr(assistant, 'check_flight_price', lambda *route: next(prices))
+
+    assert assistant.monitor_routes([('PEK', 'SHA', '2024-03-01')])[0]['success']
+    summary = assistant.monitor_routes([('PEK', 'SHA', '2024-03-01')])[0]
+
+    assert not summary['success'] and '价格无效' in summary['error']
+    alerts = assistant._load_json(assistant.price_alerts_file)
+    assert [a['current_price'] for a in alerts] == [800]
+
+
+@pytest.mark.parametrize('layout', ['flat', 'sharded', 'binary'])
+def test_statistics_cache_follows_writes(tmp_path, layout):
+    assistant = FlightAssistant(data_dir=str(tmp_path), records_layout=layout, card_workers=0)
+    assistant.add_flight_record('CA1501', 'PEK', 'SHA', '2024-03-01T08:00:00',
+                                '2024-03-01T10:00:00', 'CA', 'economy')
+    stats = assistant.get_flight_statistics(year=2024, month=3)
+    assert stats['total_flights'] == 1
+
+    stats['airline_preference']['CA'] = 99
+    assert assistant.get_flight_statistics(year=2024, month=3)['airline_preference'] == {'CA': 1}
+
+    assistant.add_flight_record('MU5101', 'SHA', 'PEK', '2024-03-02T08:00:00',
+                                '2024-03-02T10:00:00', 'MU', 'economy')
+    assert assistant.get_flight_statistics(year=2024, month=3)['total_flights'] == 2
+    assistant.close()
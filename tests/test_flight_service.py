@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+from flight_assistant import FlightAssistant
+from flight_service import FlightService, HTTPError
+
+
+@pytest.fixture
+def service(tmp_path):
+    assistant = FlightAssistant(data_dir=str(tmp_path), card_workers=0)
+    service = FlightService(assistant=assistant, max_workers=1, max_body_bytes=64)
+    yield service
+    service.executor.shutdown()
+    assistant.close()
+
+
+@pytest.mark.parametrize('flight_number', ['../../etc/passwd', 'CA/1501', '..', '', 'CA 1501', 1501])
+def test_card_rejects_unsafe_flight_number(service, flight_number):
+    with pytest.raises(HTTPError) as excinfo:
+        service.card({}, {'flight_number': flight_number})
+    assert excinfo.value.status == 400
+
+
+def test_records_route_returns_copies(service):
+    assistant = service.assistant
+    assert assistant.add_flight_record('CA1501', 'PEK', 'SHA', '2024-03-01T08:00:00',
+                                       '2024-03-01T10:00:00', 'CA', 'economy')
+    records = service.list_records({}, {})
+    records[0]['flight_number'] = 'HACKED'
+    assert service.list_records({}, {})[0]['flight_number'] == 'CA1501'
+    assert service.list_records({'order_by': 'departure_time'}, {})[0]['flight_number'] == 'CA1501'
+
+
+def send_raw(service, request: bytes) -> bytes:
+    async def run():
+        server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(request)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), timeout=5)
+            writer.close()
+            return response
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('length, status', [('-5', 400), ('abc', 400), ('１２', 400), ('1e3', 400),
+                                            ('65', 413), ('99999999999999999999', 413)])
+def test_rejects_invalid_content_length(service, length, status):
+    response = send_raw(service, f'POST /monitor HTTP/1.1\r\nContent-Length: {length}\r\n\r\n'.encode('utf-8'))
+
+    head, _, body = response.partition(b'\r\n\r\n')
+    assert head.startswith(f'HTTP/1.1 {status} '.encode())
+    assert b'Connection: close' in head
+    assert 'error' in json.loads(body)
+
+
+def test_accepts_body_within_limit(service):
+    body = b'{}' + b' ' * 62
+    response = send_raw(service, b'GET /health HTTP/1.1\r\nConnection: close\r\n'
+                                 b'Content-Length: 64\r\n\r\n' + body)
+
+    assert response.startswith(b'HTTP/1.1 200 ')
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+import image_pipeline
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / 'images').mkdir()
+    Image.new('RGB', (1000, 500), (30, 120, 200)).save(tmp_path / 'images' / 'wide.png')
+    Image.new('RGBA', (300, 200), (200, 30, 30, 128)).save(tmp_path / 'images' / 'small.png')
+    return tmp_path
+
+
+def run(root):
+    return image_pipeline.run_pipeline(str(root), widths=[400], formats=['webp', 'jpeg'], max_workers=1)
+
+
+def test_variants_are_no_wider_than_their_target(root):
+    manifest = run(root)
+
+    assert manifest['processed'] == 2
+    outputs = manifest['images'][os.path.join('images', 'wide.png')]['outputs']
+    assert set(outputs) == {'images/wide.full.webp', 'images/wide.full.jpg',
+                            'images/wide.w400.webp', 'images/wide.w400.jpg'}
+    for name in outputs:
+        with Image.open(root / 'optimized' / name) as variant:
+            assert variant.width <= (400 if '.w400.' in name else 1000)
+    # 原图比目标宽度还窄时不生成缩略图
+    small = manifest['images'][os.path.join('images', 'small.png')]['outputs']
+    assert not any('.w400.' in name for name in small)
+
+
+def test_cache_skips_unchanged_sources(root):
+    run(root)
+    assert run(root)['processed'] == 0
+
+    # 只改 mtime、内容不变时同样跳过
+    source = root / 'images' / 'wide.png'
+    os.utime(source, ns=(source.stat().st_atime_ns, source.stat().st_mtime_ns + 10 ** 9))
+    assert run(root)['processed'] == 0
+
+    Image.new('RGB', (800, 400), (0, 0, 0)).save(source)
+    manifest = run(root)
+    assert manifest['processed'] == 1
+    assert image_pipeline.report(manifest)['images'] == 2
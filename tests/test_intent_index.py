@@ -0,0 +1,86 @@
+import pytest
+
+import test_agent
+from intent_index import AhoCorasick, IntentIndex
+
+TABLE = {
+    'default_response': '默认回复',
+    'cities': {'北京': 'PEK', '上海': 'SHA', '成都': 'CTU'},
+    'intents': [
+        {'name': 'status', 'keywords': ['状态', '延误'], 'priority': 50,
+         'requires': ['flight_number'], 'response': '{flight_number} 状态'},
+        {'name': 'route', 'keywords': ['航班'], 'priority': 40,
+         'requires': ['departure_city', 'arrival_city'],
+         'response': '{departure_city}({departure_airport})→{arrival_city}({arrival_airport})'},
+        {'name': 'baggage', 'keywords': ['行李'], 'priority': 20, 'response': '行李'},
+        {'name': 'lost_baggage', 'keywords': ['行李丢失'], 'priority': 20, 'response': '行李丢失'},
+        {'name': 'price', 'keywords': ['票价'], 'priority': 10, 'response': '票价'},
+    ]
+}
+
+
+@pytest.fixture
+def index():
+    return IntentIndex(TABLE)
+
+
+def test_aho_corasick_reports_overlapping_matches():
+    automaton = AhoCorasick(['he', 'she', 'his', 'hers'])
+
+    matches = sorted((start, automaton.patterns[pid]) for start, pid in automaton.iter_matches('ushers'))
+
+    assert matches == [(1, 'she'), (2, 'he'), (2, 'hers')]
+
+
+def test_overlapping_keywords_hit_every_intent(index):
+    result = index.match('行李丢失了')
+
+    assert result.intent.name == 'lost_baggage'
+    assert result.keywords == ['行李丢失']
+
+
+def test_priority_then_longer_keyword_then_earlier_position(index):
+    # 状态(50) 优先于 票价(10)
+    assert index.match('票价和MU5101状态').intent.name == 'status'
+    # 同优先级时，更长的关键词更具体
+    assert index.match('行李丢失').intent.name == 'lost_baggage'
+
+
+def test_intent_missing_required_slots_falls_through(index):
+    # 没有航班号时 status 不可用，退回下一个候选
+    assert index.match('延误了，票价能退吗').intent.name == 'price'
+
+
+def test_slot_extraction(index):
+    result = index.match('ca 1501 北京到上海的航班延误了吗')
+
+    assert result.slots == {
+        'flight_number': 'CA1501',
+        'departure_city': '北京', 'departure_airport': 'PEK',
+        'arrival_city': '上海', 'arrival_airport': 'SHA',
+    }
+    assert result.response == 'CA1501 状态'
+    assert index.match('成都飞北京的航班').response == '成都(CTU)→北京(PEK)'
+
+
+def test_context_slots_fill_follow_up_questions(index):
+    assert index.match('延误了吗') is None
+    assert index.answer('延误了吗', {'flight_number': 'MU5101'}) == 'MU5101 状态'
+    # 问题中出现的槽位覆盖上下文
+    assert index.answer('CZ3121延误了吗', {'flight_number': 'MU5101'}) == 'CZ3121 状态'
+
+
+def test_fallback_reply(index):
+    assert index.match('你好') is None
+    assert index.answer('你好') == '默认回复'
+
+
+@pytest.mark.parametrize('table', [test_agent.DEFAULT_INTENTS, test_agent.INTENTS_FILE],
+                         ids=['builtin', 'intents.json'])
+def test_original_agent_replies(table):
+    index = IntentIndex.from_file(table) if isinstance(table, str) else IntentIndex(table)
+
+    assert index.answer('CA1501状态') == 'CA1501 今日准点起飞，北京首都机场 T3 → 上海虹桥机场 T2'
+    assert index.answer('天津飞广州航班') == '下周五天津→广州有国航CA3302、南航CZ3121，经济舱最低650元'
+    assert index.answer('行李丢失怎么办') == '联系机场行李服务中心，提供行李牌、身份证和航班信息登记挂失'
+    assert index.answer('随便聊聊') == '你可以问我航班状态、行程规划或机场相关问题~'
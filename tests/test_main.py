@@ -0,0 +1,20 @@
+import main
+
+
+def test_monitor_routes_reports_malformed_routes(monkeypatch):
+    monkeypatch.setattr(main, 'monitor_flight_price',
+                        lambda departure, destination, date: {'price': 800, 'trend': '平稳'})
+    routes = [
+        ('北京 (PEK)', '上海 (SHA)', '2026-02-10'),
+        {'departure': '北京 (PEK)', 'date': '2026-02-10'},
+        ('北京 (PEK)', '上海 (SHA)'),
+        None,
+        {'departure': '上海 (SHA)', 'destination': '北京 (PEK)', 'date': '2026-02-12'},
+    ]
+
+    summary = main.monitor_routes(routes)
+
+    assert summary['total_routes'] == 5 and summary['succeeded'] == 2
+    assert ['error' in r for r in summary['results']] == [False, True, True, True, False]
+    assert all('路线格式错误' in r['error'] for r in summary['results'][1:4])
+    assert summary['results'][4]['route'] == '上海 (SHA) → 北京 (PEK)'
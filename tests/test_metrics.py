@@ -0,0 +1,47 @@
+import json
+import threading
+
+import metrics
+
+
+def test_concurrent_profiling_one_thread_at_a_time(monkeypatch):
+    profiler = metrics.Profiler()
+    profiler.enable(sample_rate=1.0)
+    monkeypatch.setattr(metrics, 'PROFILER', profiler)
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, 'REGISTRY', registry)
+
+    @metrics.instrument('busy')
+    def busy():
+        return sum(range(20000))
+
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(50):
+                assert busy() == sum(range(20000))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert 'busy' in profiler.report(limit=5)
+    assert not profiler._profiling.locked()
+
+
+def test_quantiles_above_largest_bucket_stay_json_serializable():
+    registry = metrics.MetricsRegistry()
+    for value in (0.003, 30.0, 60.0, 120.0):
+        registry.observe('slow', value)
+
+    [summary] = registry.snapshot()['histograms']['slow']
+
+    assert summary['p50'] == summary['p99'] == metrics.LATENCY_BUCKETS[-1]
+    assert metrics.Histogram().quantile(0.5) is None
+    json.dumps(registry.snapshot(), allow_nan=False)
@@ -0,0 +1,25 @@
+import pytest
+
+from price_detector import DropDetectorConfig, PriceDropDetector
+
+
+@pytest.mark.parametrize('price', [None, 0, -5, float('nan'), '800'])
+def test_invalid_price_does_not_change_state(price):
+    detector = PriceDropDetector(DropDetectorConfig())
+    for value in (1000, 1010, 990):
+        detector.update(value)
+    before = detector.to_dict()
+
+    result = detector.update(price)
+
+    assert result['fired'] is False and result['signals'] == []
+    assert detector.to_dict() == before
+
+
+def test_drop_fires_after_confirmations():
+    detector = PriceDropDetector(DropDetectorConfig())
+    for value in (1000, 1010, 990, 1000, 1005):
+        assert not detector.update(value)['fired']
+    detector.update(0)
+    detector.update(700)
+    assert detector.update(690)['fired']
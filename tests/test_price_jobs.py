@@ -0,0 +1,78 @@
+import time
+
+import price_jobs
+from price_jobs import PriceJobQueue, time_slot
+
+ROUTES = [('PEK', 'SHA', '2024-03-01'), {'departure': 'SHA', 'arrival': 'CAN', 'travel_date': '2024-03-02'}]
+
+
+def test_schedule_is_idempotent_per_slot(tmp_path):
+    queue = PriceJobQueue(str(tmp_path / 'jobs.db'))
+    assert queue.schedule(ROUTES, '2024-02-15T08:00') == {'added': 2, 'existing': 0, 'invalid': []}
+    assert queue.schedule(ROUTES, '2024-02-15T08:00')['existing'] == 2
+    assert queue.schedule(ROUTES[:1], '2024-02-15T14:00')['added'] == 1
+    assert queue.stats()['pending'] == 3
+
+
+def test_lease_is_exclusive_until_it_expires(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    queue = PriceJobQueue(path, lease_seconds=0.2)
+    queue.schedule(ROUTES[:1], '2024-02-15T08:00')
+
+    first = queue.lease('worker-1')
+    assert len(first) == 1 and first[0]['attempts'] == 1
+    assert PriceJobQueue(path).lease('worker-2') == []
+
+    # 租约过期（如进程崩溃）后其他进程重新领取
+    time.sleep(0.3)
+    assert queue.stats()['expired'] == 1
+    second = PriceJobQueue(path).lease('worker-2')
+    assert [j['lease_owner'] for j in second] == ['worker-2'] and second[0]['attempts'] == 2
+
+    # 原持有者不能再让任务失败，但完成是幂等的
+    assert not queue.fail(first[0], 'late')
+    assert queue.stats()['leased'] == 1
+    assert queue.complete(second[0])
+    assert not queue.complete(first[0])
+    assert queue.stats()['done'] == 1
+
+
+def test_schedule_reports_malformed_routes(tmp_path):
+    queue = PriceJobQueue(str(tmp_path / 'jobs.db'))
+    routes = [
+        ROUTES[0],
+        ('PEK', 'SHA'),
+        {'departure': 'SHA', 'travel_date': '2024-03-02'},
+        ['PEK', '', '2024-03-01'],
+        ('PEK', 'SHA', 'next friday'),
+        None,
+        ROUTES[1],
+    ]
+
+    result = queue.schedule(routes, '2024-02-15T08:00')
+
+    assert result['added'] == 2 and result['existing'] == 0
+    assert [item['index'] for item in result['invalid']] == [1, 2, 3, 4, 5]
+    assert 'arrival' in result['invalid'][1]['error']
+    assert queue.stats()['pending'] == 2
+
+
+def test_fail_backs_off_then_gives_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_jobs, 'RETRY_BACKOFF', 0)
+    queue = PriceJobQueue(str(tmp_path / 'jobs.db'), max_attempts=2)
+    queue.schedule(ROUTES[:1], '2024-02-15T08:00')
+
+    assert queue.fail(queue.lease('w')[0], 'timeout')
+    assert queue.stats()['pending'] == 1
+    assert not queue.fail(queue.lease('w')[0], 'timeout')
+    assert queue.stats()['failed'] == 1
+    assert queue.lease('w') == []
+
+    assert queue.retry_failed() == 1
+    assert queue.lease('w')[0]['attempts'] == 1
+
+
+def test_time_slot_alignment():
+    now = time.mktime((2024, 2, 15, 9, 30, 0, 0, 0, -1))
+    assert time_slot(6, now) == '2024-02-15T06:00'
+    assert time_slot(1, now) == '2024-02-15T09:00'
@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from record_store import create_record_store, record_key
+
+
+def make_record(flight_number='CA1501', departure_time='2024-03-01T08:00:00', **fields):
+    record = {
+        'flight_number': flight_number,
+        'departure_airport': 'PEK',
+        'arrival_airport': 'SHA',
+        'departure_time': departure_time,
+        'arrival_time': '2024-03-01T10:00:00',
+        'airline': 'CA',
+        'cabin_class': 'economy',
+        'miles': 700,
+        'record_date': '2024-03-01T12:00:00',
+    }
+    record.update(fields)
+    return record
+
+
+@pytest.fixture(params=['flat', 'sharded', 'binary'])
+def store(request, tmp_path):
+    store = create_record_store(request.param, str(tmp_path / 'flight_records.json'), str(tmp_path / 'records'))
+    store.init()
+    return store
+
+
+def test_month_filter_skips_unparsed_departure(store):
+    store.append([make_record(),
+                  make_record('MU5101', '2024-04-01T09:00:00'),
+                  make_record('CZ3121', 'not-a-time')])
+
+    assert [r['flight_number'] for r in store.load(month=3)] == ['CA1501']
+    assert [r['flight_number'] for r in store.load(year=2024, month=4)] == ['MU5101']
+    assert len(store.load()) == 3
+
+
+def test_duplicate_policies(store):
+    assert store.append([make_record()], on_duplicate='reject')['added'] == 1
+
+    result = store.append([make_record(miles=900), make_record('MU5101')], on_duplicate='reject')
+    assert (result['added'], result['updated'], result['skipped']) == (1, 0, 1)
+    assert result['written'] == [make_record('MU5101')]
+
+    result = store.append([make_record(miles=900)], on_duplicate='upsert')
+    assert (result['added'], result['updated'], result['skipped']) == (0, 1, 0)
+    assert sorted((r['flight_number'], r['miles']) for r in store.load()) == [('CA1501', 900), ('MU5101', 700)]
+
+    assert store.append([make_record()], on_duplicate='allow')['added'] == 1
+    assert len(store.load()) == 3
+    assert store.compact() == 1
+    assert len(store.load()) == 2
+    assert store.contains('CA1501_2024-03-01T08:00:00_PEK')
+
+
+def test_key_index_is_rebuilt_when_missing(store, tmp_path):
+    store.append([make_record(), make_record('MU5101')])
+    os.remove(store.key_index.path)
+
+    reopened = create_record_store(store.layout, str(tmp_path / 'flight_records.json'), str(tmp_path / 'records'))
+    assert reopened.contains('MU5101_2024-03-01T08:00:00_PEK')
+    assert reopened.append([make_record('MU5101')], on_duplicate='reject')['skipped'] == 1
+    assert len(reopened.load()) == 2
+
+
+def _append_batch(layout, records_file, records_dir, records):
+    store = create_record_store(layout, records_file, records_dir)
+    store.append(records, on_duplicate='reject')
+
+
+def test_concurrent_processes_do_not_lose_or_duplicate_records(store, tmp_path):
+    records = [make_record(f"CA{1000 + i}", f"2024-0{1 + i % 3}-01T08:00:00") for i in range(30)]
+    context = multiprocessing.get_context('spawn')
+    workers = [
+        context.Process(target=_append_batch, args=(store.layout, str(tmp_path / 'flight_records.json'),
+                                                    str(tmp_path / 'records'), records[i:] + records[:i]))
+        for i in range(0, 30, 6)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    keys = sorted(record_key(r) for r in store.load())
+    assert keys == sorted(record_key(r) for r in records)
+
+
+def test_departure_range_queries(store):
+    store.append([make_record('CA1', '2024-03-01T08:00:00', airline='CA'),
+                  make_record('MU2', '2024-03-15T08:00:00', airline='MU'),
+                  make_record('CA3', '2024-03-31T23:00:00', airline='CA'),
+                  make_record('CA4', '2024-04-01T00:00:00', airline='CA')])
+
+    def numbers(**kwargs):
+        return [r['flight_number'] for r in store.query(**kwargs)]
+
+    assert numbers(start='2024-03-01', end='2024-03-31', order_by='departure_time') == ['CA1', 'MU2', 'CA3']
+    assert numbers(start='2024-03-15T08:00:00', order_by='-departure_time') == ['CA4', 'CA3', 'MU2']
+    assert numbers(airline='CA', order_by='departure_time', limit=2) == ['CA1', 'CA3']
+
+    # 写入后索引增量更新
+    store.append([make_record('CA1', '2024-03-01T08:00:00', airline='CA', miles=1)], on_duplicate='upsert')
+    store.append([make_record('CZ5', '2024-03-10T08:00:00', airline='CZ')])
+    assert numbers(end='2024-03-15T00:00:00', order_by='departure_time') == ['CA1', 'CZ5']
+    assert store.query(end='2024-03-02')[0]['miles'] == 1
+
+
+def test_binary_reader_during_concurrent_writes(tmp_path):
+    path = str(tmp_path / 'flight_records.bin')
+    writer_store = create_record_store('binary', str(tmp_path / 'flight_records.json'), str(tmp_path / 'records'))
+    writer_store.init()
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        try:
+            for i in range(60):
+                # 每条记录都带新字符串，覆盖更新会改写已有的行
+                writer_store.append([make_record(f"W{i}", airline=f"AIR{i}", cabin_class=f"C{i}")])
+                writer_store.append([make_record('W0', airline=f"UP{i}")], on_duplicate='upsert')
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stop.set()
+
+    def reader():
+        store = create_record_store('binary', str(tmp_path / 'flight_records.json'), str(tmp_path / 'records'))
+        try:
+            while not stop.is_set():
+                view = store.load()
+                for record in (view[i] for i in range(len(view))):
+                    assert record['flight_number'].startswith('W')
+                    assert record['airline'].startswith(('AIR', 'UP'))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert os.path.exists(path)
+    assert len(writer_store.load()) == 60
+
+
+def test_binary_reader_sees_strings_for_every_counted_row(tmp_path, monkeypatch):
+    import record_binary
+
+    store = create_record_store('binary', str(tmp_path / 'flight_records.json'), str(tmp_path / 'records'))
+    store.init()
+    store.append([make_record()])
+    writer = create_record_store('binary', str(tmp_path / 'flight_records.json'), str(tmp_path / 'records'))
+    read_strings = record_binary.read_json_cached
+
+    def read_then_write(path, default):
+        # 读者读到字典后、使用之前，另一个写入者追加了引用新字符串的行
+        strings = read_strings(path, default)
+        monkeypatch.setattr(record_binary, 'read_json_cached', read_strings)
+        writer.append([make_record('MU5101', airline='MU', cabin_class='business')])
+        return strings
+
+    monkeypatch.setattr(record_binary, 'read_json_cached', read_then_write)
+    view = store.load()
+    # 逐个下标访问（迭代 Sequence 时 IndexError 会被当作结束而被掩盖）
+    assert [view[i]['flight_number'] for i in range(len(view))] in (['CA1501'], ['CA1501', 'MU5101'])
+    assert [r['flight_number'] for r in store.load()] == ['CA1501', 'MU5101']
+
+
+def test_binary_upsert_does_not_rewrite_mapped_rows(tmp_path):
+    store = create_record_store('binary', str(tmp_path / 'flight_records.json'), str(tmp_path / 'records'))
+    store.init()
+    store.append([make_record(), make_record('MU5101')])
+    view = store.load()
+
+    store.append([make_record(miles=900)], on_duplicate='upsert')
+
+    assert view[0]['miles'] == 700
+    assert [(r['flight_number'], r['miles']) for r in store.load()] == [('CA1501', 900), ('MU5101', 700)]
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+import tenants
+from tenants import TenantPool
+
+
+def test_evicted_assistant_still_records_flights(tmp_path, monkeypatch):
+    pytest.importorskip('qrcode')
+    monkeypatch.setenv('CARD_RENDER_WORKERS', '1')
+    pool = TenantPool(str(tmp_path), max_open=1)
+    first = pool.get('alice')
+    pool.get('bob')
+    assert pool.stats()['evictions'] == 1
+
+    # 淘汰时其他请求可能仍持有 alice 的实例
+    assert first.add_flight_record('CA1501', 'PEK', 'SHA', '2024-03-01T08:00:00',
+                                   '2024-03-01T10:00:00', 'CA', 'economy')
+    assert [r['flight_number'] for r in pool.get('alice').get_flight_records()] == ['CA1501']
+
+    # 关闭后提交的渲染任务已写入日志，重新打开该用户时执行
+    reopened = pool.get('alice')
+    assert reopened is not first
+    assert reopened.get_card('CA1501_2024-03-01T08:00:00_PEK', timeout=10)
+    reopened.close()
+
+
+def test_idle_users_are_evicted(tmp_path):
+    pool = TenantPool(str(tmp_path), max_open=4, idle_seconds=0.05)
+    pool.get('alice')
+    time.sleep(0.1)
+    assert pool.evict_idle() == 1
+    assert pool.stats()['open'] == 0
+
+
+def test_rejected_and_failed_opens_leave_no_lock(tmp_path, monkeypatch):
+    pool = TenantPool(str(tmp_path))
+    for user_id in ('../etc', '', 'a' * 200, 'bad id'):
+        with pytest.raises(ValueError):
+            pool.get(user_id)
+    assert pool._opening == {}
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(tenants, 'FlightAssistant', fail)
+    with pytest.raises(OSError):
+        pool.get('alice')
+    assert pool._opening == {}
+    assert pool.stats()['open'] == 0